@@ -1,21 +1,21 @@
-import time
-import os, sys
-currentdir = os.path.dirname(os.path.realpath(__file__))
-bridgedir = os.path.join(os.path.dirname(currentdir), 'mivp_agent')
-sys.path.append(bridgedir)
-
-from bridge import ModelBridgeServer
+from mivp_agent.bridge import ModelBridgeServer
+from mivp_agent.messages import INSTR_SEND_STATE
 
 if __name__ == '__main__':
   with ModelBridgeServer() as server:
     print('Starting server...')
-    server.accept()
 
-    print('Listing for state...')
-    state = None
+    print('Listening for states...')
     while True:
-      state = server.listen_state()
-      print('Got state dict: ')
-      print(state)
+      accepted, readable = server.poll()
+      for addr in accepted:
+        print(f'Got new connection: {addr}')
+        server.send_instr(addr, INSTR_SEND_STATE)
+
+      for addr in readable:
+        for state in server.listen_all(addr):
+          print('Got state dict: ')
+          print(state)
 
-      time.sleep(0.25)
\ No newline at end of file
+          # BHV_Agent will not send another state until it gets a response
+          server.send_instr(addr, INSTR_SEND_STATE)
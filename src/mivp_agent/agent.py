@@ -20,5 +20,28 @@ class Agent(ABC):
     def state_to_action(self, model: Model, state, observation):
         pass
 
+    def states_to_actions(self, model: Model, states, observations):
+        '''
+        Optional batched version of `state_to_action()`. If implemented, `Driver` calls it once with every vehicle which has arrived in a new state since the last call, instead of calling `state_to_action()` on each vehicle's agent. It is called on the agent given to the `Driver`, not the per vehicle duplicates.
+
+        Args:
+          model (Model): The agent's model
+          states (list): The new state of each vehicle
+          observations (list): The observation each state was made from
+
+        Returns:
+          list: An action for each state, in the same order
+        '''
+        raise NotImplementedError()
+
+    def action_to_array(self, action):
+        '''
+        Converts an action returned by `state_to_action()` to the fixed shape array stored by a columnar `Driver`. By default this is the action's speed and course.
+
+        Returns:
+          array_like: The action as an array
+        '''
+        return (action['speed'], action['course'])
+
     def duplicate(self):
         return deepcopy(self)
@@ -0,0 +1,294 @@
+import time
+import asyncio
+
+from mivp_agent.messages import AsyncMissionMessage, action_to_instr, INSTR_SEND_STATE
+from mivp_agent.bridge import AsyncModelBridgeServer
+from mivp_agent.manager import MissionManager
+from mivp_agent.util.message_queue import POLICY_BLOCK as QUEUE_POLICY_BLOCK
+from mivp_agent.util.scheduler import FifoScheduler
+
+
+class AsyncMissionManager(MissionManager):
+    '''
+    An asyncio native version of [`MissionManager`][mivp_agent.manager.MissionManager]. Every vehicle connection is served by a task on the running event loop instead of a background thread, so states arrive as awaitable events and can be consumed by async training / inference code without thread hand-offs.
+
+    Logging, vehicle registries and query methods such as `episode_state()` or `get_ids()` behave as they do in `MissionManager`. Each vehicle's task waits for its response before reading another state, so the message queue can only be bounded by `max_queue` with the `'block'` policy and is always first in first out.
+
+    Examples:
+      ```
+      from mivp_agent.async_manager import AsyncMissionManager
+
+      async with AsyncMissionManager('trainer') as mgr:
+        await mgr.wait_for(['felix', 'evan'])
+
+        msg = await mgr.get_message()
+        await msg.act({
+          'speed': 1.0,
+          'course': 180.0
+        })
+      ```
+    '''
+
+    def __enter__(self):
+        raise TypeError('AsyncMissionManager must be used with `async with`')
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def start(self):
+        '''
+        It is **not recommended** to use this method directly. Instead, consider using this class with `async with`. This method starts listening for `BHV_Agent` connections on the running event loop.
+
+        Returns:
+          bool: False if the server has already been started, True otherwise
+        '''
+        if self._server is not None:
+            return False
+
+        bounds = self._msg_queue
+        assert bounds.policy == QUEUE_POLICY_BLOCK and bounds.max_per_vehicle is None, "AsyncMissionManager only supports max_queue with the 'block' policy"
+        assert type(bounds.scheduler) is FifoScheduler, "AsyncMissionManager does not support schedulers"
+        self._msg_queue = asyncio.Queue(maxsize=bounds.max_size or 0)
+        self._registry_cond = asyncio.Condition()
+        # Set when a vehicle disconnects until `step()` has seen it
+        self._step_wakeup = asyncio.Event()
+        self._connections = {}
+
+        self._server = AsyncModelBridgeServer(self._serve_vehicle)
+        await self._server.start()
+        self._start_metrics()
+
+        return True
+
+    async def _serve_vehicle(self, conn):
+        print(f'Got new connection: {conn.addr}')
+        await conn.send_instr(INSTR_SEND_STATE)
+
+        m = None
+        lost = False
+        try:
+            while True:
+                state = await conn.listen()
+                if state is None:
+                    lost = True
+                    return
+                read = time.perf_counter()
+
+                responded = asyncio.Event()
+                m = self._handle_state(
+                    conn.addr,
+                    state,
+                    message_type=AsyncMissionMessage,
+                    notify=lambda _: responded.set()
+                )
+                m._times['read'] = read
+                self._connections[m.vid] = conn
+                async with self._registry_cond:
+                    self._registry_cond.notify_all()
+
+                m._times['enqueue'] = time.perf_counter()
+                await self._msg_queue.put(m)
+
+                # BHV_Agent will not send another state until it gets a response
+                if self._response_deadline is None:
+                    await responded.wait()
+                else:
+                    remaining = m._times['read'] + self._response_deadline - time.perf_counter()
+                    try:
+                        await asyncio.wait_for(responded.wait(), max(remaining, 0))
+                    except asyncio.TimeoutError:
+                        self._answer_late(m)
+                try:
+                    await conn.send_instr(m._response)
+                except OSError:
+                    lost = True
+                    return
+                m._times['sent'] = time.perf_counter()
+                m._sent.set_result(True)
+
+                self._metrics.record(m)
+                self._do_logging(m)
+        finally:
+            # Do not leave anyone awaiting a response that will never be sent
+            if m is not None and not m._sent.done():
+                m._sent.cancel()
+            if lost:
+                self._vehicle_disconnected(conn.addr)
+
+    def _queue_occupancy(self):
+        if not isinstance(self._msg_queue, asyncio.Queue):
+            return super()._queue_occupancy()
+
+        return {
+            'size': self._msg_queue.qsize(),
+            'max_size': self._msg_queue.maxsize or None
+        }
+
+    def _discard(self, m):
+        # asyncio.Queue can not remove items, the learner gets the message with `timed_out` set
+        pass
+
+    def _evict(self, addr):
+        for conn in self._connections.values():
+            if conn.addr == addr:
+                # Its task sees the connection close and exits
+                conn.close()
+                return
+
+    async def wait_for(self, vnames):
+        '''
+        Used to wait until a specified list of vehicles has connected.
+
+        Args:
+          vnames (iterable): A list / tuple of `str` values to look for
+        '''
+        async with self._registry_cond:
+            await self._registry_cond.wait_for(lambda: self.are_present(vnames))
+
+    async def wait_for_count(self, count):
+        '''
+        Used to wait until a specified number of vehicles have connected.
+
+        Args:
+          count (int): The number of vehicles to wait for
+        '''
+        async with self._registry_cond:
+            await self._registry_cond.wait_for(lambda: self._vehicle_count >= count)
+
+    async def wait_for_episode_state(self, vnames, state):
+        '''
+        Used to wait until the `pEpisodeManager` of every vehicle in a list has reported a specific state, see [`MissionManager.wait_for_episode_state()`][mivp_agent.manager.MissionManager.wait_for_episode_state].
+
+        Args:
+          vnames (iterable): A list / tuple of `str` values to look for
+          state (str): The state to wait for, for example `'PAUSED'`
+        '''
+        async with self._registry_cond:
+            await self._registry_cond.wait_for(lambda: self.in_episode_state(vnames, state))
+
+    async def get_message(self, block=True) -> AsyncMissionMessage:
+        '''
+        Used as the primary method for receiving data from `BHV_Agent`. See [`MissionManager.get_message()`][mivp_agent.manager.MissionManager.get_message].
+
+        Args:
+          block (bool): A boolean specifying if the method will wait until a message present or return immediately
+
+        Returns:
+          obj: A instance of `AsyncMissionMessage` or `None` depending on the blocking behavior
+        '''
+        if block:
+            m = await self._msg_queue.get()
+        else:
+            try:
+                m = self._msg_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return None
+
+        m._times['dequeue'] = time.perf_counter()
+        return m
+
+    async def get_messages(self, max_n=None, timeout=None):
+        '''
+        Used to receive every pending message at once. See [`MissionManager.get_messages()`][mivp_agent.manager.MissionManager.get_messages].
+
+        Returns:
+          list: Instances of `AsyncMissionMessage`, empty if the timeout expired
+        '''
+        msgs = []
+        if self._msg_queue.empty() and timeout != 0:
+            try:
+                msgs.append(await asyncio.wait_for(self._msg_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                return msgs
+
+        while max_n is None or len(msgs) < max_n:
+            try:
+                msgs.append(self._msg_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+        dequeue = time.perf_counter()
+        for m in msgs:
+            m._times['dequeue'] = dequeue
+        return msgs
+
+    async def step(self, timeout=None, vnames=None):
+        '''
+        Waits for a state from every vehicle, or until the timeout expires, and returns them as one batch aligned with the vehicle names. See [`MissionManager.step()`][mivp_agent.manager.MissionManager.step].
+
+        Returns:
+          StepBatch: The messages aligned with `vnames`, with `None` and an entry in `missing` for vehicles which did not send a state in time
+        '''
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        received = {}
+        held = []
+        timed_out = False
+
+        pending = list(self._step_held)
+        self._step_held.clear()
+        while True:
+            expected = self._step_sort(pending, received, held, vnames)
+            if len(expected) != 0 and all(vname in received for vname in expected):
+                break
+
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+
+            pending = await self._step_messages(remaining)
+
+        return self._step_batch(expected, received, held, timed_out)
+
+    def _wake_step(self):
+        self._step_wakeup.set()
+
+    async def _step_messages(self, timeout):
+        # Like `get_messages()`, but also returns when a vehicle disconnects, which may complete the batch
+        msgs = []
+        if self._msg_queue.empty() and not self._step_wakeup.is_set():
+            getter = asyncio.ensure_future(self._msg_queue.get())
+            waker = asyncio.ensure_future(self._step_wakeup.wait())
+            await asyncio.wait((getter, waker), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            waker.cancel()
+            if getter.done():
+                msgs.append(getter.result())
+                msgs[0]._times['dequeue'] = time.perf_counter()
+            else:
+                # Cancelling a waiting `get()` leaves the queue untouched
+                getter.cancel()
+        self._step_wakeup.clear()
+
+        return msgs + await self.get_messages(timeout=0)
+
+    async def act_many(self, msgs, actions):
+        '''
+        Responds to many messages at once and returns once every response has been sent. See [`MissionManager.act_many()`][mivp_agent.manager.MissionManager.act_many].
+        '''
+        assert len(msgs) == len(actions), "There must be exactly one action for each message"
+
+        instrs = [action_to_instr(action) for action in actions]
+        for m in msgs:
+            m._assert_no_rsp()
+        for m, instr in zip(msgs, instrs):
+            m._set_response(instr)
+
+        await asyncio.gather(*(m._sent for m in msgs))
+
+    async def reset_vehicle(self, vname, success=False):
+        instr = self._reset_instr(vname, success)
+        await self._connections[vname].send_instr(instr)
+
+    async def close(self):
+        if self._server is not None:
+            await self._server.close()
+        super().close()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
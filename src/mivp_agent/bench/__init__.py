@@ -0,0 +1,2 @@
+from mivp_agent.bench.vehicle import FakeVehicle
+from mivp_agent.bench.runner import BenchResult, VehicleFleet, bench_manager, bench_driver
@@ -0,0 +1,224 @@
+import time
+import multiprocessing
+from dataclasses import dataclass
+from threading import Thread
+
+import numpy as np
+
+from mivp_agent.manager import MissionManager
+from mivp_agent.driver import Driver
+from mivp_agent.agent import Agent
+from mivp_agent.model import Model
+from mivp_agent.bench.vehicle import FakeVehicle, EPISODE_PAUSED
+
+BENCH_ACTION = {
+    'speed': 2.0,
+    'course': 90.0,
+    'posts': {}
+}
+
+
+@dataclass
+class BenchResult:
+    name: str
+    vehicles: int
+    # Length of the measured window
+    seconds: float
+    # States answered during the window
+    messages: int
+    # Round trip latency seen by the vehicles, in milliseconds
+    p50_ms: float
+    p99_ms: float
+    # CPU time of the benchmarking process (the manager and learner side) as a percentage of one core
+    cpu_percent: float
+
+    @property
+    def msgs_per_sec(self):
+        return self.messages / self.seconds
+
+    def summary(self):
+        return (
+            f'{self.name}: {self.vehicles} vehicles, {self.messages} msgs in {self.seconds:.2f}s\n'
+            f'  throughput: {self.msgs_per_sec:.1f} msgs/sec\n'
+            f'  latency:    p50 {self.p50_ms:.3f}ms, p99 {self.p99_ms:.3f}ms\n'
+            f'  cpu:        {self.cpu_percent:.1f}%'
+        )
+
+
+def _vehicle_process(vnames, options, start, stop, results):
+    vehicles = [FakeVehicle(vname, **options) for vname in vnames]
+    for v in vehicles:
+        v.connect()
+
+    threads = [Thread(target=v.run, args=(stop,)) for v in vehicles]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for v in vehicles:
+        v.close()
+
+    # Only report exchanges which started during the measured window
+    latencies = []
+    for v in vehicles:
+        latencies.extend(latency for sent, latency in v.exchanges if sent >= start.value)
+    results.put(latencies)
+
+
+class VehicleFleet:
+    '''
+    Runs `FakeVehicle` instances in separate processes so they do not compete with the code being measured for the GIL.
+    '''
+
+    def __init__(self, vehicles, processes=1, **options):
+        '''
+        Args:
+          vehicles (int): The number of vehicles
+          processes (int): The number of processes to spread them across
+          **options: Passed to `FakeVehicle`
+        '''
+        self.vnames = [f'vehicle_{i}' for i in range(vehicles)]
+
+        ctx = multiprocessing.get_context()
+        self._start = ctx.Value('d', float('inf'))
+        self._stop = ctx.Event()
+        self._results = ctx.Queue()
+        self._processes = []
+        for i in range(processes):
+            self._processes.append(ctx.Process(
+                target=_vehicle_process,
+                args=(self.vnames[i::processes], options, self._start, self._stop, self._results),
+                daemon=True
+            ))
+
+    def start(self):
+        for p in self._processes:
+            p.start()
+
+    def begin_measurement(self):
+        self._start.value = time.time()
+        self._cpu_start = time.process_time()
+
+    def finish(self, name):
+        '''
+        Stops the vehicles and measures everything since `begin_measurement()`.
+
+        Returns:
+          BenchResult: The results
+        '''
+        seconds = time.time() - self._start.value
+        cpu = time.process_time() - self._cpu_start
+        self._stop.set()
+
+        latencies = []
+        for _ in self._processes:
+            latencies.extend(self._results.get())
+        for p in self._processes:
+            p.join()
+
+        if len(latencies) == 0:
+            p50, p99 = float('nan'), float('nan')
+        else:
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+
+        return BenchResult(
+            name=name,
+            vehicles=len(self.vnames),
+            seconds=seconds,
+            messages=len(latencies),
+            p50_ms=p50,
+            p99_ms=p99,
+            cpu_percent=100 * cpu / seconds
+        )
+
+
+def bench_manager(vehicles=10, duration=10.0, processes=1, log=False, manager_type=MissionManager, **options):
+    '''
+    Measures a `MissionManager` answering every state with a fixed action as fast as possible.
+
+    Args:
+      vehicles (int): The number of fake vehicles
+      duration (float): Seconds to measure for, after every vehicle has connected
+      processes (int): The number of processes to run the vehicles in
+      log (bool): If the manager should log transitions
+      manager_type (type): `MissionManager` or a subclass of it to measure
+      **options: Passed to `FakeVehicle`, for example `node_reports` or `episode_steps`
+
+    Returns:
+      BenchResult: The results
+    '''
+    with manager_type('bench', log=log) as mgr:
+        fleet = VehicleFleet(vehicles, processes=processes, **options)
+        fleet.start()
+
+        measuring = False
+        end = None
+        while end is None or time.monotonic() < end:
+            msg = mgr.get_message(timeout=1.0)
+            if msg is None:
+                continue
+
+            if msg.episode_state == EPISODE_PAUSED:
+                msg.start()
+            else:
+                msg.act(BENCH_ACTION)
+
+            if not measuring and mgr.get_vehicle_count() == vehicles:
+                measuring = True
+                fleet.begin_measurement()
+                end = time.monotonic() + duration
+
+        return fleet.finish(manager_type.__name__)
+
+
+class _BenchModel(Model):
+    def inference(self, state):
+        return BENCH_ACTION
+
+
+class _BenchAgent(Agent):
+    def build_model(self):
+        return _BenchModel()
+
+    def observation_to_state(self, observation):
+        return (round(observation['NAV_X']), round(observation['NAV_Y']))
+
+    def state_to_action(self, model, state, observation):
+        return model.inference(state)
+
+
+def bench_driver(vehicles=10, duration=10.0, processes=1, log=False, episodes_per_batch=None, agent=None, **options):
+    '''
+    Measures a `Driver` collecting batches of episodes. Time spent pausing vehicles between batches is included.
+
+    Args:
+      vehicles (int): The number of fake vehicles
+      duration (float): Seconds to measure for, the last batch is always completed
+      processes (int): The number of processes to run the vehicles in
+      log (bool): If the manager should log transitions
+      episodes_per_batch (int): Defaults to the number of vehicles
+      agent (Agent): The agent to drive the vehicles with, a trivial agent is used by default
+      **options: Passed to `FakeVehicle`, for example `node_reports` or `episode_steps`
+
+    Returns:
+      BenchResult: The results
+    '''
+    if episodes_per_batch is None:
+        episodes_per_batch = vehicles
+    if agent is None:
+        agent = _BenchAgent()
+
+    with Driver(agent, expect_agents=vehicles, log=log) as driver:
+        fleet = VehicleFleet(vehicles, processes=processes, **options)
+        fleet.start()
+
+        batches = driver.sample(float('inf'), episodes_per_batch)
+        # The first batch includes connecting and pausing every vehicle
+        next(batches)
+
+        fleet.begin_measurement()
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            next(batches)
+
+        return fleet.finish(Driver.__name__)
@@ -0,0 +1,152 @@
+import time
+import math
+
+from mivp_agent.bridge import ModelBridgeClient
+from mivp_agent.codec import DEFAULT_CODECS
+from mivp_agent.const import KEY_ID, KEY_EPISODE_MGR_REPORT, KEY_EPISODE_MGR_STATE
+from mivp_agent.util.parse import csp_to_dict, parse_boolstr
+
+EPISODE_PAUSED = 'PAUSED'
+EPISODE_RUNNING = 'RUNNING'
+
+
+class FakeVehicle:
+    '''
+    Stands in for a vehicle running `BHV_Agent` and `pEpisodeManager`. The vehicle moves along a circle, reports `node_reports` other vehicles, and cycles through episodes of `episode_steps` states according to the `EPISODE_MGR_CTRL` posts it receives.
+
+    Like `BHV_Agent`, it sends a single state and waits for the instruction answering it before sending the next.
+    '''
+
+    def __init__(self, vname, node_reports=0, episode_steps=100, extra_vars=None, hostname='localhost', port=57721, codecs=DEFAULT_CODECS):
+        '''
+        Args:
+          vname (str): The name reported in every state
+          node_reports (int): The number of other vehicles in each state's `NODE_REPORTS`
+          episode_steps (int): The number of states sent while `RUNNING` before an episode ends
+          extra_vars (dict): Additional MOOS vars added to every state
+        '''
+        self._client = ModelBridgeClient(hostname=hostname, port=port, codecs=codecs)
+
+        self.vname = vname
+        self._node_reports = node_reports
+        self._episode_steps = episode_steps
+        self._extra_vars = {} if extra_vars is None else extra_vars
+
+        self._moos_time = 0.0
+        self._episode_state = EPISODE_PAUSED
+        self._episode_num = 0
+        self._episode_step = 0
+        self._episode_start = 0.0
+        self._will_pause = False
+        self._write_report(False)
+
+        # The wall clock time each state was sent at and its round trip time in seconds
+        self.exchanges = []
+
+    def connect(self, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while not self._client.connect():
+            if time.monotonic() > deadline:
+                raise RuntimeError(f'{self.vname} could not connect to the server')
+            time.sleep(0.1)
+
+    def state(self):
+        '''
+        Returns:
+          dict: The state the vehicle would currently send
+        '''
+        angle = self._moos_time / 10.0
+        state = {
+            KEY_ID: self.vname,
+            'MOOS_TIME': self._moos_time,
+            'NAV_X': 50.0 * math.cos(angle),
+            'NAV_Y': 50.0 * math.sin(angle),
+            'NAV_HEADING': math.degrees(angle) % 360.0,
+            KEY_EPISODE_MGR_REPORT: self._report,
+            KEY_EPISODE_MGR_STATE: self._episode_state
+        }
+
+        if self._node_reports != 0:
+            state['NODE_REPORTS'] = {}
+            for i in range(self._node_reports):
+                state['NODE_REPORTS'][f'{self.vname}_contact_{i}'] = {
+                    'NAV_X': 25.0 * math.cos(angle + i),
+                    'NAV_Y': 25.0 * math.sin(angle + i),
+                    'NAV_HEADING': math.degrees(angle + i) % 360.0,
+                    'MOOS_TIME': self._moos_time
+                }
+
+        state.update(self._extra_vars)
+        return state
+
+    def _write_report(self, success):
+        duration = self._moos_time - self._episode_start
+        self._report = f'NUM={self._episode_num},DURATION={duration:.2f},SUCCESS={str(success).lower()},WILL_PAUSE={str(self._will_pause).lower()}'
+
+    def _end_episode(self, success):
+        self._episode_num += 1
+        self._write_report(success)
+        self._episode_step = 0
+        self._episode_start = self._moos_time
+
+        if self._will_pause:
+            self._episode_state = EPISODE_PAUSED
+            self._will_pause = False
+
+    def _handle_ctrl(self, ctrl):
+        ctrl = csp_to_dict(ctrl)
+
+        if ctrl['type'] == 'start':
+            if self._episode_state == EPISODE_PAUSED:
+                self._episode_state = EPISODE_RUNNING
+                self._episode_step = 0
+                self._episode_start = self._moos_time
+        elif ctrl['type'] == 'pause':
+            self._will_pause = True
+        elif ctrl['type'] == 'hardstop':
+            self._episode_state = EPISODE_PAUSED
+            self._will_pause = False
+        elif ctrl['type'] == 'reset':
+            self._end_episode(parse_boolstr(ctrl['success']))
+
+    def step(self, instr):
+        '''
+        Applies an instruction and advances the vehicle to its next state.
+        '''
+        if 'EPISODE_MGR_CTRL' in instr['posts']:
+            self._handle_ctrl(instr['posts']['EPISODE_MGR_CTRL'])
+
+        self._moos_time += 0.1
+        if self._episode_state == EPISODE_RUNNING:
+            self._episode_step += 1
+            if self._episode_step >= self._episode_steps:
+                self._end_episode(False)
+
+    def _wait_instr(self, stop):
+        instr = False
+        while instr is False and not stop.is_set():
+            instr = self._client.listen(timeout=0.1)
+        return instr
+
+    def run(self, stop):
+        '''
+        Exchanges states for instructions, the same way `BHV_Agent` does, until `stop` is set.
+
+        Args:
+          stop (Event): A `threading` or `multiprocessing` event
+        '''
+        # BHV_Agent waits for the server to ask for the first state
+        instr = self._wait_instr(stop)
+        while instr is not False:
+            self.step(instr)
+
+            sent = time.time()
+            start = time.perf_counter()
+            self._client.send_state(self.state())
+
+            instr = self._wait_instr(stop)
+            if instr is not False:
+                self.exchanges.append((sent, time.perf_counter() - start))
+
+    def close(self):
+        self._client.close()
@@ -1,78 +1,182 @@
 import socket
-import pickle
+import select
+import selectors
+import asyncio
 import struct
-import sys
 import os
+import stat
+import time
+from collections import deque
 
 from mivp_agent.util.validate import validateInstruction, validateState
+from mivp_agent.util.packit import FrameBuffer
 from mivp_agent.util.parse import parse_report
 from mivp_agent.const import KEY_EPISODE_MGR_REPORT
+from mivp_agent.codec import get_codec, DEFAULT_CODECS, DEFAULT_SERVER_CODECS, PickleCodec
 
 HEADER_SIZE = 4
 MAX_BUFFER_SIZE = 8192
 
+# Clients open a connection with a frame of `HANDSHAKE_PREFIX` followed by the comma separated names of the codecs they support (in order of preference). The server replies with the prefix followed by the chosen codec's name, or nothing if there is no codec in common.
+HANDSHAKE_PREFIX = b'MIVP-HELLO '
+HANDSHAKE_TIMEOUT = 2.0
+
+# Hostnames of the form `unix:///path/to/socket` select a unix domain socket (the port is ignored)
+UNIX_PREFIX = 'unix://'
+
+# Selector key data used to tell the wakeup socket apart from client sockets
+_WAKEUP = object()
+
+
+def recv_full(connection, buffer):
+    '''
+    Reads every length prefixed message available on a non-blocking connection. Bursts are drained in one call and the data of a trailing incomplete message is kept in the buffer to be completed by later calls, so this never blocks.
+
+    Args:
+      connection (socket): The non-blocking socket to read from.
+      buffer (FrameBuffer): The connection's receive buffer. Data is read straight into this buffer and messages are returned as `memoryview` slices of it, valid until the next call with the same buffer.
+
+    Returns:
+      tuple: A list of the complete messages read, which may be empty, and a `bool` which is `True` if the connection has been closed by the peer.
+    '''
+    # Messages from the previous call are no longer in use
+    buffer.release()
 
-def recv_full(connection):
     messages = []
-    current_len = None
-    last_read = None
-    total_read = None
-    # Create byte string for storing the header in
-    tmp_data = b''
-
-    tmp_data = connection.recv(MAX_BUFFER_SIZE)
-    last_read = len(tmp_data)
-    total_read = last_read
-
-    # If buffer read was full, call until not full
-    # Attempt to empty the recv queue
-    while last_read == MAX_BUFFER_SIZE:
-        print('WARNING: ModelBridge got max buffer size', file=sys.stderr)
-
-    # While we have data to process into messages
-    while len(tmp_data) != 0:
-        # Get more data if message is incomplete
-        if (current_len is None and len(tmp_data) < HEADER_SIZE) or (current_len is not None and len(tmp_data) < current_len):
-            orig_timeout = connection.gettimeout()
-            connection.settimeout(None)
-            tmp_data += connection.recv(MAX_BUFFER_SIZE)
-            connection.settimeout(orig_timeout)
-
-            last_read = len(tmp_data)
-            total_read += last_read
-
-        if current_len is None:
-            # We should be looking for a header
-            if len(tmp_data) >= HEADER_SIZE:
-                # We can construct a header (current_len)
-                current_len = struct.unpack('>i', tmp_data[:HEADER_SIZE])[0]
-                # Remove header data from our data store
-                tmp_data = tmp_data[HEADER_SIZE:]
-
-        # Not else b/c previous clause might have constructed it
-        if current_len is not None:
-            # We should be looking for a message
-            if len(tmp_data) >= current_len:
-                # We can construct a packed
-                messages.append(tmp_data[:current_len])
-
-                # Remove the packet just constructed from out data store
-                tmp_data = tmp_data[current_len:]
-                current_len = None # Signal we are looking for another header
-
-    return messages
+    while True:
+        try:
+            amt = buffer.recv_into(connection)
+        except BlockingIOError:
+            return messages, False
+        except OSError:
+            # Reset by the peer, treated the same as an orderly close
+            return messages, True
 
+        if amt == 0:
+            return messages, True
+        messages.extend(buffer.frames())
 
-def send_full(connection, data):
+
+def pack_frame(data):
     # Create C struct (in python bytes)
     # '>i' specifies a big-endian encoded integer (a standard size of 4 bytes)
     # '>ii' does two big-endian numbers
     packed_size = struct.pack('>i', len(data))
-    # Concat the size (our 8 bytes header) and data then send
-    result = connection.sendall(packed_size+data)
+    # Concat the size (our 8 bytes header) and data
+    return packed_size+data
+
+
+def send_full(connection, data):
+    result = connection.sendall(pack_frame(data))
     assert result is None
 
 
+def encode_instr(instr, codec):
+    validateInstruction(instr)
+    return codec.encode_instr(instr)
+
+
+def decode_state(data, codec):
+    state = codec.decode_state(data)
+
+    # Binary / proto codecs parse reports on the client
+    if isinstance(state[KEY_EPISODE_MGR_REPORT], str):
+        state[KEY_EPISODE_MGR_REPORT] = parse_report(state[KEY_EPISODE_MGR_REPORT])
+
+    return state
+
+
+def is_handshake(frame):
+    return bytes(frame[:len(HANDSHAKE_PREFIX)]) == HANDSHAKE_PREFIX
+
+
+def negotiate_codec(frame, codecs):
+    '''
+    Picks the client's most preferred codec which is in `codecs` from a handshake frame.
+
+    Returns:
+      tuple: The codec (`None` if there is no codec in common) and the handshake reply to send to the client.
+    '''
+    requested = str(frame[len(HANDSHAKE_PREFIX):], 'utf-8').split(',')
+    for name in requested:
+        if name in codecs:
+            return get_codec(name), HANDSHAKE_PREFIX + name.encode('utf-8')
+
+    return None, HANDSHAKE_PREFIX
+
+
+async def async_recv_frame(reader):
+    '''
+    Reads a single length prefixed frame from an `asyncio.StreamReader`.
+
+    Returns:
+      bytes: The frame's payload or `None` if the connection was closed.
+    '''
+    try:
+        header = await reader.readexactly(HEADER_SIZE)
+        length = struct.unpack('>i', header)[0]
+        return await reader.readexactly(length)
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        return None
+
+
+def unix_socket_path(hostname):
+    '''
+    Returns:
+      str: The socket path of a `unix:///path/to/socket` hostname, `None` for any other hostname.
+    '''
+    if isinstance(hostname, str) and hostname.startswith(UNIX_PREFIX):
+        return hostname[len(UNIX_PREFIX):]
+    return None
+
+
+def _remove_stale_socket(path):
+    # A socket file left behind by a server which was not closed properly would make bind() fail. One a server is still listening on is left, so bind() fails with EADDRINUSE as it would for TCP.
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return
+    except FileNotFoundError:
+        return
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    probe.settimeout(1.0)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    except OSError:
+        # Alive but busy, or not ours to judge
+        pass
+    finally:
+        probe.close()
+
+
+def socket_file_id(path):
+    '''
+    Returns:
+      tuple: The device and inode of the file at `path`, used to tell if it is still the socket a server bound. `None` if there is no file.
+    '''
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (info.st_dev, info.st_ino)
+
+
+def unlink_socket_file(path, file_id):
+    '''
+    Removes the socket file at `path` if it is still the one identified by `file_id` (see `socket_file_id()`), and not one another server has since bound at the same path.
+    '''
+    if file_id is not None and socket_file_id(path) == file_id:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
 def get_server_host_and_port(hostname="localhost", port=57721):
     if 'AGENT_SERVER_HOSTNAME' in os.environ:
         hostname = os.environ['AGENT_SERVER_HOSTNAME']
@@ -84,138 +188,739 @@ def get_server_host_and_port(hostname="localhost", port=57721):
     return hostname, port
 
 
+def bind_listener(hostname, port, max_listen=None):
+    '''
+    Creates the non-blocking listening socket used by `ModelBridgeServer`. Hostnames starting with `unix://` bind a unix domain socket at the following path.
+    '''
+    path = unix_socket_path(hostname)
+    if path is not None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        _remove_stale_socket(path)
+        address = path
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Line below reuses the socket address if previous socket closed but improperly
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        address = (hostname, port)
+
+    try:
+        sock.bind(address)
+    except OSError:
+        sock.close()
+        raise
+    sock.settimeout(0.0) # We will handle the errors from this
+
+    if max_listen is None:
+        max_listen = 0
+
+    sock.listen(max_listen)
+    return sock
+
+
 class ModelBridgeServer:
-    def __init__(self, hostname="localhost", port=57721, max_listen=None):
+    def __init__(self, hostname="localhost", port=57721, max_listen=None, codecs=DEFAULT_SERVER_CODECS, sock=None):
+        '''
+        Args:
+          codecs (iterable): Names of the codecs (see `mivp_agent.codec`) clients may use. Add `'pickle'` only if every client is trusted, it also accepts clients which predate codec negotiation.
+          sock (socket): A listening socket from `bind_listener()` to accept clients from instead of binding a new one. This lets several processes share one address, each accepting part of the clients. The socket is not unlinked on `close()`.
+        '''
         self.host, self.port = get_server_host_and_port(
             hostname=hostname,
             port=port
         )
 
-        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        # Line below reuses the socket address if previous socket closed but improperly
-        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self._socket.bind((self.host, self.port))
-        self._socket.settimeout(0.0) # We will handle the errors from this
+        for name in codecs:
+            get_codec(name) # Raises on unknown codecs
+        self._allowed_codecs = tuple(codecs)
 
-        if max_listen is None:
-            max_listen = 0
+        self._shared = sock is not None
+        if self._shared:
+            self._socket = sock
+            self._socket.settimeout(0.0)
+            self._unix_path = None
+            if sock.family == getattr(socket, 'AF_UNIX', None):
+                self._unix_path = sock.getsockname()
+        else:
+            self._unix_path = unix_socket_path(self.host)
+            self._socket = bind_listener(self.host, self.port, max_listen)
+        # Identifies the socket file this server bound, so `close()` never removes another server's
+        self._unix_file = None
+        if self._unix_path is not None and not self._shared:
+            self._unix_file = socket_file_id(self._unix_path)
+        # Unix domain socket peers have no address, so they are numbered instead
+        self._accept_count = 0
 
-        self._socket.listen(max_listen)
         self._clients = {}
+        self._buffers = {}
+        self._codecs = {}
+        # Data which could not be written without blocking, flushed by `poll()` when the socket is writable
+        self._outgoing = {}
+        # Pre-encoded frames of instructions registered with `register_constant()`
+        self._constants = {}
+        self._constant_frames = {}
+        # States which have been received but not yet returned by `listen(addr)`
+        self._pending = {}
+        # Addresses of clients which have closed their connection
+        self._closed = set()
+        # Closed addresses which have not yet been returned by `pop_closed()`
+        self._newly_closed = []
+        # Connections which have not completed the codec handshake, as `(socket, buffer, deadline)`
+        self._handshakes = {}
+        # Addresses which have completed the handshake but not yet been returned by `poll()` or `accept()`
+        self._admitted = []
+
+        # Readiness based I/O, so callers can block until there is something to do instead of polling every socket
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._socket, selectors.EVENT_READ, None)
+
+        # Socket pair used to interrupt `poll()` from other threads (see `wakeup()`)
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, _WAKEUP)
 
     def __enter__(self):
         return self
 
-    def accept(self):
-        # Accept any connection
+    def _accept_connection(self):
+        # Accepts one pending connection into the handshake stage, it becomes a client once its codec is known
         try:
             conn, addr = self._socket.accept()
-            assert addr not in self._clients
-
-            conn.settimeout(0.0)
-            self._clients[addr] = conn
         except BlockingIOError:
+            return False
+
+        if self._unix_path is not None:
+            addr = (self._unix_path, self._accept_count)
+            self._accept_count += 1
+        assert addr not in self._clients and addr not in self._handshakes
+
+        conn.setblocking(False)
+        self._handshakes[addr] = (conn, FrameBuffer(MAX_BUFFER_SIZE), time.monotonic() + HANDSHAKE_TIMEOUT)
+        self._selector.register(conn, selectors.EVENT_READ, addr)
+        return True
+
+    def _advance_handshake(self, addr, now):
+        '''
+        Reads whatever a connection in the handshake stage has sent, without blocking. The codec is picked from its first frame, or once `HANDSHAKE_TIMEOUT` has passed without one. Connections which complete the handshake are added to `self._admitted`.
+        '''
+        conn, buffer, deadline = self._handshakes[addr]
+        frames, closed = recv_full(conn, buffer)
+
+        reply = None
+        if len(frames) != 0:
+            if is_handshake(frames[0]):
+                codec, reply = negotiate_codec(frames[0], self._allowed_codecs)
+                frames = frames[1:]
+            elif PickleCodec.name in self._allowed_codecs:
+                # Clients which predate codec negotiation send pickled states straight away
+                codec = get_codec(PickleCodec.name)
+            else:
+                codec = None
+        elif closed:
+            codec = None
+        elif now < deadline:
+            return
+        elif PickleCodec.name in self._allowed_codecs:
+            # Clients which predate codec negotiation do not send anything until instructed to
+            codec = get_codec(PickleCodec.name)
+        else:
+            codec = None
+
+        states = []
+        if codec is not None:
+            states = [decode_state(f, codec) for f in frames]
+        buffer.release()
+        del self._handshakes[addr]
+
+        if codec is None:
+            # Client went away or could not agree on a codec, tell it which if it is still listening
+            if reply is not None:
+                try:
+                    conn.send(pack_frame(reply))
+                except OSError:
+                    pass
+            self._selector.unregister(conn)
+            conn.close()
+            return
+
+        self._clients[addr] = conn
+        self._buffers[addr] = buffer
+        self._codecs[addr] = codec
+        self._pending[addr] = deque(states)
+        if reply is not None:
+            self._write(addr, pack_frame(reply))
+        if closed:
+            self._mark_closed(addr)
+        self._admitted.append(addr)
+
+    def _expire_handshakes(self, now):
+        for addr, (_, _, deadline) in list(self._handshakes.items()):
+            if deadline <= now:
+                self._advance_handshake(addr, now)
+
+    def accept(self):
+        '''
+        Accepts pending connections and advances the handshakes of connections accepted earlier. This never blocks, clients become available once their handshake is complete.
+
+        Returns:
+          tuple: The address of a client which has completed its handshake, `None` if there is none.
+        '''
+        while self._accept_connection():
+            if self._shared:
+                break
+
+        now = time.monotonic()
+        for addr in list(self._handshakes):
+            self._advance_handshake(addr, now)
+
+        if len(self._admitted) == 0:
             return None
+        return self._admitted.pop(0)
+
+    def poll(self, timeout=None):
+        '''
+        Blocks until a new connection is pending, a client has sent data, `wakeup()` is called, or the timeout expires. Pending connections are accepted before returning, and become clients once their codec handshake is complete.
+
+        Args:
+          timeout (float): Maximum time in seconds to wait. `None` will wait indefinitely and `0` will return immediately.
+
+        Returns:
+          tuple: A list of addresses which have completed their handshake and a list of addresses which are ready to be read with `listen(addr)`.
+        '''
+        if len(self._handshakes) != 0:
+            # Wake up for the first handshake to time out
+            first = min(deadline for _, _, deadline in self._handshakes.values())
+            wait = max(0.0, first - time.monotonic())
+            if timeout is None or wait < timeout:
+                timeout = wait
+
+        readable = []
+        events = self._selector.select(timeout)
+        now = time.monotonic()
+        for key, mask in events:
+            if key.fileobj is self._socket:
+                while self._accept_connection():
+                    # Leave the rest of the backlog to the other processes sharing the socket
+                    if self._shared:
+                        break
+            elif key.data is _WAKEUP:
+                self._drain_wakeup()
+            elif key.data in self._handshakes:
+                self._advance_handshake(key.data, now)
+            else:
+                if mask & selectors.EVENT_WRITE:
+                    self._flush(key.data)
+                if mask & selectors.EVENT_READ:
+                    readable.append(key.data)
+        self._expire_handshakes(now)
+
+        accepted = self._admitted
+        self._admitted = []
+        # States can also be received during the handshake
+        for addr in accepted:
+            if len(self._pending[addr]) != 0 and addr not in readable:
+                readable.append(addr)
+
+        return accepted, readable
+
+    def wakeup(self):
+        '''
+        Causes a current or the next call to `poll()` to return. This method is safe to call from any thread.
+        '''
+        try:
+            self._wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            # Buffer full means a wakeup is already pending, closed means there is nothing to wake
+            pass
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_r.recv(MAX_BUFFER_SIZE):
+                pass
+        except BlockingIOError:
+            pass
+
+    def register_constant(self, instr):
+        '''
+        Marks an instruction dictionary as constant. It is validated once and its encoding is cached per codec, so sending it again costs no validation or serialization.
+
+        **NOTE:** The dictionary is recognized by identity and must not be modified after it is registered.
+        '''
+        validateInstruction(instr)
+        self._constants[id(instr)] = instr
+
+    def _encode(self, addr, instr):
+        codec = self._codecs[addr]
+
+        if id(instr) in self._constants:
+            key = (id(instr), codec.name)
+            if key not in self._constant_frames:
+                self._constant_frames[key] = pack_frame(codec.encode_instr(instr))
+            return self._constant_frames[key]
+
+        return pack_frame(encode_instr(instr, codec))
+
+    def _mark_closed(self, addr):
+        if addr not in self._closed:
+            self._selector.unregister(self._clients[addr])
+            self._closed.add(addr)
+            self._newly_closed.append(addr)
+        self._outgoing.pop(addr, None)
+
+    def pop_closed(self):
+        '''
+        Returns:
+          list: The addresses of clients whose connection has been closed or has failed since the last call. They stay in the client list until `remove_client()` is called.
+        '''
+        closed = self._newly_closed
+        self._newly_closed = []
+        return closed
+
+    def remove_client(self, addr):
+        '''
+        Closes a client's connection and forgets its address. Unknown addresses are ignored.
+        '''
+        if addr not in self._clients:
+            return
+
+        if addr not in self._closed:
+            self._selector.unregister(self._clients[addr])
+        self._clients.pop(addr).close()
+        del self._buffers[addr]
+        del self._codecs[addr]
+        del self._pending[addr]
+        self._outgoing.pop(addr, None)
+        self._closed.discard(addr)
+
+    def _write(self, addr, data):
+        # Non-blocking write, whatever the socket will not take now is sent by `poll()` later
+        if addr in self._closed:
+            return False
+
+        if addr in self._outgoing:
+            self._outgoing[addr].extend(data)
+            return True
+
+        try:
+            sent = self._clients[addr].send(data)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._mark_closed(addr)
+            return False
+
+        if sent != len(data):
+            self._outgoing[addr] = bytearray(data[sent:])
+            self._selector.modify(self._clients[addr], selectors.EVENT_READ | selectors.EVENT_WRITE, addr)
+        return True
+
+    def _flush(self, addr):
+        if addr not in self._outgoing:
+            return
+
+        data = self._outgoing[addr]
+        try:
+            sent = self._clients[addr].send(data)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._mark_closed(addr)
+            return
 
-        return addr
+        del data[:sent]
+        if len(data) == 0:
+            del self._outgoing[addr]
+            self._selector.modify(self._clients[addr], selectors.EVENT_READ, addr)
 
     def send_instr(self, addr, instr):
+        '''
+        Returns:
+          bool: `False` if the client's connection has been closed, `True` otherwise
+        '''
         if addr not in self._clients:
             raise RuntimeError('Address not in client list')
 
-        validateInstruction(instr)
-        send_full(self._clients[addr], pickle.dumps(instr))
-        return True
+        return self._write(addr, self._encode(addr, instr))
+
+    def send_many(self, instrs):
+        '''
+        Sends instructions to many clients in one pass. Writes never block, data a socket can not take right away is sent from `poll()` once the socket is writable.
+
+        Args:
+          instrs (iterable): `(addr, instr)` pairs
+
+        Returns:
+          list: The addresses which could not be sent to because their connection has been closed or removed
+        '''
+        failed = []
+        for addr, instr in instrs:
+            if addr not in self._clients:
+                failed.append(addr)
+                continue
+
+            if not self._write(addr, self._encode(addr, instr)):
+                failed.append(addr)
+
+        return failed
 
     def listen(self, addr):
+        '''
+        Returns:
+          dict: The oldest state received from `addr` which has not been returned yet, `None` if there is none.
+        '''
         if addr not in self._clients:
             raise RuntimeError('Address not in client list')
 
-        try:
-            msgs = recv_full(self._clients[addr])
-        except BlockingIOError:
+        if len(self._pending[addr]) == 0:
+            self._pending[addr].extend(self.listen_all(addr))
+
+        if len(self._pending[addr]) == 0:
             return None
+        return self._pending[addr].popleft()
+
+    def listen_all(self, addr):
+        '''
+        Returns:
+          list: Every state which has been received from `addr` in the order they were sent. The list will be empty if there is nothing new.
+        '''
+        if addr not in self._clients:
+            raise RuntimeError('Address not in client list')
 
-        assert len(msgs) == 1, 'State should only come one at a time'
-        state = pickle.loads(msgs[0])
+        states = list(self._pending[addr])
+        self._pending[addr].clear()
 
-        if state[KEY_EPISODE_MGR_REPORT] is not None:
-            state[KEY_EPISODE_MGR_REPORT] = parse_report(state[KEY_EPISODE_MGR_REPORT])
+        if addr in self._closed:
+            return states
 
-        return state
+        msgs, closed = recv_full(self._clients[addr], self._buffers[addr])
+        codec = self._codecs[addr]
+        for data in msgs:
+            states.append(decode_state(data, codec))
+
+        if closed:
+            # Stop polling the socket, it would be reported as readable forever
+            self._mark_closed(addr)
+
+        return states
 
     def close_clients(self):
+        for conn, _, _ in self._handshakes.values():
+            self._selector.unregister(conn)
+            conn.close()
+        self._handshakes = {}
+        self._admitted = []
         for client in self._clients:
+            if client not in self._closed:
+                self._selector.unregister(self._clients[client])
             self._clients[client].close()
+        self._clients = {}
+        self._buffers = {}
+        self._codecs = {}
+        self._outgoing = {}
+        self._pending = {}
+        self._closed = set()
+        self._newly_closed = []
 
     def close(self):
         self.close_clients()
         if self._socket is not None:
+            self._selector.close()
             self._socket.close()
+            self._wakeup_r.close()
+            self._wakeup_w.close()
+            self._socket = None
+
+            if self._unix_file is not None:
+                unlink_socket_file(self._unix_path, self._unix_file)
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.close()
 
 
+class AsyncBridgeConnection:
+    '''
+    A single client connection of `AsyncModelBridgeServer`.
+    '''
+    def __init__(self, addr, reader, writer, codec, states=()):
+        self._reader = reader
+        self._writer = writer
+        self._codec = codec
+        # States received during the handshake
+        self._pending = deque(states)
+        self.addr = addr
+
+    async def send_instr(self, instr):
+        self._writer.write(pack_frame(encode_instr(instr, self._codec)))
+        await self._writer.drain()
+        return True
+
+    async def listen(self):
+        '''
+        Returns:
+          dict: The next state sent by the client or `None` if the client has disconnected.
+        '''
+        if len(self._pending) != 0:
+            return self._pending.popleft()
+
+        data = await async_recv_frame(self._reader)
+        if data is None:
+            return None
+
+        return decode_state(data, self._codec)
+
+    def close(self):
+        self._writer.close()
+
+
+class AsyncModelBridgeServer:
+    '''
+    The asyncio counterpart of `ModelBridgeServer`. Instead of being polled, every client connection is handed to the `on_connect` coroutine as an `AsyncBridgeConnection` and served as its own task on the event loop.
+    '''
+    def __init__(self, on_connect, hostname="localhost", port=57721, codecs=DEFAULT_SERVER_CODECS):
+        self.host, self.port = get_server_host_and_port(
+            hostname=hostname,
+            port=port
+        )
+
+        for name in codecs:
+            get_codec(name) # Raises on unknown codecs
+        self._allowed_codecs = tuple(codecs)
+
+        self._unix_path = unix_socket_path(self.host)
+        self._unix_file = None
+        self._accept_count = 0
+
+        self._on_connect = on_connect
+        self._server = None
+        self._connections = {}
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def start(self):
+        if self._unix_path is not None:
+            sock = bind_listener(self.host, self.port)
+            self._unix_file = socket_file_id(self._unix_path)
+            self._server = await asyncio.start_unix_server(
+                self._handle_connection,
+                sock=sock
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_connection,
+                host=self.host,
+                port=self.port,
+                reuse_address=True
+            )
+
+    async def _handshake(self, reader, writer):
+        try:
+            frame = await asyncio.wait_for(async_recv_frame(reader), HANDSHAKE_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Clients which predate codec negotiation do not send anything until instructed to
+            frame = b''
+
+        if frame is None:
+            return None, []
+
+        if is_handshake(frame):
+            codec, reply = negotiate_codec(frame, self._allowed_codecs)
+            writer.write(pack_frame(reply))
+            await writer.drain()
+            return codec, []
+        elif PickleCodec.name in self._allowed_codecs:
+            codec = get_codec(PickleCodec.name)
+            states = []
+            if len(frame) != 0:
+                states.append(decode_state(frame, codec))
+            return codec, states
+
+        return None, []
+
+    async def _handle_connection(self, reader, writer):
+        codec, states = await self._handshake(reader, writer)
+        if codec is None:
+            writer.close()
+            return
+
+        if self._unix_path is not None:
+            addr = (self._unix_path, self._accept_count)
+            self._accept_count += 1
+        else:
+            addr = writer.get_extra_info('peername')
+
+        conn = AsyncBridgeConnection(addr, reader, writer, codec, states)
+        self._connections[conn] = asyncio.current_task()
+        try:
+            await self._on_connect(conn)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._connections.pop(conn, None)
+            conn.close()
+
+    async def close_clients(self):
+        tasks = list(self._connections.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self.close_clients()
+            await self._server.wait_closed()
+            self._server = None
+
+            if self._unix_path is not None:
+                unlink_socket_file(self._unix_path, self._unix_file)
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
 class ModelBridgeClient:
-    def __init__(self, hostname="localhost", port=57721):
+    def __init__(self, hostname="localhost", port=57721, codecs=DEFAULT_CODECS):
+        '''
+        Args:
+          codecs (iterable): Names of the codecs (see `mivp_agent.codec`) this client supports, in order of preference. The codec used is negotiated with the server in `connect()`.
+        '''
         self.host, self.port = get_server_host_and_port(
             hostname=hostname,
             port=port
         )
 
+        for name in codecs:
+            get_codec(name) # Raises on unknown codecs
+        self._supported_codecs = tuple(codecs)
+        self._codec = None
+        self._unix_path = unix_socket_path(self.host)
+
         self._socket = None
+        self._buffer = FrameBuffer(MAX_BUFFER_SIZE)
+        self._pending = deque()
 
     def __enter__(self):
         return self
 
     def is_connected(self):
-        return self._socket is not None
+        return self._codec is not None
+
+    def _reset(self):
+        self._socket.close()
+        self._socket = None
+        self._codec = None
+        self._buffer = FrameBuffer(MAX_BUFFER_SIZE)
+        self._pending = deque()
 
     def connect(self):
-        if self._socket is not None:
+        '''
+        Connects to the server and negotiates a codec without blocking for more than a moment. The handshake is completed by later calls, so this should be called until it returns `True`.
+
+        Returns:
+          bool: True once connected and the codec has been negotiated
+
+        Raises:
+          RuntimeError: If the server does not support any of the client's codecs
+        '''
+        if self._codec is not None:
             raise RuntimeError("Clients should not be connect more than once")
 
-        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self._socket is None:
+            if self._unix_path is not None:
+                self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                address = self._unix_path
+            else:
+                self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                address = (self.host, self.port)
+
+            # Attempt connection with timeout
+            try:
+                # Not 0.0 timeout cause connect is strang with that
+                self._socket.settimeout(0.001)
+                self._socket.connect(address)
+                send_full(self._socket, HANDSHAKE_PREFIX + ','.join(self._supported_codecs).encode('utf-8'))
+            except (socket.timeout, ConnectionError, FileNotFoundError):
+                # Clean up socket and signal failure in event of timeout
+                self._reset()
+                return False
+            self._socket.settimeout(0.0)
 
-        # Attempt connection with timeout
         try:
-            # Not 0.0 timeout cause connect is strang with that
-            self._socket.settimeout(0.001)
-            self._socket.connect((self.host, self.port))
-            self._socket.settimeout(0.0)
-        except (socket.timeout, ConnectionRefusedError):
-            # Clean up socket
-            self._socket.close()
-            self._socket = None
-            # Signal failure in event of timeout
+            self._codec = self._handshake()
+        except EOFError:
+            self._reset()
             return False
-        # Return status
-        return True
+        except RuntimeError:
+            self._reset()
+            raise
+
+        return self._codec is not None
+
+    def _handshake(self):
+        # Returns the codec picked by the server, `None` if its reply has not arrived yet
+        frames, closed = recv_full(self._socket, self._buffer)
+        if len(frames) == 0:
+            if closed:
+                raise EOFError('Server closed the connection during the handshake')
+            return None
+
+        reply = bytes(frames[0])
+        if not is_handshake(reply):
+            raise RuntimeError('Unexpected handshake reply from server')
+
+        name = str(reply[len(HANDSHAKE_PREFIX):], 'utf-8')
+        if name == '':
+            raise RuntimeError(f'Server does not support any of the codecs: {self._supported_codecs}')
+        codec = get_codec(name)
+
+        # The server may send its first instruction right behind the reply
+        for data in frames[1:]:
+            instr = codec.decode_instr(data)
+            validateInstruction(instr)
+            self._pending.append(instr)
+
+        return codec
+
+    def codec(self):
+        '''
+        Returns:
+          Codec: The codec negotiated with the server, `None` if not connected.
+        '''
+        return self._codec
 
     def send_state(self, msg):
-        if self._socket is None:
+        if self._codec is None:
             return False
 
         validateState(msg)
-        send_full(self._socket, pickle.dumps(msg))
+        send_full(self._socket, self._codec.encode_state(msg))
         return True
 
-    def listen(self):
-        if self._socket is None:
-            return False
+    def listen(self, timeout=0.0):
+        '''
+        Args:
+          timeout (float): Seconds to wait for an instruction if none has been received yet. `None` will wait indefinitely and `0` will return immediately.
 
-        try:
-            msgs = recv_full(self._socket)
-        except BlockingIOError:
+        Returns:
+          dict: The oldest instruction received from the server or `False` if there is none
+        '''
+        if self._codec is None:
             return False
 
-        assert len(msgs) == 1, 'Instructions should only come one at a time'
-        instr = pickle.loads(msgs[0])
-
-        validateInstruction(instr)
+        if len(self._pending) == 0:
+            if timeout != 0.0:
+                select.select([self._socket], [], [], timeout)
+            msgs, _ = recv_full(self._socket, self._buffer)
+            for data in msgs:
+                instr = self._codec.decode_instr(data)
+                validateInstruction(instr)
+                self._pending.append(instr)
 
-        return instr
+        if len(self._pending) == 0:
+            return False
+        return self._pending.popleft()
 
     def close(self):
         if self._socket is not None:
@@ -0,0 +1,40 @@
+from argparse import ArgumentParser, Namespace
+
+from mivp_agent.manager import MissionManager
+from mivp_agent.sharded_manager import ShardedMissionManager
+from mivp_agent.bench import bench_manager, bench_driver
+
+TARGETS = ('manager', 'sharded', 'driver')
+
+
+class BenchCLI:
+    def __init__(self, parser: ArgumentParser):
+        self.parser = parser
+
+        self.parser.set_defaults(func=self.do_it)
+        self.parser.add_argument('target', choices=TARGETS, help="What to measure.")
+        self.parser.add_argument('-n', '--vehicles', type=int, default=10, help="Number of fake vehicles.")
+        self.parser.add_argument('-d', '--duration', type=float, default=10.0, help="Seconds to measure for.")
+        self.parser.add_argument('-r', '--node-reports', type=int, default=0, help="Node reports in each state.")
+        self.parser.add_argument('-e', '--episode-steps', type=int, default=100, help="States in each episode.")
+        self.parser.add_argument('-p', '--processes', type=int, default=1, help="Processes to run the fake vehicles in.")
+        self.parser.add_argument('-l', '--log', action='store_true', help="Log transitions while measuring.")
+
+    def do_it(self, args: Namespace):
+        options = {
+            'vehicles': args.vehicles,
+            'duration': args.duration,
+            'processes': args.processes,
+            'log': args.log,
+            'node_reports': args.node_reports,
+            'episode_steps': args.episode_steps
+        }
+
+        if args.target == 'driver':
+            result = bench_driver(**options)
+        elif args.target == 'sharded':
+            result = bench_manager(manager_type=ShardedMissionManager, **options)
+        else:
+            result = bench_manager(manager_type=MissionManager, **options)
+
+        print(result.summary())
@@ -6,6 +6,7 @@ from .log import Log
 from .inspect.inspector import Inspector
 from .deploy import DeployCLI
 from .run import RunCLI
+from .bench import BenchCLI
 
 parser = argparse.ArgumentParser()
 subparsers = parser.add_subparsers()
@@ -15,6 +16,7 @@ RunCLI(subparsers.add_parser('run'))
 Info(subparsers.add_parser('info'))
 Log(subparsers.add_parser('log'))
 Inspector(subparsers.add_parser('inspect'))
+BenchCLI(subparsers.add_parser('bench'))
 
 
 def main():
@@ -0,0 +1,307 @@
+import struct
+import pickle
+from abc import ABC, abstractmethod
+
+from mivp_agent.const import KEY_ID, KEY_EPISODE_MGR_REPORT, KEY_EPISODE_MGR_STATE
+from mivp_agent.util.parse import parse_report
+from mivp_agent.proto import translate
+from mivp_agent.proto.mivp_agent_pb2 import State, Action
+
+
+class Codec(ABC):
+    '''
+    Codecs translate the state / instruction dictionaries passed over the bridge to and from bytes. Which codec a connection uses is negotiated when `ModelBridgeClient` connects.
+    '''
+    # Used to identify the codec during negotiation
+    name = None
+
+    @abstractmethod
+    def encode_state(self, state) -> bytes:
+        pass
+
+    @abstractmethod
+    def decode_state(self, data) -> dict:
+        pass
+
+    @abstractmethod
+    def encode_instr(self, instr) -> bytes:
+        pass
+
+    @abstractmethod
+    def decode_instr(self, data) -> dict:
+        pass
+
+
+class PickleCodec(Codec):
+    '''
+    Serializes with `pickle`. This supports arbitrary values but **should only be used with trusted peers** as unpickling data can execute code.
+    '''
+    name = 'pickle'
+
+    def encode_state(self, state):
+        return pickle.dumps(state)
+
+    def decode_state(self, data):
+        return pickle.loads(data)
+
+    def encode_instr(self, instr):
+        return pickle.dumps(instr)
+
+    def decode_instr(self, data):
+        return pickle.loads(data)
+
+
+# Type tags for values which are not part of the fixed schema
+_TAG_FLOAT = b'd'[0]
+_TAG_INT = b'i'[0]
+_TAG_STR = b's'[0]
+_TAG_BOOL = b'b'[0]
+_TAG_NONE = b'n'[0]
+
+# Markers for optional fields
+_ABSENT = 0
+_NONE = 1
+_PRESENT = 2
+
+_CORE_STATE_KEYS = (
+    KEY_ID,
+    KEY_EPISODE_MGR_REPORT,
+    'NAV_X',
+    'NAV_Y',
+    'NAV_HEADING',
+    'MOOS_TIME',
+    'NODE_REPORTS'
+)
+_NODE_REPORT_KEYS = ('NAV_X', 'NAV_Y', 'NAV_HEADING', 'MOOS_TIME')
+
+_U8 = struct.Struct('>B')
+_U32 = struct.Struct('>I')
+_DOUBLE = struct.Struct('>d')
+_INT = struct.Struct('>q')
+_BOOL = struct.Struct('>?')
+_NAV = struct.Struct('>dddd')
+_REPORT = struct.Struct('>id??')
+_ACTION = struct.Struct('>dd')
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def str(self):
+        length, = self.unpack(_U32)
+        value = str(self.data[self.offset:self.offset + length], 'utf-8')
+        self.offset += length
+        return value
+
+
+def _pack_str(parts, value):
+    value = value.encode('utf-8')
+    parts.append(_U32.pack(len(value)))
+    parts.append(value)
+
+
+def _pack_value(parts, key, value):
+    # NOTE: bool is checked before int as it is a subclass of int
+    if isinstance(value, bool):
+        parts.append(_U8.pack(_TAG_BOOL) + _BOOL.pack(value))
+    elif isinstance(value, float):
+        parts.append(_U8.pack(_TAG_FLOAT) + _DOUBLE.pack(value))
+    elif isinstance(value, int):
+        parts.append(_U8.pack(_TAG_INT) + _INT.pack(value))
+    elif isinstance(value, str):
+        parts.append(_U8.pack(_TAG_STR))
+        _pack_str(parts, value)
+    elif value is None:
+        parts.append(_U8.pack(_TAG_NONE))
+    else:
+        raise TypeError(f"Unsupported type for binary codec at {key}:{value}")
+
+
+def _unpack_value(reader):
+    tag, = reader.unpack(_U8)
+    if tag == _TAG_BOOL:
+        return reader.unpack(_BOOL)[0]
+    elif tag == _TAG_FLOAT:
+        return reader.unpack(_DOUBLE)[0]
+    elif tag == _TAG_INT:
+        return reader.unpack(_INT)[0]
+    elif tag == _TAG_STR:
+        return reader.str()
+    elif tag == _TAG_NONE:
+        return None
+    raise ValueError(f"Unknown type tag '{tag}' in binary codec data")
+
+
+def _pack_vars(parts, variables):
+    parts.append(_U32.pack(len(variables)))
+    for key, value in variables:
+        _pack_str(parts, key)
+        _pack_value(parts, key, value)
+
+
+def _unpack_vars(reader, into):
+    count, = reader.unpack(_U32)
+    for _ in range(count):
+        key = reader.str()
+        into[key] = _unpack_value(reader)
+
+
+class BinaryCodec(Codec):
+    '''
+    A compact fixed schema encoding built on `struct`. The core keys of a state (`NAV_X`, `NAV_Y`, `NAV_HEADING`, `MOOS_TIME`, `NODE_REPORTS` and the episode report) are written as fixed size fields and any other MOOS vars as tagged `float`, `int`, `str`, `bool` or `None` values.
+
+    Episode reports sent as strings are parsed with `parse_report()` by the encoder, so decoded states always contain the parsed dictionary.
+    '''
+    name = 'binary'
+
+    def encode_state(self, state):
+        parts = []
+        _pack_str(parts, state[KEY_ID])
+        parts.append(_NAV.pack(
+            state['MOOS_TIME'],
+            state['NAV_X'],
+            state['NAV_Y'],
+            state['NAV_HEADING']
+        ))
+
+        if KEY_EPISODE_MGR_REPORT not in state:
+            parts.append(_U8.pack(_ABSENT))
+        elif state[KEY_EPISODE_MGR_REPORT] is None:
+            parts.append(_U8.pack(_NONE))
+        else:
+            report = state[KEY_EPISODE_MGR_REPORT]
+            if isinstance(report, str):
+                report = parse_report(report)
+            parts.append(_U8.pack(_PRESENT))
+            parts.append(_REPORT.pack(
+                report['NUM'],
+                report['DURATION'],
+                report['SUCCESS'],
+                report['WILL_PAUSE']
+            ))
+
+        if 'NODE_REPORTS' not in state:
+            parts.append(_U8.pack(_ABSENT))
+        else:
+            reports = state['NODE_REPORTS']
+            parts.append(_U8.pack(_PRESENT))
+            parts.append(_U32.pack(len(reports)))
+            for vname, report in reports.items():
+                if len(report) != len(_NODE_REPORT_KEYS):
+                    raise ValueError(f"Node report for '{vname}' must have exactly the keys {_NODE_REPORT_KEYS}")
+                _pack_str(parts, vname)
+                parts.append(_NAV.pack(
+                    report['MOOS_TIME'],
+                    report['NAV_X'],
+                    report['NAV_Y'],
+                    report['NAV_HEADING']
+                ))
+
+        _pack_vars(parts, [(k, v) for k, v in state.items() if k not in _CORE_STATE_KEYS])
+
+        return b''.join(parts)
+
+    def decode_state(self, data):
+        reader = _Reader(data)
+
+        state = {KEY_ID: reader.str()}
+        state['MOOS_TIME'], state['NAV_X'], state['NAV_Y'], state['NAV_HEADING'] = reader.unpack(_NAV)
+
+        marker, = reader.unpack(_U8)
+        if marker == _NONE:
+            state[KEY_EPISODE_MGR_REPORT] = None
+        elif marker == _PRESENT:
+            num, duration, success, will_pause = reader.unpack(_REPORT)
+            state[KEY_EPISODE_MGR_REPORT] = {
+                'NUM': num,
+                'DURATION': duration,
+                'SUCCESS': success,
+                'WILL_PAUSE': will_pause
+            }
+
+        marker, = reader.unpack(_U8)
+        if marker == _PRESENT:
+            reports = {}
+            count, = reader.unpack(_U32)
+            for _ in range(count):
+                vname = reader.str()
+                report = {}
+                report['MOOS_TIME'], report['NAV_X'], report['NAV_Y'], report['NAV_HEADING'] = reader.unpack(_NAV)
+                reports[vname] = report
+            state['NODE_REPORTS'] = reports
+
+        _unpack_vars(reader, state)
+
+        return state
+
+    def encode_instr(self, instr):
+        parts = [_ACTION.pack(instr['speed'], instr['course'])]
+        _pack_str(parts, instr['ctrl_msg'])
+        _pack_vars(parts, list(instr['posts'].items()))
+
+        return b''.join(parts)
+
+    def decode_instr(self, data):
+        reader = _Reader(data)
+
+        instr = {}
+        instr['speed'], instr['course'] = reader.unpack(_ACTION)
+        instr['ctrl_msg'] = reader.str()
+        instr['posts'] = {}
+        _unpack_vars(reader, instr['posts'])
+
+        return instr
+
+
+class ProtoCodec(Codec):
+    '''
+    Encodes with the protobuf messages in `mivp_agent.proto` (the same format used for logging). MOOS vars are limited to the `float`, `str` and `bool` types supported by `MOOSVar`, other vars with a value of `None` are dropped, and decoded node reports include a `vname` key.
+    '''
+    name = 'proto'
+
+    def encode_state(self, state):
+        state = {k: v for k, v in state.items() if v is not None or k in _CORE_STATE_KEYS}
+        if isinstance(state.get(KEY_EPISODE_MGR_REPORT), str):
+            state[KEY_EPISODE_MGR_REPORT] = parse_report(state[KEY_EPISODE_MGR_REPORT])
+
+        return translate.state_from_dict(state).SerializeToString()
+
+    def decode_state(self, data):
+        proto_state = State()
+        proto_state.ParseFromString(bytes(data))
+
+        state = translate.state_to_dict(proto_state)
+        state.setdefault(KEY_EPISODE_MGR_STATE, None)
+        return state
+
+    def encode_instr(self, instr):
+        return translate.action_from_dict(instr).SerializeToString()
+
+    def decode_instr(self, data):
+        proto_action = Action()
+        proto_action.ParseFromString(bytes(data))
+        return translate.action_to_dict(proto_action)
+
+
+CODECS = {
+    codec.name: codec for codec in (BinaryCodec(), ProtoCodec(), PickleCodec())
+}
+
+# In order of preference
+DEFAULT_CODECS = ('binary', 'proto', 'pickle')
+
+# Codecs servers accept unless told otherwise. Pickle is opt-in, as unpickling a client's data can run arbitrary code on the server.
+DEFAULT_SERVER_CODECS = ('binary', 'proto')
+
+
+def get_codec(name):
+    if name not in CODECS:
+        raise ValueError(f"Unknown codec '{name}'")
+    return CODECS[name]
@@ -1,9 +1,12 @@
+from contextlib import ExitStack
 from dataclasses import dataclass
-from typing import Any, Tuple, List
-from threading import Lock
+from typing import Any, Tuple, List, Union
+from queue import Queue
+from threading import Lock, Thread, Event, Semaphore
 
 from mivp_agent.manager import MissionManager
 from mivp_agent.agent import Agent
+from mivp_agent.util.data_structures import ColumnarBatch
 
 
 @dataclass
@@ -16,6 +19,8 @@ class VehicleCache:
     # Because BHV_Agent expects an action with every message and we don't want to call `state_to_action` for every message, we store the existing state
     # TODO: Modify BHV_Agent to replace previous if no action is passed?
     current_action: Any = None
+    # The version of the model snapshot `current_action` was inferred with
+    current_version: int = None
 
 
 @dataclass
@@ -23,10 +28,18 @@ class Transition:
     s1: Any
     action: Any
     s2: Any
+    # The version of the model snapshot which chose `action`, for off-policy correction of stale batches
+    version: int = None
+    vid: str = None
+    # If `s2` is in a later episode than `s1`
+    done: bool = False
 
 
 Batch = List[Transition]
 
+# Put on the pipeline's queue by the collection thread once it has finished
+_PIPELINE_DONE = object()
+
 
 class Driver:
     def __init__(
@@ -34,12 +47,19 @@ class Driver:
         agent_template: Agent,
         expect_agents: int = None,
         log: bool = True,
+        columnar: bool = False,
     ) -> None:
         self._agent_template = agent_template
         self._model = self._agent_template.build_model()
+        # Use the agent's batched inference if it has implemented it
+        self._batched = getattr(type(agent_template), 'states_to_actions', Agent.states_to_actions) is not Agent.states_to_actions
 
         self._expect_agents = expect_agents
         self._log = log
+        # Collect into a `ColumnarBatch` instead of a list of `Transition`s
+        self._columnar = columnar
+        # The size of the largest columnar batch so far, so later ones are allocated large enough up front
+        self._columnar_capacity = 1024
 
         # TODO: Why is task name needed?
         self._mgr = MissionManager('driver', log=self._log)
@@ -49,6 +69,7 @@ class Driver:
 
         self._context_lock = Lock() # Purpose: Never use 'with Driver' twice
         self._work_lock = Lock() # Purpose: Only call sample / run once... other behavior is undefined
+        self._stop_collecting = Event() # Purpose: Tell a pipelined collection thread to finish early
 
     def __enter__(self):
         if not self._context_lock.acquire(False):
@@ -59,7 +80,7 @@ class Driver:
     
     def _pause_all(self):
         # Put every connected vehicle into the paused state
-        while not all(self._mgr.episode_state(vid) == 'PAUSED' for vid in self._mgr.get_ids()):
+        while not self._mgr.in_episode_state(self._mgr.get_connected_ids(), 'PAUSED'):
             msg = self._mgr.get_message()
             if msg.episode_state == 'PAUSED':
                 msg.request_new()
@@ -87,14 +108,24 @@ class Driver:
             agent, _ = self._agent_data[vid]
             self._agent_data[vid] = (agent, VehicleCache())
 
-    def sample(self, batches, episodes_per_batch):
+    def sample(self, batches, episodes_per_batch, pipeline=False, max_staleness=1):
         '''
-        This method is used to collect a number of batches of episodes with specified size. It will `yield` the results after each batch is completed and put the vehicles in pause until control is returned for the next batch collection.
+        This method is used to collect a number of batches of episodes with specified size. It will `yield` the results after each batch is completed and put the vehicles in pause until control is returned for the next batch collection. Batches are lists of `Transition`s, or a [`ColumnarBatch`][mivp_agent.util.data_structures.ColumnarBatch] if the Driver was made with `columnar=True`, in which case actions are stored as given by the agent's `action_to_array()`.
+
+        With `pipeline=True` the vehicles are not paused between batches. Collection carries on in a background thread while the caller trains on the batch it was given, so the simulations are never left idle for the length of a training step. The actions are inferred with whichever snapshot of the model is current, so the caller should hand its updates to the collection thread with `model.publish()`, or make them in place under `model.wlock()` if the model never publishes. Each transition records the version it was collected with. The collection thread stays at most `max_staleness` finished batches ahead of the caller, when it gets that far ahead it waits (leaving the vehicles waiting on their responses) until the caller asks for the next batch. Transitions spanning the end of a batch go into the next one. The vehicles are paused once all batches have been collected or the generator is closed.
 
         NOTE: To guard against undefined behavior this method will grab a locking primitive to prevent against simultaneous calls.
 
         Additionally there is a check to make sure the Driver's context has been acquired by at least one source. This assures that the`MissionManager` server thread is started and open for communication.
+
+        Args:
+          batches (int): The number of batches to collect, may be `float('inf')`
+          episodes_per_batch (int): The number of episodes which complete a batch
+          pipeline (bool): Collect the next batch while the caller works on the last one
+          max_staleness (int): With `pipeline`, the most finished batches waiting for the caller
         '''
+        assert max_staleness >= 1, "max_staleness must be at least one batch"
+
         # Someone has to have acquired the context (not a great guarantee of anything really)
         if self._context_lock.acquire(False):
             self._context_lock.release()
@@ -106,68 +137,176 @@ class Driver:
 
         self._preflight_check()
 
-        completed_batches = 0
-        while completed_batches < batches:
-            # Collect batches of transitions and yield them one at a time for training
-            yield self._collect_batch(episodes_per_batch)
+        if pipeline:
+            yield from self._sample_pipelined(batches, episodes_per_batch, max_staleness)
+        else:
+            completed_batches = 0
+            while completed_batches < batches:
+                # Collect batches of transitions and yield them one at a time for training
+                yield self._collect_batch(episodes_per_batch)
+                completed_batches += 1
 
         self._work_lock.release()
 
-    def _collect_batch(self, episodes) -> Batch:
-        self._reset_caches()
+    def _sample_pipelined(self, batches, episodes, max_staleness):
+        ready = Queue()
+        # One permit per batch the collection thread may finish before the caller takes it
+        permits = Semaphore(max_staleness)
+
+        thread = Thread(target=self._pipeline_thread, args=(batches, episodes, ready, permits), daemon=True)
+        thread.start()
+
+        try:
+            while True:
+                item = ready.get()
+                if item is _PIPELINE_DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                permits.release()
+                yield item
+        finally:
+            # Also reached when the caller closes the generator early
+            self._stop_collecting.set()
+            permits.release()
+            thread.join()
+            self._stop_collecting.clear()
+
+    def _pipeline_thread(self, batches, episodes, ready, permits):
+        try:
+            completed_batches = 0
+            while completed_batches < batches:
+                # Wait until there is room for another batch before collecting it
+                permits.acquire()
+                if self._stop_collecting.is_set():
+                    break
+
+                # Transitions and episodes in progress carry over to the next batch
+                batch = self._collect_batch(episodes, reset=completed_batches == 0, pause=False)
+                if self._stop_collecting.is_set():
+                    break
+                ready.put(batch)
+                completed_batches += 1
+
+            self._pause_all()
+            ready.put(_PIPELINE_DONE)
+        except Exception as e:
+            ready.put(e)
+
+    def _collect_batch(self, episodes, reset=True, pause=True) -> Union[Batch, ColumnarBatch]:
+        if reset:
+            self._reset_caches()
 
         collected_episodes = 0
-        batch: Batch = []
-        while collected_episodes < episodes:
-            msg = self._mgr.get_message()
-
-            # Start vehicle if not started
-            if msg.episode_state == 'PAUSED':
-                msg.mark_transition() # Initial state should be a transition
-                msg.start()
-
-                continue # Don't try to use the message to react to
-
-            agent, cache = self._find_or_create_data(msg.vid)
-            current_state = agent.observation_to_state(msg.observation)
+        if self._columnar:
+            batch = ColumnarBatch(self._columnar_capacity)
+        else:
+            batch = []
+        while collected_episodes < episodes and not self._stop_collecting.is_set():
+            # Every vehicle waiting on an action is handled together
+            msgs = self._mgr.get_messages()
+
+            acting = []
+            # Vehicles which arrived in a new state and need an action from the model
+            new_states = []
+            new_episodes = []
+            for msg in msgs:
+                # Start vehicle if not started
+                if msg.episode_state == 'PAUSED':
+                    msg.mark_transition() # Initial state should be a transition
+                    msg.start()
+
+                    continue # Don't try to use the message to react to
+
+                agent, cache = self._find_or_create_data(msg.vid)
+                current_state = agent.observation_to_state(msg.observation)
+
+                if cache.last_state != current_state:
+                    msg.mark_transition() # For logger
+
+                    # If we have the information to fully construct a transition, do so and store
+                    if cache.last_state is not None and cache.current_action is not None:
+                        if self._columnar:
+                            batch.append(
+                                cache.last_state,
+                                agent.action_to_array(cache.current_action),
+                                current_state,
+                                msg.vid,
+                                cache.last_episode,
+                                cache.last_episode != msg.episode_report['NUM'],
+                                cache.current_version
+                            )
+                        else:
+                            batch.append(Transition(
+                                cache.last_state,
+                                cache.current_action,
+                                current_state,
+                                cache.current_version,
+                                msg.vid,
+                                cache.last_episode != msg.episode_report['NUM']
+                            ))
+
+                    new_states.append((agent, cache, current_state, msg.observation))
+                    cache.last_state = current_state
+
+                if cache.last_episode != msg.episode_report['NUM']:
+                    # If this is not the first episode, increment the count bc we have completed the previous episode
+                    if cache.last_episode is not None:
+                        collected_episodes += 1
+
+                    cache.last_episode = msg.episode_report['NUM']
+                    new_episodes.append(agent)
+
+                acting.append((msg, cache))
+
+            # Get new actions from model and update caches
+            if len(new_states) != 0:
+                self._infer(new_states)
+
+            for agent in new_episodes:
+                agent.start_episode()
 
-            if cache.last_state != current_state:
-                msg.mark_transition() # For logger
+            # Preform the actions specified in the caches
+            if len(acting) != 0:
+                self._mgr.act_many(
+                    [msg for msg, _ in acting],
+                    [cache.current_action for _, cache in acting]
+                )
 
-                # If we have the information to fully construct a transition, do so and store
-                if cache.last_state is not None and cache.current_action is not None:
-                    batch.append(Transition(
-                        cache.last_state,
-                        cache.current_action,
-                        current_state
-                    ))
+        if self._columnar:
+            self._columnar_capacity = max(self._columnar_capacity, batch.capacity)
 
-                # Get new action from model and update cache
-                with self._model.rlock():
-                    cache.current_action = agent.state_to_action(
-                        self._model,
-                        current_state,
-                        msg.observation
-                    )
+        # Pause all vehicles and return the collected batch of transitions
+        if pause:
+            self._pause_all()
+        return batch
 
-                cache.last_state = current_state
+    def _infer(self, new_states):
+        # One snapshot for every vehicle in the tick, without blocking the trainer's `publish()`
+        with self._model.pin() as snapshot, self._inference_lock(snapshot):
+            if self._batched:
+                actions = self._agent_template.states_to_actions(
+                    self._model,
+                    [state for _, _, state, _ in new_states],
+                    [observation for _, _, _, observation in new_states]
+                )
+                assert len(actions) == len(new_states), "states_to_actions must return one action for each state"
+            else:
+                actions = [agent.state_to_action(self._model, state, observation) for agent, _, state, observation in new_states]
 
-            if cache.last_episode != msg.episode_report['NUM']:
-                # If this is not the first episode, increment the count bc we have completed the previous episode
-                if cache.last_episode is not None:
-                    collected_episodes += 1
+        for (_, cache, _, _), action in zip(new_states, actions):
+            cache.current_action = action
+            cache.current_version = snapshot.version
 
-                cache.last_episode = msg.episode_report['NUM']
-                agent.start_episode()
-
-            # Preform the action specified in the cache
-            msg.act(cache.current_action)
-        
-        # Pause all vehicles and return the collected batch of transitions
-        self._pause_all()
-        return batch
+    def _inference_lock(self, snapshot):
+        # Models which have never published are updated in place under `wlock()`
+        if snapshot.version == 0:
+            return self._model.rlock()
+        # An empty `ExitStack` does nothing, `contextlib.nullcontext` is not available on Python 3.6
+        return ExitStack()
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self._mgr.__exit__()
+        self._mgr.__exit__(exc_type, exc_value, traceback)
 
         self._context_lock.release()
\ No newline at end of file
@@ -0,0 +1,178 @@
+import os
+import traceback
+from queue import Queue, Full
+from threading import Thread
+
+from mivp_agent.const import KEY_ID
+from mivp_agent.proto.proto_logger import ProtoLogger
+from mivp_agent.proto.mivp_agent_pb2 import Transition
+from mivp_agent.proto import translate
+
+
+class TransitionLogger:
+    '''
+    Writes the transitions of each vehicle to a `ProtoLogger` at `<path>/log_<vname>`, or `<path>/log_<vname>_<n>` if that is already taken by another logger. A transition is made of the last state marked as a transition, the action sent in response to it, and the next state marked as a transition.
+    '''
+
+    def __init__(self, path, whitelist=None):
+        '''
+        Args:
+          path (str): The session's log directory
+          whitelist (list): If set, only the vehicles with these vnames will be logged
+        '''
+        self._path = path
+        self._whitelist = whitelist
+
+        self._logs = {}
+        self._last_state = {}
+        self._last_act = {}
+
+    def log(self, state, action, is_transition):
+        '''
+        Records a state and the action which was sent in response to it.
+        '''
+        vid = state[KEY_ID]
+
+        # Check in whitelist if exists
+        if self._whitelist is not None:
+            if vid not in self._whitelist:
+                return
+
+        # Check if this is a new vehicle
+        if vid not in self._logs:
+            path = os.path.join(self._path, f"log_{vid}")
+            n = 0
+            while os.path.exists(path):
+                n += 1
+                path = os.path.join(self._path, f"log_{vid}_{n}")
+            self._logs[vid] = ProtoLogger(path, Transition, mode='w')
+
+        if is_transition:
+            # Write a transition if this is not the first state ever
+            if vid in self._last_state:
+                t = Transition()
+                t.s1.CopyFrom(translate.state_from_dict(self._last_state[vid]))
+                t.a.CopyFrom(translate.action_from_dict(self._last_act[vid]))
+                t.s2.CopyFrom(translate.state_from_dict(state))
+
+                self._logs[vid].write(t)
+
+            # Update the storage for next transition
+            self._last_state[vid] = state
+            self._last_act[vid] = action
+
+    def forget(self, vid):
+        '''
+        Drops the last state of a vehicle, for example when it disconnects, so the next transition written for it does not span the gap. Its log stays open.
+        '''
+        self._last_state.pop(vid, None)
+        self._last_act.pop(vid, None)
+
+    def close(self):
+        for vehicle in self._logs:
+            self._logs[vehicle].close()
+
+
+POLICY_BLOCK = 'block'
+POLICY_DROP = 'drop'
+
+POLICIES = (
+    POLICY_BLOCK,
+    POLICY_DROP
+)
+
+
+class AsyncTransitionLogger:
+    '''
+    Runs a `TransitionLogger` on a writer thread so the caller never waits on protobuf serialization, compression or disk. Calls to `log()` are put on a bounded queue which the thread works through in order.
+
+    When the queue is full the `'block'` policy waits for space, while the `'drop'` policy discards the call and counts it in `dropped`. A dropped state is missing from the log, and the vehicle's last state is forgotten before its next state is written, so no transition spans the gap.
+    '''
+
+    def __init__(self, path, whitelist=None, max_queue=10000, policy=POLICY_BLOCK):
+        '''
+        Args:
+          path (str): The session's log directory
+          whitelist (list): If set, only the vehicles with these vnames will be logged
+          max_queue (int): The maximum number of calls waiting to be written
+          policy (str): `'block'` or `'drop'`, what to do when the queue is full
+        '''
+        assert policy in POLICIES, f"Unsupported policy '{policy}'"
+
+        self._logger = TransitionLogger(path, whitelist=whitelist)
+        self._policy = policy
+        self._queue = Queue(maxsize=max_queue)
+        self.dropped = 0
+        # Vehicles with a dropped state, their last state is forgotten before their next one is logged
+        self._gaps = set()
+
+        self._thread = Thread(target=self._write_thread, daemon=True)
+        self._thread.start()
+
+    def _write_thread(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            method, args = item
+            try:
+                method(*args)
+            except Exception:
+                # Keep writing, a dead writer would leave the manager blocked on a full queue
+                traceback.print_exc()
+
+    def log(self, state, action, is_transition):
+        '''
+        Queues a state and the action which was sent in response to it to be written, see `TransitionLogger.log()`.
+        '''
+        item = (self._logger.log, (state, action, is_transition))
+        if self._policy == POLICY_BLOCK:
+            self._queue.put(item)
+            return
+
+        vid = state[KEY_ID]
+        if vid in self._gaps:
+            item = (self._log_after_gap, (state, action, is_transition))
+
+        try:
+            self._queue.put_nowait(item)
+        except Full:
+            self.dropped += 1
+            # Only states marked as transitions are kept as the start of the next transition
+            if is_transition:
+                self._gaps.add(vid)
+        else:
+            self._gaps.discard(vid)
+
+    def _log_after_gap(self, state, action, is_transition):
+        self._logger.forget(state[KEY_ID])
+        self._logger.log(state, action, is_transition)
+
+    def forget(self, vid):
+        '''
+        Queues `TransitionLogger.forget()` behind the calls already queued. It is never dropped.
+        '''
+        self._queue.put((self._logger.forget, (vid,)))
+
+    def pending(self):
+        '''
+        Returns:
+          int: The approximate number of calls waiting to be written
+        '''
+        return self._queue.qsize()
+
+    def close(self):
+        '''
+        Writes everything which has been queued and closes the underlying logs.
+        '''
+        if self._thread is None:
+            return
+
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._logger.close()
+
+        if self.dropped != 0:
+            print(f'Warning: {self.dropped} transition log writes were dropped because the log queue was full')
@@ -1,19 +1,40 @@
 # General
 import os
 import time
+import warnings
 from queue import Queue, Empty
-from threading import Thread, Lock
+from collections import deque
+from threading import Thread, Lock, Condition, Event
 
 # For core
-from mivp_agent.const import KEY_ID, DATA_DIRECTORY
-from mivp_agent.messages import MissionMessage, INSTR_SEND_STATE, INSTR_RESET_FAILURE, INSTR_RESET_SUCCESS
+from mivp_agent.const import KEY_ID, KEY_EPISODE_MGR_REPORT, KEY_EPISODE_MGR_STATE, DATA_DIRECTORY
+from mivp_agent.messages import MissionMessage, StepBatch, action_to_instr, INSTR_SEND_STATE, INSTR_START, INSTR_PAUSE, INSTR_STOP, INSTR_RESET_FAILURE, INSTR_RESET_SUCCESS
 from mivp_agent.bridge import ModelBridgeServer
+from mivp_agent.util.metrics import MessageMetrics
+from mivp_agent.util.message_queue import MessageQueue, POLICY_BLOCK as QUEUE_POLICY_BLOCK
 
 # For logging
 from mivp_agent.log.directory import LogDirectory
-from mivp_agent.proto.proto_logger import ProtoLogger
-from mivp_agent.proto.mivp_agent_pb2 import Transition
-from mivp_agent.proto import translate
+from mivp_agent.log.transitions import AsyncTransitionLogger, POLICY_BLOCK
+
+FALLBACK_REPEAT = 'repeat'
+FALLBACK_REQUEST_NEW = 'request_new'
+FALLBACK_ZERO_SPEED = 'zero_speed'
+
+FALLBACKS = (
+    FALLBACK_REPEAT,
+    FALLBACK_REQUEST_NEW,
+    FALLBACK_ZERO_SPEED
+)
+
+# Responses which are not actions, and so are never repeated by `FALLBACK_REPEAT`
+_CONTROL_INSTRS = {id(instr) for instr in (INSTR_SEND_STATE, INSTR_START, INSTR_PAUSE, INSTR_STOP, INSTR_RESET_SUCCESS, INSTR_RESET_FAILURE)}
+
+
+def _warn_sleep(sleep):
+    # `sleep` used to be the second positional argument of the `wait_for` methods, before they waited on a condition
+    if sleep is not None:
+        warnings.warn('`sleep` is ignored and will be removed, the wait_for methods wake as soon as a vehicle connects', DeprecationWarning, stacklevel=3)
 
 
 class MissionManager:
@@ -32,7 +53,7 @@ class MissionManager:
       ```
     '''
 
-    def __init__(self, task, log=True, immediate_transition=True, log_whitelist=None, id_suffix=None, output_dir=None):
+    def __init__(self, task, log=True, immediate_transition=True, log_whitelist=None, id_suffix=None, output_dir=None, metrics_file=None, metrics_interval=10.0, log_queue_size=10000, log_policy=POLICY_BLOCK, max_queue=None, max_queue_per_vehicle=None, queue_policy=QUEUE_POLICY_BLOCK, scheduler=None, response_deadline=None, deadline_fallback=FALLBACK_REPEAT):
         '''
         The initializer for MissionManager
 
@@ -48,22 +69,74 @@ class MissionManager:
             id_suffix (str): Will be appended to the generated session id.
 
             output_dir (str): Path to a place to store files.
+
+            metrics_file (str): If set, the output of `stats()` will be appended to this file as a line of JSON every `metrics_interval` seconds and on close.
+
+            metrics_interval (float): Seconds between writes to `metrics_file`.
+
+            log_queue_size (int): Transitions are written by a separate thread so the server never waits on the disk. This is the most which can be waiting to be written.
+
+            log_policy (str): What to do when `log_queue_size` transitions are waiting. `'block'` waits for the writer thread, `'drop'` discards the transition.
+
+            max_queue (int): The most messages waiting for `get_message()`, `None` for no limit. Bounding the queue keeps a stalled learner from growing memory without limit.
+
+            max_queue_per_vehicle (int): The most messages from one vehicle waiting for `get_message()`, `None` for no limit.
+
+            queue_policy (str): What to do when a queue bound is reached. `'block'` stops reading states until the learner catches up, `'drop_oldest'` drops the oldest message and `'coalesce'` keeps only the latest message of each vehicle. Dropped messages are answered with `INSTR_SEND_STATE` so their vehicle sends a fresh state, and are not logged as transitions.
+
+            scheduler (Scheduler): Decides which vehicle's message `get_message()` returns next, see `mivp_agent.util.scheduler`. Defaults to the oldest message of any vehicle. A `RoundRobinScheduler` keeps fast vehicles from starving the others, a `WeightedScheduler` or `PriorityScheduler` gives some vehicles more of the learner's attention.
+
+            response_deadline (float): If set, messages which have not been responded to this many seconds after their state was received are answered by the manager, so a slow or forgetful learner does not freeze the simulation. Such messages are marked `timed_out` and taken out of the queue if `get_message()` has not returned them yet.
+
+            deadline_fallback (str): How messages are answered after `response_deadline`. `'repeat'` repeats the last action sent to the vehicle, `'request_new'` asks for a new state and `'zero_speed'` stops the vehicle on its last course. `'repeat'` falls back to `'request_new'` until the vehicle has been sent an action.
         '''
-        self._msg_queue = Queue()
+        assert deadline_fallback in FALLBACKS, f"Unsupported fallback '{deadline_fallback}'"
+        assert response_deadline is None or response_deadline > 0, "response_deadline must be positive"
+
+        self._msg_queue = MessageQueue(max_queue, max_queue_per_vehicle, queue_policy, scheduler)
+        self._metrics = MessageMetrics()
+        self._metrics.gauges['queue'] = self._queue_occupancy
+        self._metrics.gauges['fallbacks'] = self._fallback_counts
+        self._metrics_file = metrics_file
+        self._metrics_interval = metrics_interval
 
         self._vnames = []
+        self._address_map = {}
+        self._addr_vnames = {}
+        # Registered vehicles whose connection has been lost
+        self._disconnected = set()
         self._vname_lock = Lock()
         self._vehicle_count = 0
+        self._disconnect_callbacks = []
+        self._reconnect_callbacks = []
         self._episode_manager_states = {}
         self._ems_lock = Lock()
         self._episode_manager_nums = {}
         self._emn_lock = Lock()
+        # Notified whenever a vehicle is registered, disconnects or its episode state changes
+        self._vehicles_cond = Condition()
 
         # Dict to hold queues of vnames to reset
         self._vresets = Queue()
+        # Messages which have been responded to but not yet sent, see `_response_ready()`
+        self._ready = deque()
+        # Messages received by `step()` which belong in a later batch
+        self._step_held = deque()
+        # Stale client addresses for the server thread to remove, see `_evict()`
+        self._evicted = []
+
+        self._response_deadline = response_deadline
+        self._deadline_fallback = deadline_fallback
+        # `(deadline, message)` in the order states were received, see `_expire_responses()`
+        self._deadlines = deque()
+        self._deadlines_added = Event()
+        self._last_msgs = {}
+        self._last_actions = {}
+        self._fallbacks = {}
 
         self._thread = None
         self._stop_signal = False
+        self._server = None
 
         if output_dir is None:
             output_dir = os.path.join(
@@ -88,16 +161,24 @@ class MissionManager:
 
         self._log = log
         self._imm_transition = immediate_transition
+        self._logger = None
         if self._log:
             self._log_whitelist = log_whitelist
-            # Create data structs needed to log data from each vehicle
-            self._logs = {}
-            self._last_state = {}
-            self._last_act = {}
+            self._log_queue_size = log_queue_size
+            self._log_policy = log_policy
+            self._logger = self._make_logger()
 
             # Go ahead and create the log path
             os.makedirs(self._log_path)
 
+    def _make_logger(self):
+        return AsyncTransitionLogger(
+            self._log_path,
+            whitelist=self._log_whitelist,
+            max_queue=self._log_queue_size,
+            policy=self._log_policy
+        )
+
     def _init_session(self, id_suffix):
         # Start the session id with the current timestamp
         id = str(round(time.time()))
@@ -136,109 +217,264 @@ class MissionManager:
         if self._thread is not None:
             return False
 
+        # Bind in the calling thread so the server is ready (and bind errors are raised) before returning
+        self._server = ModelBridgeServer()
         self._thread = Thread(target=self._server_thread, daemon=True)
         self._thread.start()
+        self._start_metrics()
 
         return True
 
+    def _start_metrics(self):
+        if self._metrics_file is not None:
+            self._metrics.start_dumping(self._metrics_file, self._metrics_interval)
+
+    def _wakeup(self):
+        self._server.wakeup()
+
+    def _response_ready(self, msg):
+        # Called from whichever thread responded to the message
+        self._ready.append(msg)
+        self._wakeup()
+
+    def _responses_ready(self, msgs):
+        self._ready.extend(msgs)
+        self._wakeup()
+
+    def _handle_state(self, addr, state, message_type=MissionMessage, notify=None):
+        '''
+        Updates vehicle registries from a state received at `addr` and constructs the message which will be handed to the user.
+        '''
+        vname = state[KEY_ID]
+        reconnected = False
+        stale = None
+        with self._vname_lock:
+            assert self._addr_vnames.get(addr, vname) == vname, "Vehicle changed vname. This violates routing / logging assumptions made by MissionManager"
+
+            if vname not in self._address_map:
+                print(f'Got new vehicle: {vname}')
+                self._address_map[vname] = addr
+                self._addr_vnames[addr] = vname
+                self._vnames.append(vname)
+                self._vehicle_count += 1
+            elif self._address_map[vname] != addr:
+                # A restarted simulation, the old connection may not have been noticed as closed yet
+                if vname not in self._disconnected:
+                    stale = self._address_map[vname]
+                self._addr_vnames.pop(self._address_map[vname], None)
+                self._address_map[vname] = addr
+                self._addr_vnames[addr] = vname
+                self._disconnected.discard(vname)
+                reconnected = True
+
+        if reconnected:
+            print(f'Vehicle reconnected: {vname}')
+            if stale is not None:
+                self._evict(stale)
+            if self._logger is not None:
+                self._logger.forget(vname)
+            for callback in self._reconnect_callbacks:
+                callback(vname)
+
+        m = message_type(
+          addr,
+          state,
+          is_transition=self._imm_transition,
+          notify=notify
+        )
+
+        # The vehicle has the response to its last state, which is the action a deadline fallback repeats
+        last = self._last_msgs.get(m.vid)
+        if last is not None and last._response is not None and id(last._response) not in _CONTROL_INSTRS:
+            self._last_actions[m.vid] = last._response
+        self._last_msgs[m.vid] = m
+
+        # Read from the state so the message's own fields stay lazy
+        report = state[KEY_EPISODE_MGR_REPORT]
+        with self._ems_lock:
+            self._episode_manager_states[vname] = state[KEY_EPISODE_MGR_STATE]
+        with self._emn_lock:
+            if report is None:
+                self._episode_manager_nums[vname] = None
+            else:
+                self._episode_manager_nums[vname] = report['NUM']
+
+        with self._vehicles_cond:
+            self._vehicles_cond.notify_all()
+
+        return m
+
+    def _evict(self, addr):
+        # Runs on the server thread, the stale client is removed once the current pass is done with it
+        self._evicted.append(addr)
+
+    def _vehicle_disconnected(self, addr):
+        '''
+        Marks the vehicle at `addr` as disconnected, unless it has already reconnected from another address.
+        '''
+        with self._vname_lock:
+            vname = self._addr_vnames.pop(addr, None)
+            if vname is None or self._address_map[vname] != addr:
+                # Closed before sending a state or replaced by a newer connection
+                return
+            self._disconnected.add(vname)
+
+        print(f'Lost connection to vehicle: {vname}')
+        if self._logger is not None:
+            self._logger.forget(vname)
+        with self._vehicles_cond:
+            self._vehicles_cond.notify_all()
+        # A `step()` waiting on every connected vehicle may now have them all
+        self._wake_step()
+        for callback in self._disconnect_callbacks:
+            callback(vname)
+
+    def _wake_step(self):
+        self._msg_queue.wake()
+
+    def _enqueue(self, m):
+        self._track_deadline(m)
+        m._times['enqueue'] = time.perf_counter()
+        for dropped in self._msg_queue.put(m):
+            # Ask for a fresh state instead of acting on a stale one
+            dropped._is_transition = False
+            dropped._set_response(INSTR_SEND_STATE)
+
+    def _queue_occupancy(self):
+        return self._msg_queue.occupancy()
+
+    def _track_deadline(self, m):
+        if self._response_deadline is None:
+            return
+
+        self._deadlines.append((m._times['read'] + self._response_deadline, m))
+        if len(self._deadlines) == 1:
+            self._deadlines_added.set()
+
+    def _fallback_instr(self, m):
+        last = self._last_actions.get(m.vid)
+        if self._deadline_fallback == FALLBACK_REPEAT and last is not None:
+            return last
+        if self._deadline_fallback == FALLBACK_ZERO_SPEED:
+            course = 0.0 if last is None else last['course']
+            return action_to_instr({'speed': 0.0, 'course': course})
+        return INSTR_SEND_STATE
+
+    def _discard(self, m):
+        self._msg_queue.discard(m)
+
+    def _expire_responses(self):
+        '''
+        Answers the messages whose deadline has passed with the fallback.
+
+        Returns:
+          float: Seconds until the next deadline, `None` if no message is waiting for a response
+        '''
+        now = time.perf_counter()
+        while len(self._deadlines) != 0:
+            deadline, m = self._deadlines[0]
+            if m._response is None and deadline > now:
+                return deadline - now
+            self._deadlines.popleft()
+
+            if m._response is None:
+                self._answer_late(m)
+        return None
+
+    def _answer_late(self, m):
+        self._discard(m)
+        if m._time_out(self._fallback_instr(m)):
+            self._fallbacks[m.vid] = self._fallbacks.get(m.vid, 0) + 1
+
+    def _deadline_thread(self):
+        # For managers without a server loop to check deadlines in
+        while not self._stop_signal:
+            self._deadlines_added.clear()
+            self._deadlines_added.wait(self._expire_responses())
+
+    def _fallback_counts(self):
+        fallbacks = dict(self._fallbacks)
+        return {
+            'total': sum(fallbacks.values()),
+            'vehicles': fallbacks
+        }
+
+    def _reset_instr(self, vname, success):
+        if vname not in self._address_map:
+            raise RuntimeError(
+                f'Received reset for unknown vehicle: {vname}')
+
+        if success:
+            return INSTR_RESET_SUCCESS
+        return INSTR_RESET_FAILURE
+
     def _server_thread(self):
-        live_msg_list = []
-        address_map = {}
-        with ModelBridgeServer() as server:
+        with self._server as server:
+            for instr in (INSTR_SEND_STATE, INSTR_START, INSTR_PAUSE, INSTR_STOP, INSTR_RESET_SUCCESS, INSTR_RESET_FAILURE):
+                server.register_constant(instr)
+
+            # Seconds until the earliest response deadline
+            timeout = None
             while not self._stop_signal:
-                # Accept new clients
-                addr = server.accept()
-                if addr is not None:
+                # Block until there is a new client, a state, a response deadline or a wakeup from a response / reset / close
+                accepted, readable = server.poll(timeout)
+
+                for addr in accepted:
                     print(f'Got new connection: {addr}')
                     server.send_instr(addr, INSTR_SEND_STATE)
 
-                # Listen for messages from vehicles
-                for addr in server._clients:
-                    msg = server.listen(addr)
-
-                    if msg is not None:
-                        with self._vname_lock:
-                            if msg[KEY_ID] not in self._vnames:
-                                print(f'Got new vehicle: {msg[KEY_ID]}')
-                                vname = msg[KEY_ID]
-                                address_map[vname] = addr
-                                self._vnames.append(vname)
-                                self._vehicle_count += 1
-
-                        assert address_map[msg[KEY_ID]] == addr, "Vehicle changed vname. This violates routing / logging assumptions made by MissionManager"
-
-                        m = MissionMessage(
-                          addr,
-                          msg,
-                          is_transition=self._imm_transition
-                        )
-
-                        with self._ems_lock:
-                            self._episode_manager_states[m.vid] = m.episode_state
-                        with self._emn_lock:
-                            if m.episode_report is None:
-                                self._episode_manager_nums[m.vid] = None
-                            else:
-                                self._episode_manager_nums[m.vid] = m.episode_report['NUM']
-
-                        live_msg_list.append(m)
-                        self._msg_queue.put(m)
-
-                # Send responses to vehicle message if there are any
-                for i, m in enumerate(live_msg_list):
-                    with m._rsp_lock:
-                        if m._response is None:
-                            continue
+                # Listen for messages from vehicles, draining everything each one has sent
+                for addr in readable:
+                    msgs = server.listen_all(addr)
+                    read = time.perf_counter()
+                    for msg in msgs:
+                        m = self._handle_state(addr, msg, notify=self._response_ready)
+                        m._times['read'] = read
+
+                        self._enqueue(m)
+
+                # Answer messages which have run out of time, these are sent below
+                timeout = self._expire_responses()
+
+                # Send the responses which have been set since the last pass
+                responded = []
+                while len(self._ready) != 0:
+                    responded.append(self._ready.popleft())
 
-                        # If we got there is response send and remove from list
-                        live_msg_list.remove(m)
-                        server.send_instr(m._addr, m._response)
+                if len(responded) != 0:
+                    # Responses to vehicles which have gone away are dropped
+                    failed = set(server.send_many([(m._addr, m._response) for m in responded]))
 
-                        # Do logging
+                    sent = time.perf_counter()
+                    for m in responded:
+                        if m._addr in failed:
+                            continue
+                        m._times['sent'] = sent
+                        self._metrics.record(m)
                         self._do_logging(m)
 
                 # Handle reseting of vehicles
                 while not self._vresets.empty():
                     vname, success = self._vresets.get()
-
-                    if vname not in address_map:
-                        raise RuntimeError(
-                            f'Received reset for unknown vehicle: {vname}')
-
-                    instr = INSTR_RESET_FAILURE
-                    if success:
-                        instr = INSTR_RESET_SUCCESS
-
-                    server.send_instr(address_map[vname], instr)
+                    instr = self._reset_instr(vname, success)
+                    if not self.is_connected(vname):
+                        print(f'Warning: not resetting disconnected vehicle: {vname}')
+                        continue
+                    server.send_instr(self._address_map[vname], instr)
+
+                # Forget clients which have gone away or been replaced
+                for addr in server.pop_closed():
+                    server.remove_client(addr)
+                    self._vehicle_disconnected(addr)
+                while len(self._evicted) != 0:
+                    server.remove_client(self._evicted.pop())
 
     # This message should only be called on msgs which have actions
     def _do_logging(self, msg):
-        if not self._log:
+        if self._logger is None:
             return
 
-        # Check in whitelist if exists
-        if self._log_whitelist is not None:
-            if msg.vid not in self._log_whitelist:
-                return
-
-        # Check if this is a new vehicle
-        if msg.vid not in self._logs:
-            path = os.path.join(self._log_path, f"log_{msg.vid}")
-            self._logs[msg.vid] = ProtoLogger(path, Transition, mode='w')
-
-        if msg._is_transition:
-            # Write a transition if this is not the first state ever
-            if msg.vid in self._last_state:
-                t = Transition()
-                t.s1.CopyFrom(translate.state_from_dict(self._last_state[msg.vid]))
-                t.a.CopyFrom(translate.action_from_dict(self._last_act[msg.vid]))
-                t.s2.CopyFrom(translate.state_from_dict(msg.observation))
-
-                self._logs[msg.vid].write(t)
-
-            # Update the storage for next transition
-            self._last_state[msg.vid] = msg.observation
-            self._last_act[msg.vid] = msg._response
+        self._logger.log(msg.observation, msg._response, msg._is_transition)
 
     def are_present(self, vnames):
         '''
@@ -255,29 +491,99 @@ class MissionManager:
                     return False
         return True
 
-    def wait_for(self, vnames, sleep=0.1):
+    def wait_for(self, vnames, sleep=None, *, timeout=None):
         '''
         Used to block until a specified list of vehicles has connect to the `MissionManager` instance.
 
         Args:
           vnames (iterable): A list / tuple of `str` values to look for
-          sleep (float): Amount of time in seconds to sleep for between checks
+          sleep (float): **Deprecated** and ignored, the method is woken as soon as a vehicle connects
+          timeout (float): Maximum number of seconds to wait, `None` waits forever
+
+        Returns:
+          bool: False if the timeout passed before every vehicle connected, True otherwise
         '''
-        while not self.are_present(vnames):
-            time.sleep(sleep)
-    
-    def wait_for_count(self, count, sleep=0.1):
+        _warn_sleep(sleep)
+        with self._vehicles_cond:
+            return self._vehicles_cond.wait_for(lambda: self.are_present(vnames), timeout)
+
+    def is_connected(self, vname):
+        '''
+        Args:
+          vname (str): The vname of a vehicle
+
+        Returns:
+          bool: True if the vehicle has connected and its connection has not been lost since
+        '''
+        with self._vname_lock:
+            return vname in self._address_map and vname not in self._disconnected
+
+    def on_disconnect(self, callback):
+        '''
+        Registers a function to be called with a vehicle's vname when its connection is lost, for example when its simulation crashes. States it sent before then may still be returned by `get_message()`, responses to them are dropped.
+
+        **NOTE:** Callbacks are run on the thread serving the vehicles and should return quickly.
+        '''
+        self._disconnect_callbacks.append(callback)
+
+    def on_reconnect(self, callback):
+        '''
+        Registers a function to be called with a vehicle's vname when a vehicle which has been seen before connects again, for example after its simulation restarts. Its transitions continue in the same log, starting from its first state after reconnecting.
+
+        **NOTE:** Callbacks are run on the thread serving the vehicles and should return quickly.
+        '''
+        self._reconnect_callbacks.append(callback)
+
+    def wait_for_count(self, count, sleep=None, *, timeout=None):
         '''
         Used to block until a specified number of vehicles have connected to the `MissionManager` instance.
 
         Args:
-          vnames (int): The number of vehicles to wait for
-          sleep (float): Amount of time in seconds to sleep for between checks
+          count (int): The number of vehicles to wait for
+          sleep (float): **Deprecated** and ignored, the method is woken as soon as a vehicle connects
+          timeout (float): Maximum number of seconds to wait, `None` waits forever
+
+        Returns:
+          bool: False if the timeout passed before enough vehicles connected, True otherwise
+        '''
+        _warn_sleep(sleep)
+        with self._vehicles_cond:
+            return self._vehicles_cond.wait_for(lambda: self._vehicle_count >= count, timeout)
+
+    def in_episode_state(self, vnames, state):
+        '''
+        Used to see if the `pEpisodeManager` of every vehicle in a list last reported a specific state.
+
+        See also: [`wait_for_episode_state()`][mivp_agent.manager.MissionManager.wait_for_episode_state]
+
+        Args:
+          vnames (iterable): A list / tuple of `str` values to check
+          state (str): The state to check for, for example `'PAUSED'`
         '''
-        while not self._vehicle_count <= count:
-            time.sleep(sleep)
+        with self._ems_lock:
+            for vname in vnames:
+                if self._episode_manager_states.get(vname) != state:
+                    return False
+        return True
 
-    def get_message(self, block=True) -> MissionMessage:
+    def wait_for_episode_state(self, vnames, state, *, timeout=None):
+        '''
+        Used to block until the `pEpisodeManager` of every vehicle in a list has reported a specific state.
+
+        **Note:** A vehicle's episode state only changes when it sends a new state, so the messages of vehicles which are being waited on must still be answered from another thread.
+
+        Args:
+          vnames (iterable): A list / tuple of `str` values to look for
+          state (str): The state to wait for, for example `'PAUSED'`
+          timeout (float): Maximum number of seconds to wait, `None` waits forever
+
+        Returns:
+          bool: False if the timeout passed first, True otherwise
+        '''
+        with self._vehicles_cond:
+            return self._vehicles_cond.wait_for(lambda: self.in_episode_state(vnames, state), timeout)
+
+    def get_message(self, block=True, timeout=None) -> MissionMessage:
         '''
         Used as the primary method for receiving data from `BHV_Agent`.
 
@@ -285,6 +591,7 @@ class MissionManager:
 
         Args:
           block (bool): A boolean specifying if the method will wait until a message present or return immediately
+          timeout (float): When blocking, the maximum number of seconds to wait. `None` waits indefinitely.
 
         Returns:
           obj: A instance of [`MissionMessage()`][mivp_agent.manager.MissionMessage] or `None` depending on the blocking behavior
@@ -307,10 +614,157 @@ class MissionManager:
           ```
         '''
         try:
-            return self._msg_queue.get(block=block)
+            m = self._msg_queue.get(block=block, timeout=timeout)
         except Empty:
             return None
 
+        m._times['dequeue'] = time.perf_counter()
+        return m
+
+    def get_messages(self, max_n=None, timeout=None):
+        '''
+        Used to receive every pending message at once, for example to run one batched inference for the whole fleet. If no message is pending, this waits until one arrives or the timeout expires.
+
+        Args:
+          max_n (int): The most messages to return, `None` for no limit
+          timeout (float): The maximum number of seconds to wait for the first message. `None` waits indefinitely and `0` returns immediately.
+
+        Returns:
+          list: Instances of [`MissionMessage()`][mivp_agent.manager.MissionMessage] in the order they were received, empty if the timeout expired
+
+        Example:
+          ```
+            msgs = mgr.get_messages()
+            actions = policy([msg.observation for msg in msgs])
+            mgr.act_many(msgs, actions)
+          ```
+        '''
+        return self._get_messages(max_n, timeout)
+
+    def _get_messages(self, max_n, timeout, wakeable=False):
+        # Take everything under one acquisition of the queue's lock instead of one per message
+        msgs = self._msg_queue.get_many(max_n, timeout, wakeable=wakeable)
+
+        dequeue = time.perf_counter()
+        for m in msgs:
+            m._times['dequeue'] = dequeue
+        return msgs
+
+    def act_many(self, msgs, actions):
+        '''
+        Responds to many messages at once, the same as calling `act()` on each message but with a single hand off to the thread which sends them.
+
+        Args:
+          msgs (list): Messages from `get_messages()` or `get_message()`
+          actions (list): An action (see [`MissionMessage.act()`][mivp_agent.manager.MissionMessage.act]) for each message
+        '''
+        assert len(msgs) == len(actions), "There must be exactly one action for each message"
+
+        instrs = [action_to_instr(action) for action in actions]
+        # Checked before any response is set, so a bad message can't leave the others claimed but never sent
+        for m in msgs:
+            m._assert_no_rsp()
+
+        ready = []
+        try:
+            for m, instr in zip(msgs, instrs):
+                if m._set_response(instr, notify=False):
+                    ready.append(m)
+        finally:
+            self._responses_ready(ready)
+
+    def step(self, timeout=None, vnames=None) -> StepBatch:
+        '''
+        Waits for a state from every vehicle, or until the timeout expires, and returns them as one batch aligned with the vehicle names. This is meant for lockstep training loops, where every vehicle is acted on once per step.
+
+        **NOTE:** `step()` takes messages from the same queue as `get_message()`. A second state from a vehicle which is already in the batch, or a state from a vehicle not in `vnames`, is held for the next call to `step()`.
+
+        Args:
+          timeout (float): The maximum number of seconds to wait. `None` waits until every vehicle has sent a state.
+          vnames (list): The vehicles to wait for, defaults to every connected vehicle (including any which connect while waiting, and not any whose connection is lost while waiting).
+
+        Returns:
+          StepBatch: The messages aligned with `vnames`, with `None` and an entry in `missing` for vehicles which did not send a state in time
+
+        Example:
+          ```
+            mgr.wait_for_count(4)
+            while True:
+              batch = mgr.step(timeout=1.0)
+              msgs = batch.received()
+              mgr.act_many(msgs, policy([m.observation for m in msgs]))
+          ```
+        '''
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        received = {}
+        held = []
+        timed_out = False
+
+        # Start with what was held back by the last call
+        pending = list(self._step_held)
+        self._step_held.clear()
+        while True:
+            expected = self._step_sort(pending, received, held, vnames)
+            if len(expected) != 0 and all(vname in received for vname in expected):
+                break
+
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+
+            # Also woken when a vehicle disconnects, which may complete the batch
+            pending = self._get_messages(None, remaining, wakeable=True)
+
+        return self._step_batch(expected, received, held, timed_out)
+
+    def _step_sort(self, pending, received, held, vnames):
+        # Adds messages to the step's batch, or holds them for the next step, and returns the vehicles expected
+        for m in pending:
+            if m.vid in received or (vnames is not None and m.vid not in vnames):
+                held.append(m)
+            else:
+                received[m.vid] = m
+
+        return vnames if vnames is not None else self.get_connected_ids()
+
+    def _step_batch(self, expected, received, held, timed_out):
+        self._step_held.extend(held)
+
+        expected = list(expected)
+        return StepBatch(
+            vnames=expected,
+            messages=[received.get(vname) for vname in expected],
+            missing=[vname for vname in expected if vname not in received],
+            timed_out=timed_out
+        )
+
+    def stats(self):
+        '''
+        Rolling statistics of the messages which have been answered, useful to find which stage limits the rate vehicles can step at. Durations are in seconds and summarized by their mean, p50, p90, p99 and max over each vehicle's recent messages.
+
+          - `handle`: From reading the state to queueing the message
+          - `queue_wait`: Time spent in the queue before `get_message()`
+          - `think`: From `get_message()` to a response such as `act()`
+          - `send`: From the response to it being sent to the vehicle
+          - `total`: From reading the state to sending the response
+
+        Returns:
+          dict: `msgs_per_sec` over the last 10 seconds, per vehicle stats in `vehicles`, the occupancy of the message queue in `queue` and the number of messages answered after `response_deadline` in `fallbacks`
+
+        Example:
+          ```
+          stats = mgr.stats()
+          print(stats['vehicles']['felix']['think']['p99'])
+          ```
+        '''
+        return self._metrics.stats()
+
     def get_vehicle_count(self):
         '''
         Returns:
@@ -321,11 +775,19 @@ class MissionManager:
     def get_ids(self):
         '''
         Returns:
-            list: A copy of the ids of each vehicle currently connected.
+            list: A copy of the ids of each vehicle which has connected, including those which have since disconnected.
         '''
         with self._vname_lock:
             return self._vnames[:]
 
+    def get_connected_ids(self):
+        '''
+        Returns:
+            list: A copy of the ids of each vehicle currently connected.
+        '''
+        with self._vname_lock:
+            return [vname for vname in self._vnames if vname not in self._disconnected]
+
     def episode_state(self, vname):
         '''
         This is used to interrogate the state of a connected vehicle's `pEpisodeManager`
@@ -350,15 +812,19 @@ class MissionManager:
 
     def reset_vehicle(self, vname, success=False):
         # Untested
-        self._vresets.append((vname, success))
+        self._vresets.put((vname, success))
+        self._wakeup()
 
     def close(self):
         if self._thread is not None:
             self._stop_signal = True
+            # The server thread may be waiting for room in the queue
+            self._msg_queue.close()
+            self._wakeup()
             self._thread.join()
-        if self._log:
-            for vehicle in self._logs:
-                self._logs[vehicle].close()
+        self._metrics.stop_dumping()
+        if self._logger is not None:
+            self._logger.close()
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.close()
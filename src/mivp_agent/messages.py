@@ -1,4 +1,7 @@
-from threading import Lock
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import List
 
 from mivp_agent.const import KEY_ID
 from mivp_agent.const import KEY_EPISODE_MGR_REPORT, KEY_EPISODE_MGR_STATE
@@ -52,6 +55,24 @@ INSTR_RESET_FAILURE = {
 }
 
 
+def action_to_instr(action):
+    '''
+    Validates an action and constructs the instruction which will be sent to `BHV_Agent` for it.
+    '''
+    # Copy so we don't run into threading errors if client reuses the action dict
+    instr = action.copy()
+    if 'posts' not in action:
+        instr['posts'] = {}
+    validateAction(instr)
+    instr['ctrl_msg'] = 'SEND_STATE'
+
+    return instr
+
+
+# Marks lazily computed fields which have not been computed yet
+_UNSET = object()
+
+
 class MissionMessage:
     '''
     This class is used to parse incoming messages into attributes (see below) and provide a simple interface for responding to each message.
@@ -69,34 +90,105 @@ class MissionMessage:
       state (dict): A dictionary containing key, value pairs of MOOS vars and their associated value at the time the message was created by `BHV_Agent`.
       episode_report (dict or None): If `pEpisodeManager` is present on the vehicle this message will contain any "report" generated by it at the end of episodes. If no `pEpisodeManager` is present, the **value will be** `None`.
       episode_state (str or None): If `pEpisodeManager` is present on the vehicle this message will be the state which that app is broadcasting. Otherwise, it will be `None`.
+      timed_out (bool): `True` if the manager answered this message with its fallback because no response was set before the manager's `response_deadline`. Responses set afterwards are ignored.
 
     '''
+    # One is allocated for every state received, so they are kept small
+    __slots__ = (
+        '_addr',
+        '_response',
+        '_notify',
+        '_times',
+        '_is_transition',
+        '_episode_report',
+        '_episode_state',
+        'observation',
+        'vid',
+        'timed_out'
+    )
 
-    def __init__(self, addr, msg, is_transition=True):
+    def __init__(self, addr, msg, is_transition=True, notify=None):
         # For use my MissionManager
         self._addr = addr
         self._response = None
-        self._rsp_lock = Lock()
+        # Called with the message after a response is set so the server thread does not need to poll for it
+        self._notify = notify
+        # perf_counter() timestamps of each stage the message goes through, see `mivp_agent.util.metrics`
+        self._times = {}
 
         # For use by client
         self.observation = msg
         self.vid = msg[KEY_ID]
-        self.episode_report = self.observation[KEY_EPISODE_MGR_REPORT]
-        self.episode_state = None
-        if self.observation[KEY_EPISODE_MGR_STATE] is not None:
-            self.episode_state = self.observation[KEY_EPISODE_MGR_STATE]
+        self._episode_report = _UNSET
+        self._episode_state = _UNSET
+
+        self.timed_out = False
 
         # For use by logger
         self._is_transition = is_transition
 
+    @property
+    def episode_report(self):
+        if self._episode_report is _UNSET:
+            self._episode_report = self.observation[KEY_EPISODE_MGR_REPORT]
+        return self._episode_report
+
+    @episode_report.setter
+    def episode_report(self, value):
+        self._episode_report = value
+
+    @property
+    def episode_state(self):
+        if self._episode_state is _UNSET:
+            self._episode_state = self.observation[KEY_EPISODE_MGR_STATE]
+        return self._episode_state
+
+    @episode_state.setter
+    def episode_state(self, value):
+        self._episode_state = value
+
+    def _claim(self):
+        # Compare and set on the response time, `dict.setdefault()` is atomic so only the first caller gets its own timestamp back
+        now = time.perf_counter()
+        return self._times.setdefault('respond', now) is now
+
     def _assert_no_rsp(self):
-        assert self._response is None, 'This message has already been responded to'
+        assert self._response is None or self.timed_out, 'This message has already been responded to'
+
+    def _set_response(self, instr, notify=True):
+        '''
+        Returns:
+          bool: False if the message was already answered, for example by a deadline fallback, and `instr` will not be sent
+        '''
+        if not self._claim():
+            return False
+        self._response = instr
+
+        # Managers which set many responses at once notify for all of them together
+        if notify and self._notify is not None:
+            self._notify(self)
+        return True
+
+    def _time_out(self, instr):
+        '''
+        Answers the message with a manager's fallback `instr`, unless a response has already been set.
+
+        Returns:
+          bool: True if the fallback will be sent
+        '''
+        if not self._claim():
+            return False
+        self.timed_out = True
+        self._response = instr
+
+        if self._notify is not None:
+            self._notify(self)
+        return True
 
     def mark_transition(self):
-        with self._rsp_lock:
-            assert self._response is None, "A message's state can only be marked at a transition before a response to that message has been set."
+        assert 'respond' not in self._times, "A message's state can only be marked at a transition before a response to that message has been set."
 
-            self._is_transition = True
+        self._is_transition = True
 
     def act(self, action):
         '''
@@ -126,15 +218,7 @@ class MissionMessage:
           ```
         '''
         self._assert_no_rsp()
-        # Copy so we don't run into threading errors if client reuses the action dict
-        instr = action.copy()
-        if 'posts' not in action:
-            instr['posts'] = {}
-        validateAction(instr)
-        instr['ctrl_msg'] = 'SEND_STATE'
-
-        with self._rsp_lock:
-            self._response = instr
+        self._set_response(action_to_instr(action))
 
     def start(self):
         '''
@@ -151,8 +235,7 @@ class MissionMessage:
         ```
         '''
         self._assert_no_rsp()
-        with self._rsp_lock:
-            self._response = INSTR_START
+        self._set_response(INSTR_START)
 
     def pause(self):
         '''
@@ -169,8 +252,7 @@ class MissionMessage:
         ```
         '''
         self._assert_no_rsp()
-        with self._rsp_lock:
-            self._response = INSTR_PAUSE
+        self._set_response(INSTR_PAUSE)
 
     def stop(self):
         '''
@@ -187,15 +269,72 @@ class MissionMessage:
         ```
         '''
         self._assert_no_rsp()
-
-        with self._rsp_lock:
-            self._response = INSTR_STOP
+        self._set_response(INSTR_STOP)
 
     def request_new(self):
         '''
         This method is used to send ask `BHV_Agent` to send another action.
         '''
         self._assert_no_rsp()
+        self._set_response(INSTR_SEND_STATE)
+
+
+class AsyncMissionMessage(MissionMessage):
+    '''
+    The message type returned by [`AsyncMissionManager`][mivp_agent.async_manager.AsyncMissionManager]. It has the same attributes as `MissionMessage` but the response methods are coroutines which return once the response has been written to the vehicle.
+
+    Example:
+      ```
+      msg = await mgr.get_message()
+      await msg.act({
+          'speed': 1.0,
+          'course': 180.0
+      })
+      ```
+    '''
+    __slots__ = ('_sent',)
+
+    def __init__(self, addr, msg, is_transition=True, notify=None):
+        super().__init__(addr, msg, is_transition=is_transition, notify=notify)
+
+        # Resolved by AsyncMissionManager once the response has been sent
+        self._sent = asyncio.get_event_loop().create_future()
+
+    async def act(self, action):
+        MissionMessage.act(self, action)
+        await self._sent
 
-        with self._rsp_lock:
-            self._response = INSTR_SEND_STATE
+    async def start(self):
+        MissionMessage.start(self)
+        await self._sent
+
+    async def pause(self):
+        MissionMessage.pause(self)
+        await self._sent
+
+    async def stop(self):
+        MissionMessage.stop(self)
+        await self._sent
+
+    async def request_new(self):
+        MissionMessage.request_new(self)
+        await self._sent
+
+
+@dataclass
+class StepBatch:
+    '''
+    The result of [`MissionManager.step()`][mivp_agent.manager.MissionManager.step]. `messages` is aligned with `vnames` and has `None` for each vehicle listed in `missing`.
+    '''
+    vnames: List[str]
+    messages: List[MissionMessage]
+    # Vehicles which did not send a state before the deadline
+    missing: List[str]
+    timed_out: bool
+
+    def received(self):
+        '''
+        Returns:
+          list: The messages which were received, in the order of `vnames`
+        '''
+        return [m for m in self.messages if m is not None]
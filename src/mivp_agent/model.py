@@ -1,22 +1,90 @@
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from threading import Lock, local
 from typing import Any
 
 from readerwriterlock.rwlock import RWLockFair
 
 
+@dataclass(frozen=True)
+class ModelSnapshot:
+    # Increases by one with every call to `Model.publish()`, starting from 0 for the initial snapshot
+    version: int
+    weights: Any
+
+
 class Model(ABC):
+    '''
+    Models hold their weights in immutable, versioned snapshots. The trainer builds new weights on the side and swaps them in with `publish()`, while actors read the latest snapshot with `current()`. Neither side waits on the other, since publishing is a single reference assignment.
+
+    Published weights must not be changed afterwards, as actors may still be using them. Copy them, update the copy and publish that instead.
+
+    Models which never publish can still be updated in place under `wlock()`, see `rlock()`.
+    '''
+
     def __new__(cls, *args, **kwargs):
         instance = super(Model, cls).__new__(cls, *args, **kwargs)
         instance._rwlock = RWLockFair()
 
+        instance._snapshot = ModelSnapshot(0, None)
+        instance._publish_lock = Lock()
+        instance._pinned = local()
+
         return instance
 
     @abstractmethod
     def inference(self, state: Any) -> Any:
         pass
 
+    def publish(self, weights: Any) -> ModelSnapshot:
+        '''
+        Makes `weights` the current snapshot. Actors pick it up the next time they call `current()`.
+
+        Returns:
+          ModelSnapshot: The new snapshot
+        '''
+        # Only publishers take this lock, so two of them can't hand out the same version
+        with self._publish_lock:
+            snapshot = ModelSnapshot(self._snapshot.version + 1, weights)
+            self._snapshot = snapshot
+        return snapshot
+
+    def current(self) -> ModelSnapshot:
+        '''
+        Returns:
+          ModelSnapshot: The latest published snapshot, or the one pinned on this thread by `pin()`
+        '''
+        pinned = getattr(self._pinned, 'snapshot', None)
+        if pinned is not None:
+            return pinned
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self.current().version
+
+    @contextmanager
+    def pin(self):
+        '''
+        Makes `current()` return the same snapshot on this thread for the duration of the `with` block, so several inferences (and the version they are recorded with) agree even if a new snapshot is published meanwhile.
+
+        Yields:
+          ModelSnapshot: The pinned snapshot
+        '''
+        previous = getattr(self._pinned, 'snapshot', None)
+        snapshot = self.current()
+        self._pinned.snapshot = snapshot
+        try:
+            yield snapshot
+        finally:
+            self._pinned.snapshot = previous
+
     def rlock(self):
+        '''
+        For models which are updated in place under `wlock()` instead of with `publish()`. `Driver` takes it around inference until the model publishes its first snapshot.
+        '''
         return self._rwlock.gen_rlock()
-    
+
     def wlock(self):
         return self._rwlock.gen_wlock()
@@ -0,0 +1,254 @@
+import os
+import time
+import multiprocessing
+from collections import deque
+from threading import Thread, Lock
+
+from mivp_agent.const import KEY_ID
+from mivp_agent.messages import INSTR_SEND_STATE, INSTR_START, INSTR_PAUSE, INSTR_STOP, INSTR_RESET_FAILURE, INSTR_RESET_SUCCESS
+from mivp_agent.bridge import ModelBridgeServer, bind_listener, get_server_host_and_port, unix_socket_path, socket_file_id, unlink_socket_file
+from mivp_agent.manager import MissionManager
+from mivp_agent.log.transitions import AsyncTransitionLogger
+
+
+def _shard_worker(index, listener, responses, results, log_config):
+    '''
+    Entry point of a worker process. Accepts vehicles from the shared `listener`, forwards their decoded states to the main process through `results` and sends the responses received on the `responses` pipe.
+
+    Responses are `(addr, instr, is_transition)` tuples. An `is_transition` of `None` marks an instruction which is not a response to a state (such as a reset) and should not be logged, and an `instr` of `None` evicts the client at `addr`. `None` stops the worker.
+
+    A state of `None` in `results` reports that the client at `addr` has disconnected.
+    '''
+    logger = None
+    if log_config is not None:
+        logger = AsyncTransitionLogger(**log_config)
+
+    inbox = deque()
+    with ModelBridgeServer(sock=listener) as server:
+        for instr in (INSTR_SEND_STATE, INSTR_START, INSTR_PAUSE, INSTR_STOP, INSTR_RESET_SUCCESS, INSTR_RESET_FAILURE):
+            server.register_constant(instr)
+
+        def receive():
+            while True:
+                try:
+                    item = responses.recv()
+                except EOFError:
+                    # Main process went away
+                    item = None
+                inbox.append(item)
+                server.wakeup()
+                if item is None:
+                    return
+
+        Thread(target=receive, daemon=True).start()
+
+        # The last state received from each vehicle, which the next response will be logged with
+        states = {}
+        running = True
+        while running:
+            accepted, readable = server.poll()
+
+            for addr in accepted:
+                print(f'Got new connection: {addr} (worker {index})')
+                server.send_instr(addr, INSTR_SEND_STATE)
+
+            for addr in readable:
+                for state in server.listen_all(addr):
+                    states[addr] = state
+                    results.put((index, addr, state))
+
+            instrs = []
+            transitions = []
+            evicted = []
+            while len(inbox) != 0:
+                item = inbox.popleft()
+                if item is None:
+                    running = False
+                    break
+
+                addr, instr, is_transition = item
+                if instr is None:
+                    evicted.append(addr)
+                    continue
+                instrs.append((addr, instr))
+                if is_transition is not None and addr in states:
+                    transitions.append((states[addr], instr, is_transition))
+
+            server.send_many(instrs)
+
+            if logger is not None:
+                for state, instr, is_transition in transitions:
+                    logger.log(state, instr, is_transition)
+
+            for addr in server.pop_closed():
+                results.put((index, addr, None))
+                evicted.append(addr)
+            for addr in evicted:
+                server.remove_client(addr)
+                state = states.pop(addr, None)
+                if logger is not None and state is not None:
+                    logger.forget(state[KEY_ID])
+
+    if logger is not None:
+        logger.close()
+
+
+class ShardedMissionManager(MissionManager):
+    '''
+    A version of [`MissionManager`][mivp_agent.manager.MissionManager] which spreads vehicles across several worker processes. Each worker accepts vehicles from the same listening socket, decodes their states and writes their transition logs, so this work is not limited to one core or shared with the learner's GIL.
+
+    States reach the main process through a shared queue, and `get_message()`, `act()` and the other `MissionManager` methods are used in the same way.
+
+    Examples:
+      ```
+      from mivp_agent.sharded_manager import ShardedMissionManager
+
+      with ShardedMissionManager('trainer', workers=8) as mgr:
+        mgr.wait_for_count(200)
+        ...
+      ```
+    '''
+
+    def __init__(self, task, workers=None, **kwargs):
+        '''
+        Args:
+          task (str): See [`MissionManager`][mivp_agent.manager.MissionManager]
+          workers (int): The number of worker processes, defaults to the number of CPUs
+          **kwargs: Passed to [`MissionManager`][mivp_agent.manager.MissionManager]
+        '''
+        super().__init__(task, **kwargs)
+
+        if workers is None:
+            workers = os.cpu_count()
+        assert workers > 0, "At least one worker is required"
+        self._worker_count = workers
+
+        self._listener = None
+        self._processes = []
+        self._pipes = []
+        self._pipe_locks = []
+        self._results = None
+
+    def _make_logger(self):
+        # Each worker writes the transition logs of its own vehicles
+        return None
+
+    def start(self):
+        '''
+        It is **not recommended** to use this method directly. Instead, consider using this class with the python context manager. This method starts the worker processes and a thread to collect their states.
+
+        Returns:
+          bool: False if the workers have already been started, True otherwise
+        '''
+        if self._thread is not None:
+            return False
+
+        host, port = get_server_host_and_port()
+        self._listener = bind_listener(host, port)
+        self._unix_path = unix_socket_path(host)
+        # Identifies the socket file bound here, so `close()` never removes another server's
+        self._unix_file = None
+        if self._unix_path is not None:
+            self._unix_file = socket_file_id(self._unix_path)
+
+        log_config = None
+        if self._log:
+            log_config = {
+                'path': self._log_path,
+                'whitelist': self._log_whitelist,
+                'max_queue': self._log_queue_size,
+                'policy': self._log_policy
+            }
+
+        ctx = multiprocessing.get_context()
+        self._results = ctx.Queue()
+        for i in range(self._worker_count):
+            parent, child = ctx.Pipe()
+            p = ctx.Process(
+                target=_shard_worker,
+                args=(i, self._listener, child, self._results, log_config),
+                daemon=True
+            )
+            p.start()
+            child.close()
+
+            self._processes.append(p)
+            self._pipes.append(parent)
+            self._pipe_locks.append(Lock())
+
+        self._thread = Thread(target=self._collect_thread, daemon=True)
+        self._thread.start()
+        if self._response_deadline is not None:
+            self._deadline_thr = Thread(target=self._deadline_thread, daemon=True)
+            self._deadline_thr.start()
+        self._start_metrics()
+
+        return True
+
+    def _collect_thread(self):
+        while True:
+            item = self._results.get()
+            if item is None:
+                return
+
+            # Stage timings start once the state reaches this process
+            read = time.perf_counter()
+            index, addr, state = item
+            if state is None:
+                self._vehicle_disconnected((index, addr))
+                continue
+
+            # Respond straight from the thread which acts on the message
+            m = self._handle_state((index, addr), state, notify=self._forward)
+            m._times['read'] = read
+
+            self._enqueue(m)
+
+    def _send_to_worker(self, addr, instr, is_transition):
+        index, worker_addr = addr
+        with self._pipe_locks[index]:
+            self._pipes[index].send((worker_addr, instr, is_transition))
+
+    def _forward(self, msg):
+        self._send_to_worker(msg._addr, msg._response, msg._is_transition)
+        # Measured up to the hand off to the worker
+        msg._times['sent'] = time.perf_counter()
+        self._metrics.record(msg)
+
+    def _evict(self, addr):
+        self._send_to_worker(addr, None, None)
+
+    def _responses_ready(self, msgs):
+        for m in msgs:
+            self._forward(m)
+
+    def reset_vehicle(self, vname, success=False):
+        instr = self._reset_instr(vname, success)
+        self._send_to_worker(self._address_map[vname], instr, None)
+
+    def close(self):
+        if self._thread is not None:
+            for i, pipe in enumerate(self._pipes):
+                with self._pipe_locks[i]:
+                    pipe.send(None)
+            for p in self._processes:
+                p.join()
+
+            # Workers have flushed their states, so the collector can stop
+            self._msg_queue.close()
+            self._results.put(None)
+            self._thread.join()
+
+            if self._response_deadline is not None:
+                self._stop_signal = True
+                self._deadlines_added.set()
+                self._deadline_thr.join()
+
+            for pipe in self._pipes:
+                pipe.close()
+            self._listener.close()
+            if self._unix_file is not None:
+                unlink_socket_file(self._unix_path, self._unix_file)
+
+            self._thread = None
+        self._metrics.stop_dumping()
@@ -120,3 +120,173 @@ class LimitedHistory:
             history[row] /= (row_max-row_min)
 
         return history
+
+
+class ColumnarBatch:
+    '''
+    Transitions stored column by column in NumPy arrays, for agents whose states and actions have a fixed shape. Rows are written in place into preallocated arrays which double in size when full, and each column is read as a view of the rows written so far, so it can go to a learner without stacking.
+
+    The shape and dtype of `s1`, `a` and `s2` are taken from the first transition appended.
+    '''
+    COLUMNS = ('s1', 'a', 's2', 'vid', 'episode', 'done', 'version')
+
+    def __init__(self, capacity=1024):
+        assert capacity > 0, "capacity must be positive"
+        self._capacity = capacity
+        self._size = 0
+        self._columns = None
+
+    def _allocate(self, state, action):
+        state = np.asarray(state)
+        action = np.asarray(action)
+        self._state_shape = state.shape
+        self._action_shape = action.shape
+        self._columns = {
+            's1': np.empty((self._capacity,) + state.shape, dtype=state.dtype),
+            'a': np.empty((self._capacity,) + action.shape, dtype=action.dtype),
+            's2': np.empty((self._capacity,) + state.shape, dtype=state.dtype),
+            'vid': np.empty(self._capacity, dtype=object),
+            'episode': np.empty(self._capacity, dtype=np.int64),
+            'done': np.empty(self._capacity, dtype=bool),
+            # -1 when the version is unknown
+            'version': np.empty(self._capacity, dtype=np.int64)
+        }
+
+    def _grow(self):
+        self._capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.empty((self._capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def append(self, s1, a, s2, vid, episode, done, version=None):
+        '''
+        Args:
+          s1: The state the action was chosen in
+          a: The action, as an array
+          s2: The state the action led to
+          vid (str): The vehicle's id
+          episode (int): The episode number of `s1`
+          done (bool): If `s2` is in a later episode than `s1`
+          version (int): The model version which chose the action
+        '''
+        if self._columns is None:
+            self._allocate(s1, a)
+        assert np.shape(s1) == self._state_shape and np.shape(s2) == self._state_shape, f"States must have shape {self._state_shape}"
+        assert np.shape(a) == self._action_shape, f"Actions must have shape {self._action_shape}"
+
+        if self._size == self._capacity:
+            self._grow()
+
+        i = self._size
+        self._columns['s1'][i] = s1
+        self._columns['a'][i] = a
+        self._columns['s2'][i] = s2
+        self._columns['vid'][i] = vid
+        self._columns['episode'][i] = episode
+        self._columns['done'][i] = done
+        self._columns['version'][i] = -1 if version is None else version
+        self._size += 1
+
+    def column(self, name):
+        '''
+        Returns:
+          np.ndarray: A view of the rows written so far, or `None` if nothing has been appended yet
+        '''
+        assert name in self.COLUMNS, f"Unknown column '{name}'"
+        if self._columns is None:
+            return None
+        return self._columns[name][:self._size]
+
+    @property
+    def s1(self):
+        return self.column('s1')
+
+    @property
+    def a(self):
+        return self.column('a')
+
+    @property
+    def s2(self):
+        return self.column('s2')
+
+    @property
+    def vid(self):
+        return self.column('vid')
+
+    @property
+    def episode(self):
+        return self.column('episode')
+
+    @property
+    def done(self):
+        return self.column('done')
+
+    @property
+    def version(self):
+        return self.column('version')
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def __len__(self):
+        return self._size
+
+
+class SumTree:
+    '''
+    A binary tree over `capacity` non-negative priorities where each node holds the sum of its children, so priorities can be changed and sampled from in proportion to their size in `O(log n)`. Both are vectorized over many indices at once.
+    '''
+
+    def __init__(self, capacity):
+        assert capacity > 0, "capacity must be positive"
+        self.capacity = capacity
+
+        # Leaves start at `self._leaves`, node `i` has children `2i` and `2i + 1` and the root is node 1
+        self._leaves = 1
+        self._depth = 0
+        while self._leaves < capacity:
+            self._leaves *= 2
+            self._depth += 1
+        self._tree = np.zeros(2 * self._leaves)
+
+    def total(self):
+        return self._tree[1]
+
+    def __getitem__(self, indices):
+        return self._tree[self._leaves + np.asarray(indices)]
+
+    def update(self, indices, priorities):
+        '''
+        Args:
+          indices (array_like): The leaves to set, if an index is repeated the last priority given for it is kept
+          priorities (array_like): The new priorities
+        '''
+        nodes = self._leaves + np.asarray(indices, dtype=np.int64)
+        assert np.all(nodes < self._leaves + self.capacity) and np.all(nodes >= self._leaves), "Index out of bounds"
+        self._tree[nodes] = priorities
+
+        nodes = np.unique(nodes // 2)
+        while nodes[0] != 0:
+            self._tree[nodes] = self._tree[2 * nodes] + self._tree[2 * nodes + 1]
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values):
+        '''
+        Args:
+          values (array_like): Values in `[0, total())`
+
+        Returns:
+          np.ndarray: For each value, the index of the leaf whose span of the cumulative sum of priorities contains it
+        '''
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(values.shape, dtype=np.int64)
+        for _ in range(self._depth):
+            left = 2 * nodes
+            # Rounding can leave a value just past the left sum, never follow it into an empty subtree
+            go_right = (values >= self._tree[left]) & (self._tree[left + 1] > 0)
+            values -= self._tree[left] * go_right
+            nodes = left + go_right
+
+        return nodes - self._leaves
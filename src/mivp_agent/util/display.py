@@ -13,27 +13,40 @@ class ModelConsole:
         self._last_loop_time = None
         self._last_MOOS_time = None
 
-    def tick(self, msg):
-        if msg.vname not in self.vehicles:
-            self.vehicles[msg.vname] = {}
-            self.vehicles[msg.vname]['last_MOOS_delta'] = 'n/a'
-            self.vehicles[msg.vname]['last_loop_delta'] = 'n/a'
-            self.vehicles[msg.vname]['last_MOOS_time'] = msg.state['MOOS_TIME']
-            self.vehicles[msg.vname]['last_loop_time'] = time.perf_counter()
+    def tick(self, msg, stats=None):
+        '''
+        Args:
+          msg (MissionMessage): The message which was just received
+          stats (dict): Optionally, the output of `MissionManager.stats()` to print per vehicle throughput and stage timings with
+        '''
+        if msg.vid not in self.vehicles:
+            self.vehicles[msg.vid] = {}
+            self.vehicles[msg.vid]['last_MOOS_delta'] = 'n/a'
+            self.vehicles[msg.vid]['last_loop_delta'] = 'n/a'
+            self.vehicles[msg.vid]['last_MOOS_time'] = msg.observation['MOOS_TIME']
+            self.vehicles[msg.vid]['last_loop_time'] = time.perf_counter()
         else:
-            self.vehicles[msg.vname]['last_MOOS_delta'] = msg.state['MOOS_TIME']-self.vehicles[msg.vname]['last_MOOS_time']
-            self.vehicles[msg.vname]['last_MOOS_time'] = msg.state['MOOS_TIME']
+            self.vehicles[msg.vid]['last_MOOS_delta'] = msg.observation['MOOS_TIME']-self.vehicles[msg.vid]['last_MOOS_time']
+            self.vehicles[msg.vid]['last_MOOS_time'] = msg.observation['MOOS_TIME']
             loop_time = time.perf_counter()
-            self.vehicles[msg.vname]['last_loop_delta'] = loop_time - self.vehicles[msg.vname]['last_loop_time']
-            self.vehicles[msg.vname]['last_loop_time'] = loop_time
+            self.vehicles[msg.vid]['last_loop_delta'] = loop_time - self.vehicles[msg.vid]['last_loop_time']
+            self.vehicles[msg.vid]['last_loop_time'] = loop_time
 
         print('\n===========================================')
         print(f' Iteration: {self.iteration}')
-        print(f' MOOS_TIME: {msg.state["MOOS_TIME"]}\n')
+        print(f' MOOS_TIME: {msg.observation["MOOS_TIME"]}\n')
         for v in self.vehicles:
             print(f' Vehicle: {v}')
             print(f'   MOOS delta: {self.vehicles[v]["last_MOOS_delta"]}')
             print(f'   Loop delta: {self.vehicles[v]["last_loop_delta"]}')
+            if stats is not None and v in stats['vehicles']:
+                vstats = stats['vehicles'][v]
+                print(f'   Msgs/sec: {vstats["msgs_per_sec"]:.1f}')
+                for stage in ('queue_wait', 'think', 'send'):
+                    if vstats[stage] is not None:
+                        print(f'   {stage} p50/p99 (ms): {vstats[stage]["p50"]*1000:.3f} / {vstats[stage]["p99"]*1000:.3f}')
+        if stats is not None:
+            print(f'\n Total msgs/sec: {stats["msgs_per_sec"]:.1f}')
         print('===========================================')
 
         # Updated needed vars
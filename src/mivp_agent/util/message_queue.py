@@ -0,0 +1,246 @@
+from queue import Empty, Full
+from collections import deque
+from threading import Lock, Condition
+
+from mivp_agent.util.scheduler import FifoScheduler
+
+POLICY_BLOCK = 'block'
+POLICY_DROP_OLDEST = 'drop_oldest'
+POLICY_COALESCE = 'coalesce'
+
+POLICIES = (
+    POLICY_BLOCK,
+    POLICY_DROP_OLDEST,
+    POLICY_COALESCE
+)
+
+
+class MessageQueue:
+    '''
+    A queue of messages (anything with a `vid`) with one FIFO per vehicle. A [`Scheduler`][mivp_agent.util.scheduler.Scheduler] decides which vehicle's message is taken next, by default the oldest message of any vehicle is.
+
+    The queue can be bounded overall and per vehicle. What happens when a bound is reached depends on the policy:
+
+      - `'block'`: `put()` waits until the consumer makes room
+      - `'drop_oldest'`: The oldest message of the vehicle (if its bound is reached) or of the whole queue is removed to make room
+      - `'coalesce'`: Only the latest message of each vehicle is kept, older ones are removed as soon as a newer one is put. The overall bound is kept by removing the oldest message.
+
+    Messages removed by a policy are returned from `put()` so the caller can answer them.
+    '''
+
+    def __init__(self, max_size=None, max_per_vehicle=None, policy=POLICY_BLOCK, scheduler=None):
+        '''
+        Args:
+          max_size (int): The most messages queued in total, `None` for no limit
+          max_per_vehicle (int): The most messages queued from any one vehicle, `None` for no limit
+          policy (str): `'block'`, `'drop_oldest'` or `'coalesce'`
+          scheduler (Scheduler): Decides which vehicle is served next, defaults to a `FifoScheduler`
+        '''
+        assert policy in POLICIES, f"Unsupported policy '{policy}'"
+        assert max_size is None or max_size > 0, "max_size must be positive"
+        assert max_per_vehicle is None or max_per_vehicle > 0, "max_per_vehicle must be positive"
+
+        self.max_size = max_size
+        self.max_per_vehicle = max_per_vehicle
+        if policy == POLICY_COALESCE:
+            self.max_per_vehicle = 1
+        self.policy = policy
+        if scheduler is None:
+            scheduler = FifoScheduler()
+        self.scheduler = scheduler
+
+        self.mutex = Lock()
+        self.not_empty = Condition(self.mutex)
+        self.not_full = Condition(self.mutex)
+
+        # Per vehicle FIFOs of `(sequence number, message)`, only vehicles with queued messages have one
+        self._queues = {}
+        # Finds the oldest message of the whole queue for the drop policies, the scheduler may order messages differently
+        self._oldest = None
+        if self.max_size is not None and policy != POLICY_BLOCK:
+            self._oldest = scheduler if type(scheduler) is FifoScheduler else FifoScheduler()
+        self._trackers = [scheduler]
+        if self._oldest is not None and self._oldest is not scheduler:
+            self._trackers.append(self._oldest)
+        self._size = 0
+        self._seq = 0
+        self._closed = False
+        # Set by `wake()` until a wakeable `get_many()` returns
+        self._woken = False
+        self.dropped = 0
+        self.high_water = 0
+
+    def _count(self, vid):
+        if vid not in self._queues:
+            return 0
+        return len(self._queues[vid])
+
+    def _full_for(self, vid):
+        if self.max_size is not None and self._size >= self.max_size:
+            return True
+        if self.max_per_vehicle is not None and self._count(vid) >= self.max_per_vehicle:
+            return True
+        return False
+
+    def _head_changed(self, vid):
+        # Tells the schedulers about the new oldest message of a vehicle
+        q = self._queues.get(vid)
+        for tracker in self._trackers:
+            if q is None:
+                tracker.remove(vid)
+            else:
+                tracker.ready(vid, q[0][0])
+
+    def _pop(self, vid):
+        q = self._queues[vid]
+        _, msg = q.popleft()
+        if len(q) == 0:
+            del self._queues[vid]
+        self._size -= 1
+        self._head_changed(vid)
+        return msg
+
+    def _make_room(self, vid):
+        removed = []
+        if self.max_per_vehicle is not None:
+            while self._count(vid) >= self.max_per_vehicle:
+                removed.append(self._pop(vid))
+
+        if self.max_size is not None and self._size >= self.max_size:
+            removed.append(self._pop(self._oldest.peek()))
+
+        self.dropped += len(removed)
+        return removed
+
+    def put(self, msg, timeout=None):
+        '''
+        Args:
+          msg (MissionMessage): The message to queue
+          timeout (float): With the `'block'` policy, the most seconds to wait for room. `None` waits indefinitely.
+
+        Returns:
+          list: The messages removed to make room, always empty with the `'block'` policy
+
+        Raises:
+          queue.Full: If the timeout expired before there was room
+        '''
+        with self.not_full:
+            removed = []
+            if self.policy == POLICY_BLOCK:
+                if not self.not_full.wait_for(lambda: self._closed or not self._full_for(msg.vid), timeout):
+                    raise Full
+            else:
+                removed = self._make_room(msg.vid)
+
+            if msg.vid not in self._queues:
+                self._queues[msg.vid] = deque()
+            self._queues[msg.vid].append((self._seq, msg))
+            if len(self._queues[msg.vid]) == 1:
+                self._head_changed(msg.vid)
+            self._seq += 1
+            self._size += 1
+            self.high_water = max(self.high_water, self._size)
+            self.not_empty.notify()
+
+        return removed
+
+    def get(self, block=True, timeout=None):
+        '''
+        Returns:
+          MissionMessage: The oldest message
+
+        Raises:
+          queue.Empty: If there is no message and `block` is `False` or the timeout expired
+        '''
+        msgs = self.get_many(1, timeout=timeout if block else 0)
+        if len(msgs) == 0:
+            raise Empty
+        return msgs[0]
+
+    def get_many(self, max_n=None, timeout=None, wakeable=False):
+        '''
+        Takes every queued message (or the first `max_n`) under one acquisition of the lock. If none are queued, waits until one is or the timeout expires.
+
+        Args:
+          wakeable (bool): Also stop waiting if `wake()` is called, or has been since the last wakeable call returned
+
+        Returns:
+          list: The messages in the order chosen by the scheduler, empty if the timeout expired or the call was woken
+        '''
+        with self.not_empty:
+            if self._size == 0 and timeout != 0:
+                self.not_empty.wait_for(lambda: self._size != 0 or (wakeable and self._woken), timeout)
+            if wakeable:
+                self._woken = False
+
+            n = self._size
+            if max_n is not None:
+                n = min(n, max_n)
+            msgs = []
+            for _ in range(n):
+                msgs.append(self._pop(self.scheduler.choose()))
+            if n != 0:
+                self.not_full.notify_all()
+
+        return msgs
+
+    def discard(self, msg):
+        '''
+        Removes a message which has not been taken yet.
+
+        Returns:
+          bool: False if the message is not in the queue
+        '''
+        with self.mutex:
+            q = self._queues.get(msg.vid)
+            if q is None:
+                return False
+
+            for i, (_, m) in enumerate(q):
+                if m is msg:
+                    if i == 0:
+                        self._pop(msg.vid)
+                    else:
+                        del q[i]
+                        self._size -= 1
+                    self.not_full.notify_all()
+                    return True
+            return False
+
+    def wake(self):
+        '''
+        Wakes a `get_many(wakeable=True)` which is waiting, or makes the next one return without waiting, so its caller can check for changes other than new messages.
+        '''
+        with self.mutex:
+            self._woken = True
+            self.not_empty.notify_all()
+
+    def close(self):
+        '''
+        Stops `put()` from blocking, so a producer waiting on a consumer which has gone away can finish.
+        '''
+        with self.mutex:
+            self._closed = True
+            self.not_full.notify_all()
+
+    def qsize(self):
+        with self.mutex:
+            return self._size
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def occupancy(self):
+        '''
+        Returns:
+          dict: The number of queued messages in total and per vehicle, the bounds, the most ever queued at once and the number of messages removed by the policy
+        '''
+        with self.mutex:
+            return {
+                'size': self._size,
+                'max_size': self.max_size,
+                'max_per_vehicle': self.max_per_vehicle,
+                'high_water': self.high_water,
+                'dropped': self.dropped,
+                'vehicles': {vid: len(q) for vid, q in self._queues.items()}
+            }
@@ -0,0 +1,197 @@
+import time
+import json
+from collections import deque
+from threading import Thread, Lock, Event
+
+import numpy as np
+
+
+class RollingHistogram:
+    '''
+    Keeps the most recent `size` samples of a value so its distribution can be summarized without growing forever.
+    '''
+
+    def __init__(self, size=1000):
+        self._data = np.zeros(size)
+        self._next = 0
+        self.count = 0
+
+    def add(self, value):
+        self._data[self._next] = value
+        self._next = (self._next + 1) % self._data.shape[0]
+        self.count += 1
+
+    def samples(self):
+        '''
+        Returns:
+          np.ndarray: The samples currently in the window, in no particular order
+        '''
+        return self._data[:min(self.count, self._data.shape[0])]
+
+    def histogram(self, bins=10):
+        '''
+        Returns:
+          tuple: The counts and bin edges of the samples in the window, see `np.histogram()`
+        '''
+        return np.histogram(self.samples(), bins=bins)
+
+    def summary(self):
+        '''
+        Returns:
+          dict: The mean, p50, p90, p99 and max of the samples in the window, or `None` if there are none
+        '''
+        samples = self.samples()
+        if samples.shape[0] == 0:
+            return None
+
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+        return {
+            'mean': float(samples.mean()),
+            'p50': float(p50),
+            'p90': float(p90),
+            'p99': float(p99),
+            'max': float(samples.max())
+        }
+
+
+class RateMeter:
+    '''
+    Measures events per second over the last `window` seconds.
+    '''
+
+    def __init__(self, window=10.0):
+        self._window = window
+        self._times = deque()
+
+    def _expire(self, now):
+        while len(self._times) != 0 and self._times[0] < now - self._window:
+            self._times.popleft()
+
+    def tick(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        self._times.append(now)
+        self._expire(now)
+
+    def rate(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        self._expire(now)
+        return len(self._times) / self._window
+
+
+class MessageMetrics:
+    '''
+    Rolling per vehicle statistics of the stages each message goes through in a manager. All durations are in seconds.
+
+      - `handle`: From reading the state off the socket to putting the message in the queue
+      - `queue_wait`: From the queue to `get_message()`
+      - `think`: From `get_message()` to the response being set (with `act()` for example)
+      - `send`: From the response being set to it being written to the socket
+      - `total`: From reading the state to writing the response
+
+    Other values, such as queue occupancy, can be included in `stats()` and the dumps by adding a function returning them to `gauges`.
+    '''
+    STAGES = ('handle', 'queue_wait', 'think', 'send', 'total')
+
+    def __init__(self, size=1000, window=10.0):
+        self._size = size
+        self._window = window
+
+        self._lock = Lock()
+        self._vehicles = {}
+        self._rate = RateMeter(window)
+        # Name to function of other values reported by `stats()`
+        self.gauges = {}
+
+        self._dump_thread = None
+        self._dump_stop = Event()
+
+    def record(self, msg):
+        '''
+        Records a message which has been responded to and sent.
+        '''
+        times = msg._times
+        if times.get('dequeue') is None:
+            # Answered without passing through the queue (for example by a manager internal policy)
+            times['dequeue'] = times['enqueue']
+
+        durations = {
+            'handle': times['enqueue'] - times['read'],
+            'queue_wait': times['dequeue'] - times['enqueue'],
+            'think': times['respond'] - times['dequeue'],
+            'send': times['sent'] - times['respond'],
+            'total': times['sent'] - times['read']
+        }
+
+        with self._lock:
+            if msg.vid not in self._vehicles:
+                self._vehicles[msg.vid] = (
+                    {stage: RollingHistogram(self._size) for stage in self.STAGES},
+                    RateMeter(self._window)
+                )
+            histograms, rate = self._vehicles[msg.vid]
+
+            for stage, duration in durations.items():
+                histograms[stage].add(duration)
+            rate.tick()
+            self._rate.tick()
+
+    def stats(self):
+        '''
+        Returns:
+          dict: Messages per second overall, the value of each gauge and, for each vehicle, its message count, messages per second and a summary of each stage
+        '''
+        gauges = {name: gauge() for name, gauge in self.gauges.items()}
+        with self._lock:
+            vehicles = {}
+            for vid, (histograms, rate) in self._vehicles.items():
+                vehicles[vid] = {
+                    'messages': histograms['total'].count,
+                    'msgs_per_sec': rate.rate()
+                }
+                for stage in self.STAGES:
+                    vehicles[vid][stage] = histograms[stage].summary()
+
+            stats = {
+                'msgs_per_sec': self._rate.rate(),
+                'vehicles': vehicles
+            }
+        stats.update(gauges)
+        return stats
+
+    def dump(self, path):
+        '''
+        Appends the current `stats()` with a timestamp as a line of JSON to the file at `path`.
+        '''
+        stats = self.stats()
+        stats['time'] = time.time()
+        with open(path, 'a') as f:
+            f.write(json.dumps(stats) + '\n')
+
+    def start_dumping(self, path, interval=10.0):
+        '''
+        Starts a thread which calls `dump(path)` every `interval` seconds until `stop_dumping()` is called.
+        '''
+        assert self._dump_thread is None, "Already dumping metrics"
+
+        def dump_loop():
+            while not self._dump_stop.wait(interval):
+                self.dump(path)
+
+        self._dump_path = path
+        self._dump_stop.clear()
+        self._dump_thread = Thread(target=dump_loop, daemon=True)
+        self._dump_thread.start()
+
+    def stop_dumping(self):
+        '''
+        Stops the thread started by `start_dumping()` and writes a final dump.
+        '''
+        if self._dump_thread is None:
+            return
+
+        self._dump_stop.set()
+        self._dump_thread.join()
+        self._dump_thread = None
+        self.dump(self._dump_path)
@@ -30,47 +30,140 @@ def unpack(more, once=False):
 
     assert callable(more), '"more" argument is not callable'
 
-    tmp_data = bytearray() # To store data being processed
     messages = [] # To store complete messages
 
-    # When not None we are parsing a message
-    current_len = None
-
     # Get some initial data
-    tmp_data = bytearray(more())
-
-    if len(tmp_data) == 0:
+    data = more()
+    if len(data) == 0:
         return []
 
+    buffer = FrameBuffer(max(len(data), HEADER_SIZE))
+    buffer.extend(data)
+
     # While we have data to process into messages
-    while len(tmp_data) != 0:
-        # If necessary, get more data for the header
-        while len(tmp_data) < HEADER_SIZE:
-            if once:
-                raise RuntimeError('Unpack needed more infromation in "once" mode')
-            tmp_data.extend(bytearray(more()))
+    while True:
+        # Copy out every complete message, then the buffer is free to reuse its memory
+        messages.extend(bytearray(frame) for frame in buffer.frames())
+        buffer.release()
 
-        # We will have a full header here, parse it into current_len
-        current_len = struct.unpack('>L', tmp_data[:HEADER_SIZE])[0]
+        # NOTE: Stop once the data from more() has been fully parsed
+        if len(buffer) == 0:
+            break
 
-        # Remove the parsed header from tmp_data
-        tmp_data = tmp_data[HEADER_SIZE:]
+        # If necessary, get more data for the current message
+        if once:
+            raise RuntimeError('Unpack needed more infromation in "once" mode')
+        buffer.extend(more())
 
-        # If necessary, get more data for our message
-        while len(tmp_data) < current_len:
-            if once:
-                raise RuntimeError('Unpack needed more infromation in "once" mode')
-            tmp_data.extend(bytearray(more()))
+    return messages
 
-        # Here we will have a full message, parse it into messages
-        messages.append(tmp_data[:current_len])
 
-        # Remove the message data we just parsed from tmp_data
-        tmp_data = tmp_data[current_len:]
+class FrameBuffer:
+    '''
+    A growable receive buffer for streams of messages packed by `pack(message)`. Data is read straight into the buffer with `recv_into(connection)` and complete messages are returned by `frames()` as `memoryview` slices of the buffer, so message bytes are not copied while messages are assembled.
 
-        # NOTE: tmp_data might have more information, this will be parsed in the next pass
+    **NOTE:** The views returned by `frames()` are only guaranteed to be valid until `release()` is called. After `release()` the buffer may reuse that memory for new data.
+    '''
 
-    return messages
+    def __init__(self, size=8192):
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+
+        # Data which has not been returned by frames() lives in self._buffer[self._start:self._end]
+        self._start = 0
+        self._end = 0
+
+        # True while views returned by frames() may still be in use
+        self._exported = False
+
+    def __len__(self):
+        return self._end - self._start
+
+    def capacity(self):
+        return len(self._buffer)
+
+    def release(self):
+        '''
+        Signals that views returned by `frames()` are no longer in use.
+        '''
+        self._exported = False
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def _needed(self):
+        # Bytes required for the first incomplete frame to be complete
+        available = self._end - self._start
+        if available < HEADER_SIZE:
+            return HEADER_SIZE
+        return HEADER_SIZE + struct.unpack_from('>L', self._buffer, self._start)[0]
+
+    def _reserve(self, size):
+        '''
+        Makes sure there are at least `size` free bytes after the stored data and returns a view of the free space.
+        '''
+        if len(self._buffer) - self._end >= size:
+            return self._view[self._end:]
+
+        pending = self._end - self._start
+        required = max(pending + size, self._needed())
+        if not self._exported and required <= len(self._buffer):
+            # Move the (partial) data to the front, copy first since the source and destination may overlap
+            self._buffer[:pending] = bytes(self._view[self._start:self._end])
+        else:
+            # Grow, or move to fresh memory so views handed out by frames() stay intact
+            new_size = len(self._buffer)
+            while new_size < required:
+                new_size *= 2
+            new_buffer = bytearray(new_size)
+            new_buffer[:pending] = self._view[self._start:self._end]
+
+            self._buffer = new_buffer
+            self._view = memoryview(self._buffer)
+
+        self._start = 0
+        self._end = pending
+        return self._view[self._end:]
+
+    def recv_into(self, connection):
+        '''
+        Reads available data from a socket into the buffer. Exceptions raised by the socket, such as `BlockingIOError`, are propagated.
+
+        Returns:
+          int: The number of bytes read, `0` means the connection was closed.
+        '''
+        # Leave room for the rest of the current frame (or a good sized chunk) so large frames are read in few calls
+        view = self._reserve(max(self._needed() - len(self), len(self._buffer) // 4))
+        amt = connection.recv_into(view)
+        self._end += amt
+        return amt
+
+    def extend(self, data):
+        '''
+        Copies data from a bytes like object into the buffer.
+        '''
+        view = self._reserve(len(data))
+        view[:len(data)] = data
+        self._end += len(data)
+
+    def frames(self):
+        '''
+        Returns:
+          list: A `memoryview` of each complete message in the buffer (in order). The data of a trailing incomplete message is kept for the next call.
+        '''
+        frames = []
+        while self._end - self._start >= HEADER_SIZE:
+            length = struct.unpack_from('>L', self._buffer, self._start)[0]
+            frame_end = self._start + HEADER_SIZE + length
+            if frame_end > self._end:
+                break
+
+            frames.append(self._view[self._start + HEADER_SIZE:frame_end])
+            self._start = frame_end
+
+        if len(frames) != 0:
+            self._exported = True
+
+        return frames
 
 
 def pack(message):
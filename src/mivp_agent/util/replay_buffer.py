@@ -0,0 +1,295 @@
+from collections import deque
+
+import numpy as np
+
+from mivp_agent.const import KEY_ID, KEY_EPISODE_MGR_REPORT
+from mivp_agent.log.metadata import LogMetadata
+from mivp_agent.proto import translate
+from mivp_agent.util.data_structures import ColumnarBatch, SumTree
+
+
+class ReplayBuffer:
+    '''
+    A fixed capacity ring buffer of transitions for off-policy learning, stored column by column in NumPy arrays. Once full, the oldest transitions are overwritten.
+
+    With `n_step > 1` the transitions of each vehicle are chained before being stored, so each stored row holds the discounted return of up to `n_step` rewards, the state `n_step` steps later and the discount to bootstrap from it with. Rows are stored once their `n_step` rewards are known or their episode ends, and `flush()` stores the rest. `add_batch()` flushes after every batch by default, because the Driver pauses the vehicles between batches without marking where their episodes ended.
+
+    With `prioritized=True` rows are sampled in proportion to their priority to the power of `alpha`, kept in a [`SumTree`][mivp_agent.util.data_structures.SumTree]. New rows get the highest priority seen so far, and the learner sets new ones with `update_priorities()`.
+
+    The shape and dtype of states and actions are taken from the first transition added.
+
+    Examples:
+      ```
+      buffer = ReplayBuffer(1_000_000, n_step=3, prioritized=True)
+      buffer.load_session('/path/to/logs', 'session_id', convert)
+
+      with Driver(agent, columnar=True) as driver:
+        for batch in driver.sample(float('inf'), 10):
+          # Each batch ends its vehicles' n-step chains
+          buffer.add_batch(batch, reward)
+          sample = buffer.sample(256)
+          ...
+          buffer.update_priorities(sample['indices'], td_errors)
+      ```
+    '''
+    COLUMNS = ('s1', 'a', 'r', 's2', 'done', 'discount')
+
+    def __init__(self, capacity, n_step=1, gamma=0.99, prioritized=False, alpha=0.6, beta=0.4, eps=1e-6, seed=None):
+        '''
+        Args:
+          capacity (int): The most transitions stored
+          n_step (int): The number of rewards summed into each stored return
+          gamma (float): The discount factor
+          prioritized (bool): Sample in proportion to priority instead of uniformly
+          alpha (float): How strongly priorities skew sampling, 0 is uniform
+          beta (float): How strongly the importance sampling weights correct for the skew, 1 corrects fully
+          eps (float): Added to every priority so every transition can be sampled
+          seed (int): Seed of the sampling random number generator
+        '''
+        assert capacity > 0, "capacity must be positive"
+        assert n_step >= 1, "n_step must be at least 1"
+
+        self.capacity = capacity
+        self.n_step = n_step
+        self.gamma = gamma
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+
+        self._rng = np.random.default_rng(seed)
+        self._columns = None
+        self._next = 0
+        self._size = 0
+
+        # Transitions of each vehicle waiting for the rest of their n-step return
+        self._pending = {}
+
+        self._tree = None
+        self._max_priority = 1.0
+        if prioritized:
+            self._tree = SumTree(capacity)
+
+    def _allocate(self, state, action):
+        state = np.asarray(state)
+        action = np.asarray(action)
+        self._columns = {
+            's1': np.empty((self.capacity,) + state.shape, dtype=state.dtype),
+            'a': np.empty((self.capacity,) + action.shape, dtype=action.dtype),
+            'r': np.empty(self.capacity, dtype=np.float64),
+            's2': np.empty((self.capacity,) + state.shape, dtype=state.dtype),
+            'done': np.empty(self.capacity, dtype=bool),
+            'discount': np.empty(self.capacity, dtype=np.float64)
+        }
+
+    def _store(self, s1, a, r, s2, done, discount):
+        count = len(r)
+        if count == 0:
+            return
+        if self._columns is None:
+            self._allocate(s1[0], a[0])
+
+        # Only the newest rows survive a write larger than the buffer
+        skip = max(0, count - self.capacity)
+        rows = (self._next + skip + np.arange(count - skip)) % self.capacity
+        for name, values in (('s1', s1), ('a', a), ('r', r), ('s2', s2), ('done', done), ('discount', discount)):
+            self._columns[name][rows] = np.asarray(values)[skip:]
+
+        self._next = (self._next + count) % self.capacity
+        self._size = min(self._size + count, self.capacity)
+
+        if self._tree is not None:
+            self._tree.update(rows, np.full(rows.shape, self._max_priority ** self.alpha))
+
+    def _emit(self, pending):
+        # Sums the rewards of the pending transitions into one row starting at the oldest
+        s1, a, _, _, _ = pending[0]
+        r = 0.0
+        for k, (_, _, reward, s2, done) in enumerate(pending):
+            r += self.gamma ** k * reward
+        return s1, a, r, s2, done, self.gamma ** len(pending)
+
+    def add(self, s1, a, r, s2, done=False, vid=None):
+        '''
+        Adds one transition.
+
+        Args:
+          s1: The state the action was chosen in
+          a: The action, as an array
+          r (float): The reward
+          s2: The state the action led to
+          done (bool): If the episode ended with `s2`
+          vid (str): The vehicle's id, transitions of different vehicles are never chained together
+        '''
+        self.add_many([s1], [a], [r], [s2], [done], [vid])
+
+    def add_many(self, s1, a, r, s2, done, vid=None):
+        '''
+        Adds many transitions given as columns, in the order they happened for each vehicle.
+
+        Args:
+          vid (array_like): The vehicle of each transition, may be `None` if there is only one vehicle
+        '''
+        if self.n_step == 1:
+            self._store(s1, a, r, s2, done, np.full(len(r), self.gamma))
+            return
+
+        if vid is None:
+            vid = [None] * len(r)
+
+        rows = []
+        for row in zip(s1, a, r, s2, done, vid):
+            pending = self._pending.setdefault(row[5], deque())
+            pending.append(row[:5])
+
+            if row[4]:
+                # The episode is over, every pending transition's return is complete
+                while len(pending) != 0:
+                    rows.append(self._emit(pending))
+                    pending.popleft()
+                del self._pending[row[5]]
+            elif len(pending) == self.n_step:
+                rows.append(self._emit(pending))
+                pending.popleft()
+
+        self._store_rows(rows)
+
+    def _store_rows(self, rows):
+        if len(rows) != 0:
+            self._store(*(np.asarray(column) for column in zip(*rows)))
+
+    def flush(self, vid=None):
+        '''
+        Stores the transitions still waiting for their n-step return with the rewards known so far, for example at the end of collection or when a vehicle disconnects.
+
+        Args:
+          vid (str): Only flush this vehicle, all of them by default
+        '''
+        vids = list(self._pending) if vid is None else [vid]
+        rows = []
+        for v in vids:
+            pending = self._pending.pop(v, deque())
+            while len(pending) != 0:
+                rows.append(self._emit(pending))
+                pending.popleft()
+
+        self._store_rows(rows)
+
+    def add_batch(self, batch, reward, action_to_array=None, flush=True):
+        '''
+        Adds a batch yielded by `Driver.sample()`.
+
+        Args:
+          batch: A [`ColumnarBatch`][mivp_agent.util.data_structures.ColumnarBatch] or list of `Transition`s
+          reward (callable): Takes the `s1`, `a` and `s2` columns of the batch and returns the reward of each row
+          action_to_array (callable): Converts the actions of a list of transitions to arrays, for example the agent's `action_to_array()`. By default actions are stored as they are.
+          flush (bool): Store the transitions still waiting for their n-step return once the batch is added, so no return spans two batches. Only pass `False` for batches of `Driver.sample(pipeline=True)`, whose episodes carry on into the next batch.
+        '''
+        if len(batch) == 0:
+            if flush:
+                self.flush()
+            return
+
+        if isinstance(batch, ColumnarBatch):
+            s1, a, s2, done, vid = batch.s1, batch.a, batch.s2, batch.done, batch.vid
+        else:
+            if action_to_array is None:
+                action_to_array = np.asarray
+            s1 = np.array([t.s1 for t in batch])
+            a = np.array([action_to_array(t.action) for t in batch])
+            s2 = np.array([t.s2 for t in batch])
+            done = np.array([t.done for t in batch])
+            vid = [t.vid for t in batch]
+
+        self.add_many(s1, a, reward(s1, a, s2), s2, done, vid)
+        if flush:
+            self.flush()
+
+    def load_logs(self, logs, convert, read_size=1000):
+        '''
+        Adds the transitions written by the managers' transition loggers.
+
+        Args:
+          logs (list): `ProtoLogger`s opened for reading, such as those returned by `LogMetadata.get_logs()`
+          convert (callable): Takes the `s1`, `a` and `s2` dicts of a transition and returns its `(s1, a, r, s2)` as stored in the buffer, or `None` to skip it
+          read_size (int): The number of transitions read from disk at once
+        '''
+        for log in logs:
+            vids = set()
+            while log.has_more():
+                for t in log.read(read_size):
+                    s1 = translate.state_to_dict(t.s1)
+                    a = translate.action_to_dict(t.a)
+                    s2 = translate.state_to_dict(t.s2)
+
+                    row = convert(s1, a, s2)
+                    if row is None:
+                        continue
+
+                    report1 = s1[KEY_EPISODE_MGR_REPORT]
+                    report2 = s2[KEY_EPISODE_MGR_REPORT]
+                    done = report1 is not None and report2 is not None and report1['NUM'] != report2['NUM']
+                    self.add(*row, done=done, vid=s1[KEY_ID])
+                    vids.add(s1[KEY_ID])
+
+            # Don't chain the end of one log with the start of another for the same vehicle
+            for vid in vids:
+                self.flush(vid)
+
+    def load_session(self, path, id, convert, read_size=1000):
+        '''
+        Adds every log of a session in a log directory, see `load_logs()`.
+
+        Args:
+          path (str): The log directory
+          id (str): The session id
+
+        Returns:
+          bool: False if the session is not in the log directory
+        '''
+        logs = LogMetadata(path).get_logs(id)
+        if logs is None:
+            return False
+
+        self.load_logs(logs, convert, read_size=read_size)
+        return True
+
+    def sample(self, batch_size):
+        '''
+        Returns:
+          dict: The `s1`, `a`, `r`, `s2`, `done` and `discount` columns of the sampled rows, their `indices` and the importance sampling `weights` to scale their losses by (all ones when sampling uniformly)
+        '''
+        assert self._size != 0, "Can not sample from an empty buffer"
+
+        if self._tree is None:
+            indices = self._rng.integers(0, self._size, batch_size)
+            weights = np.ones(batch_size)
+        else:
+            # One sample from each of `batch_size` equal segments of the total priority
+            total = self._tree.total()
+            values = (np.arange(batch_size) + self._rng.random(batch_size)) * (total / batch_size)
+            indices = self._tree.find(values)
+
+            probabilities = self._tree[indices] / total
+            weights = (self._size * probabilities) ** -self.beta
+            weights /= weights.max()
+
+        sample = {name: column[indices] for name, column in self._columns.items()}
+        sample['indices'] = indices
+        sample['weights'] = weights
+        return sample
+
+    def update_priorities(self, indices, priorities):
+        '''
+        Args:
+          indices (array_like): Indices returned by `sample()`
+          priorities (array_like): The new priorities, such as the absolute TD errors
+        '''
+        assert self._tree is not None, "Priorities are only kept by prioritized buffers"
+
+        priorities = np.abs(np.asarray(priorities, dtype=np.float64)) + self.eps
+        self._max_priority = max(self._max_priority, priorities.max())
+        self._tree.update(indices, priorities ** self.alpha)
+
+    def __len__(self):
+        return self._size
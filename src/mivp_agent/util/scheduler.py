@@ -0,0 +1,162 @@
+import heapq
+from abc import ABC, abstractmethod
+
+
+class Scheduler(ABC):
+    '''
+    Decides which vehicle's message a [`MessageQueue`][mivp_agent.util.message_queue.MessageQueue] hands out next. The queue tells the scheduler whenever the oldest message of a vehicle changes, so choosing never has to look at every vehicle. All methods are called with the queue's lock held and should be cheap.
+    '''
+
+    @abstractmethod
+    def ready(self, vid, seq):
+        '''
+        Called when a vehicle's oldest queued message changes, including when its first message is queued.
+
+        Args:
+          vid (str): The vehicle
+          seq (int): The sequence number of its oldest message. Lower sequence numbers were queued earlier.
+        '''
+        pass
+
+    @abstractmethod
+    def remove(self, vid):
+        '''
+        Called when a vehicle no longer has messages queued, other than through `choose()`.
+        '''
+        pass
+
+    @abstractmethod
+    def choose(self):
+        '''
+        Only called when at least one vehicle is ready. The chosen vehicle is forgotten until `ready()` is called for it again.
+
+        Returns:
+          str: The vname to take a message from
+        '''
+        pass
+
+
+class _HeapScheduler(Scheduler):
+    '''
+    Keeps the ready vehicles in a heap ordered by `_key()`, so each call costs `O(log n)` in the number of vehicles. Entries for vehicles whose oldest message has changed are skipped when they reach the top.
+    '''
+
+    def __init__(self):
+        self._heap = []
+        # The sequence number of each ready vehicle's oldest message, heap entries with any other are stale
+        self._heads = {}
+
+    @abstractmethod
+    def _key(self, vid, seq):
+        pass
+
+    def _chosen(self, vid, key):
+        pass
+
+    def ready(self, vid, seq):
+        # Ties go to the vehicle which has waited longest
+        heapq.heappush(self._heap, (self._key(vid, seq), seq, vid))
+        self._heads[vid] = seq
+
+    def remove(self, vid):
+        self._heads.pop(vid, None)
+
+    def _top(self):
+        while True:
+            key, seq, vid = self._heap[0]
+            if self._heads.get(vid) == seq:
+                return key, vid
+            heapq.heappop(self._heap)
+
+    def peek(self):
+        '''
+        Returns:
+          str: The vname `choose()` would return, without choosing it
+        '''
+        return self._top()[1]
+
+    def choose(self):
+        key, vid = self._top()
+        heapq.heappop(self._heap)
+        del self._heads[vid]
+        self._chosen(vid, key)
+        return vid
+
+
+class FifoScheduler(_HeapScheduler):
+    '''
+    Hands out messages in the order they were queued, regardless of vehicle.
+    '''
+
+    def _key(self, vid, seq):
+        return seq
+
+
+class RoundRobinScheduler(_HeapScheduler):
+    '''
+    Takes one message from each vehicle in turn, so a vehicle which steps quickly can not starve the others. The vehicle served least recently goes first.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self._turn = 0
+        self._last_served = {}
+
+    def _key(self, vid, seq):
+        return self._last_served.get(vid, -1)
+
+    def _chosen(self, vid, key):
+        self._turn += 1
+        self._last_served[vid] = self._turn
+
+
+class WeightedScheduler(_HeapScheduler):
+    '''
+    Shares messages between vehicles in proportion to their weights when they all have messages queued. Each vehicle's pass advances by its stride, `STRIDE / weight` rounded to an integer, with every message it is given and the vehicle with the lowest pass goes next (stride scheduling), so a heavy vehicle's turns are spread out instead of bunched. Passes are integers so they never drift however long the run. Vehicles which had nothing queued rejoin at the current pass instead of catching up on the turns they missed.
+    '''
+    STRIDE = 1 << 20
+
+    def __init__(self, weights, default=1):
+        '''
+        Args:
+          weights (dict): Maps vnames to positive weights
+          default (float): The weight of vehicles not in `weights`
+        '''
+        super().__init__()
+        assert all(w > 0 for w in weights.values()) and default > 0, "Weights must be positive"
+
+        self._weights = dict(weights)
+        self._default = default
+        self._pass = {}
+        self._now = 0
+
+    def _stride(self, vid):
+        return max(1, round(self.STRIDE / self._weights.get(vid, self._default)))
+
+    def _key(self, vid, seq):
+        if vid not in self._heads:
+            self._pass[vid] = max(self._pass.get(vid, 0), self._now)
+        return self._pass[vid]
+
+    def _chosen(self, vid, key):
+        self._now = key
+        self._pass[vid] = key + self._stride(vid)
+
+
+class PriorityScheduler(_HeapScheduler):
+    '''
+    Always hands out the messages of the highest priority vehicles with messages queued first, in the order they were queued. Lower priority vehicles only get attention when higher ones have nothing queued.
+    '''
+
+    def __init__(self, priorities, default=0):
+        '''
+        Args:
+          priorities (dict): Maps vnames to priorities, higher is served first
+          default (float): The priority of vehicles not in `priorities`
+        '''
+        super().__init__()
+        self._priorities = dict(priorities)
+        self._default = default
+
+    def _key(self, vid, seq):
+        return -self._priorities.get(vid, self._default)
@@ -8,8 +8,6 @@ from .state import FAKE_PAUSE_STATE, FAKE_RUNNING_STATE
 def dup_message(msg: MissionMessage):
     '''
     Helper method to provide a copy of a mission message with a deepcopy of the episode_report and observation as these are dicts.
-
-    Deepcopy does not work on MissionMessages because they contain locking primitives
     '''
     m = copy(msg)
     m.episode_report = deepcopy(m.episode_report)
@@ -1,7 +1,7 @@
 import os
 import pytest
 
-from mivp_agent.bridge import get_server_host_and_port
+from mivp_agent.bridge import get_server_host_and_port, unix_socket_path
 
 
 @pytest.fixture(autouse=True)
@@ -26,4 +26,16 @@ def test_host_and_port():
     os.environ['AGENT_SERVER_PORT'] = '34022'
     host, port = get_server_host_and_port()
     assert host == '192.168.1.12'
-    assert port == 34022
\ No newline at end of file
+    assert port == 34022
+
+
+def test_unix_socket_path():
+    assert unix_socket_path('localhost') is None
+    assert unix_socket_path('192.168.1.12') is None
+    assert unix_socket_path('unix:///tmp/mivp-agent.sock') == '/tmp/mivp-agent.sock'
+
+    # Unix sockets are selected through the same environment variable
+    os.environ['AGENT_SERVER_HOSTNAME'] = 'unix:///tmp/mivp-agent.sock'
+    host, _ = get_server_host_and_port()
+    assert unix_socket_path(host) == '/tmp/mivp-agent.sock'
+    os.environ.pop('AGENT_SERVER_HOSTNAME')
@@ -1,3 +1,4 @@
+import time
 import pytest
 from copy import copy
 from unittest.mock import patch, call, Mock, MagicMock
@@ -73,7 +74,7 @@ def test_sample_preflight_wait(mock_manager):
 @patch('mivp_agent.driver.MissionManager')
 def test_sample_preflight_pause(mock_manager):
     mock_manager = mock_manager.return_value
-    mock_manager.get_ids.return_value = (
+    mock_manager.get_connected_ids.return_value = (
         'id1',
         'id2'
     )
@@ -81,7 +82,7 @@ def test_sample_preflight_pause(mock_manager):
         'id1': 'RUNNING',
         'id2': 'RUNNING'
     }
-    mock_manager.episode_state = lambda id: episode_state[id]
+    mock_manager.in_episode_state = lambda ids, state: all(episode_state[id] == state for id in ids)
 
     message_mocks = (
         Mock(spec=MissionMessage),
@@ -134,7 +135,7 @@ def test_sample_single_batch(mock_manager, mock_agent):
         return m
     m1 = wrap_message(message1)
     m2 = wrap_message(message2)
-    mock_manager.get_message.side_effect = (m1, m2)
+    mock_manager.get_messages.side_effect = ([m1], [m2])
 
     '''
     Agent setup
@@ -142,7 +143,7 @@ def test_sample_single_batch(mock_manager, mock_agent):
     Constructing both a fake and a mock on this one to I can verify that the correct methods have been called
     '''
     mock_model = MagicMock(spec=Model)
-    mock_model.rlock.return_value.__exit__.return_value = None
+    mock_model.pin.return_value.__exit__.return_value = None
 
     fa = FakeAgent(mock_model)
     mock_agent.build_model.side_effect = fa.build_model
@@ -169,7 +170,7 @@ def test_sample_single_batch(mock_manager, mock_agent):
     mock_agent.observation_to_state.assert_has_calls(state_calls)
 
     # Assert state -> action has been called properly
-    mock_model.rlock.assert_has_calls((call(), call()), any_order=True) # For some reason the calls to __enter__ and __exit__ are showing up here, so any_order is True to prevent double calls
+    mock_model.pin.assert_has_calls((call(), call()), any_order=True) # For some reason the calls to __enter__ and __exit__ are showing up here, so any_order is True to prevent double calls
     act_calls = (
         call(mock_model, (98.0, 40.0), m1.observation),
         call(mock_model, (-12.0, 40.0), m2.observation)
@@ -180,5 +181,168 @@ def test_sample_single_batch(mock_manager, mock_agent):
     mock_agent.start_episode.assert_has_calls((call(), call()))
 
     # Make sure act was called
-    m1.act.assert_called_once_with(FAKE_ACTION)
-    m2.act.assert_called_once_with(FAKE_ACTION)
\ No newline at end of file
+    mock_manager.act_many.assert_has_calls((
+        call([m1], [FAKE_ACTION]),
+        call([m2], [FAKE_ACTION])
+    ))
+
+
+@patch('mivp_agent.driver.MissionManager')
+def test_sample_batched_inference(mock_manager):
+    mock_manager = mock_manager.return_value
+
+    # Two vehicles step together, then one finishes its episode
+    messages = []
+    for vid, nav_x in (('felix', 1.0), ('evan', 2.0), ('felix', 3.0)):
+        message = dup_message(FAKE_RUNNING_MESSAGE)
+        message.vid = vid
+        message.observation['NAV_X'] = nav_x
+        if nav_x == 3.0:
+            message.episode_report['NUM'] += 1
+        messages.append(Mock(wraps=message, vid=vid, observation=message.observation, episode_state=message.episode_state, episode_report=message.episode_report))
+    mock_manager.get_messages.side_effect = (messages[:2], messages[2:])
+
+    mock_model = MagicMock(spec=Model)
+
+    class BatchAgent(FakeAgent):
+        def states_to_actions(self, model, states, observations):
+            self.calls.append((states, observations))
+            return [dict(FAKE_ACTION, speed=state[0]) for state in states]
+
+    agent = BatchAgent(mock_model)
+    agent.calls = []
+    agent.state_to_action = Mock()
+
+    d = Driver(agent)
+    d._preflight_check = lambda: None
+    with d:
+        next(d.sample(1, 1))
+
+    # One inference call per tick, with every vehicle which arrived in a new state
+    assert [states for states, _ in agent.calls] == [[(1.0, 40.0), (2.0, 40.0)], [(3.0, 40.0)]]
+    assert agent.calls[0][1] == [messages[0].observation, messages[1].observation]
+    agent.state_to_action.assert_not_called()
+    assert mock_model.pin.call_count == 2
+
+    mock_manager.act_many.assert_has_calls((
+        call(messages[:2], [dict(FAKE_ACTION, speed=1.0), dict(FAKE_ACTION, speed=2.0)]),
+        call(messages[2:], [dict(FAKE_ACTION, speed=3.0)])
+    ))
+
+
+def _running_messages(vid, nav_xs, first_episode=0):
+    messages = []
+    for i, nav_x in enumerate(nav_xs):
+        message = dup_message(FAKE_RUNNING_MESSAGE)
+        message.vid = vid
+        message.observation['NAV_X'] = nav_x
+        message.episode_report['NUM'] = first_episode + i
+        messages.append(Mock(wraps=message, vid=vid, observation=message.observation, episode_state=message.episode_state, episode_report=message.episode_report))
+    return messages
+
+
+@patch('mivp_agent.driver.MissionManager')
+def test_sample_pipelined(mock_manager):
+    mock_manager = mock_manager.return_value
+    m1, m2, m3 = _running_messages('felix', (1.0, 2.0, 3.0))
+    mock_manager.get_messages.side_effect = ([m1], [m2], [m3])
+
+    d = Driver(FakeAgent(MagicMock(spec=Model)))
+    d._preflight_check = lambda: None
+    d._pause_all = Mock()
+    with d:
+        batches = list(d.sample(2, 1, pipeline=True))
+
+    # The transition spanning the two batches is kept in the second
+    assert [[(t.s1, t.s2) for t in batch] for batch in batches] == [
+        [((1.0, 40.0), (2.0, 40.0))],
+        [((2.0, 40.0), (3.0, 40.0))]
+    ]
+    # Vehicles are only paused once collection has finished
+    d._pause_all.assert_called_once()
+    assert not d._work_lock.locked()
+
+
+@patch('mivp_agent.driver.MissionManager')
+def test_sample_pipelined_staleness(mock_manager):
+    mock_manager = mock_manager.return_value
+    messages = _running_messages('felix', [float(x) for x in range(10)])
+    mock_manager.get_messages.side_effect = [[m] for m in messages]
+
+    d = Driver(FakeAgent(MagicMock(spec=Model)))
+    d._preflight_check = lambda: None
+    d._pause_all = Mock()
+    with d:
+        batches = d.sample(float('inf'), 1, pipeline=True, max_staleness=2)
+        next(batches)
+
+        # One batch handed out and two waiting, collection stops there until the next is taken
+        for _ in range(100):
+            if mock_manager.get_messages.call_count >= 4:
+                break
+            time.sleep(0.01)
+        time.sleep(0.05)
+        assert mock_manager.get_messages.call_count == 4
+
+        batches.close()
+
+    d._pause_all.assert_called_once()
+    assert not d._stop_collecting.is_set()
+
+
+@patch('mivp_agent.driver.MissionManager')
+def test_transition_versions(mock_manager):
+    mock_manager = mock_manager.return_value
+    m1, m2, m3 = _running_messages('felix', (1.0, 2.0, 3.0))
+
+    class VersionModel(Model):
+        def inference(self, state):
+            return FAKE_ACTION
+
+    model = VersionModel()
+    model.rlock = Mock(wraps=model.rlock)
+
+    def get_messages(batches=iter(([m1], [m2], [m3]))):
+        batch = next(batches)
+        # The trainer publishes between the first and second actions
+        if batch == [m2]:
+            model.publish('new weights')
+        return batch
+    mock_manager.get_messages.side_effect = get_messages
+
+    # Agents are deep copied per vehicle, keep the model out of the copies
+    agent = FakeAgent(None)
+    agent.build_model = lambda: model
+
+    d = Driver(agent)
+    d._preflight_check = lambda: None
+    with d:
+        batch = next(d.sample(1, 2))
+
+    assert [t.version for t in batch] == [0, 1]
+    # Only the inference before the first publish took the read lock, for models updated in place
+    assert model.rlock.call_count == 1
+
+
+@patch('mivp_agent.driver.MissionManager')
+def test_sample_columnar(mock_manager):
+    mock_manager = mock_manager.return_value
+    felix = _running_messages('felix', (1.0, 2.0, 3.0))
+    evan = _running_messages('evan', (4.0, 5.0), first_episode=7)
+    # Only the last state starts a new episode
+    felix[1].episode_report['NUM'] = 0
+    evan[1].episode_report['NUM'] = 7
+    mock_manager.get_messages.side_effect = ([felix[0], evan[0]], [felix[1], evan[1]], [felix[2]])
+
+    d = Driver(FakeAgent(MagicMock(spec=Model)), columnar=True)
+    d._preflight_check = lambda: None
+    with d:
+        batch = next(d.sample(1, 1))
+
+    assert len(batch) == 3
+    assert batch.s1.tolist() == [[1.0, 40.0], [4.0, 40.0], [2.0, 40.0]]
+    assert batch.s2.tolist() == [[2.0, 40.0], [5.0, 40.0], [3.0, 40.0]]
+    assert batch.a.tolist() == [[FAKE_ACTION['speed'], FAKE_ACTION['course']]] * 3
+    assert batch.vid.tolist() == ['felix', 'evan', 'felix']
+    assert batch.episode.tolist() == [0, 7, 0]
+    assert batch.done.tolist() == [False, False, True]
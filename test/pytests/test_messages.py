@@ -0,0 +1,55 @@
+import pytest
+from threading import Thread
+
+from fake.state import FAKE_RUNNING_STATE
+from fake.actions import FAKE_ACTION
+
+from mivp_agent.const import KEY_EPISODE_MGR_STATE
+from mivp_agent.messages import MissionMessage, INSTR_SEND_STATE
+
+
+def test_slots():
+    msg = MissionMessage('fake-addr', FAKE_RUNNING_STATE)
+    assert not hasattr(msg, '__dict__')
+    with pytest.raises(AttributeError):
+        msg.not_a_field = True
+
+
+def test_lazy_episode_fields():
+    state = dict(FAKE_RUNNING_STATE)
+    msg = MissionMessage('fake-addr', state)
+
+    state[KEY_EPISODE_MGR_STATE] = 'PAUSED'
+    assert msg.episode_state == 'PAUSED'
+    assert msg.episode_report['NUM'] == 0
+
+    # Stays assignable
+    msg.episode_state = 'RUNNING'
+    assert msg.episode_state == 'RUNNING'
+
+
+def test_single_response():
+    sent = []
+    msg = MissionMessage('fake-addr', FAKE_RUNNING_STATE, notify=sent.append)
+
+    # Only one of many racing responders wins
+    results = []
+    threads = [Thread(target=lambda: results.append(msg._time_out(INSTR_SEND_STATE))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+    assert sent == [msg]
+    assert msg.timed_out
+
+    # Late responses are ignored
+    msg.act(FAKE_ACTION)
+    assert msg._response is INSTR_SEND_STATE
+    assert sent == [msg]
+
+    msg = MissionMessage('fake-addr', FAKE_RUNNING_STATE)
+    msg.request_new()
+    with pytest.raises(AssertionError):
+        msg.act(FAKE_ACTION)
+    assert not msg._time_out(INSTR_SEND_STATE)
@@ -0,0 +1,52 @@
+import pytest
+from threading import Thread
+
+from mivp_agent import Model
+
+
+class WeightModel(Model):
+    def inference(self, state):
+        return self.current().weights
+
+
+def test_publish():
+    m = WeightModel()
+    assert m.current().version == 0
+    assert m.inference(None) is None
+
+    snapshot = m.publish({'w': 1})
+    assert snapshot.version == 1
+    assert m.current() is snapshot
+    assert m.version == 1
+    assert m.inference(None) == {'w': 1}
+
+    assert m.publish({'w': 2}).version == 2
+
+    with pytest.raises(AttributeError):
+        snapshot.weights = {'w': 3}
+
+
+def test_pin():
+    m = WeightModel()
+    m.publish('a')
+
+    with m.pin() as snapshot:
+        assert snapshot.weights == 'a'
+
+        # Published from another thread while this one is pinned
+        t = Thread(target=m.publish, args=('b',))
+        t.start()
+        t.join()
+
+        assert m.current() is snapshot
+        assert m.inference(None) == 'a'
+
+        # Other threads see the new snapshot
+        seen = []
+        t = Thread(target=lambda: seen.append(m.inference(None)))
+        t.start()
+        t.join()
+        assert seen == ['b']
+
+    assert m.inference(None) == 'b'
+    assert m.version == 2
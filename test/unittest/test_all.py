@@ -8,10 +8,17 @@ import test_file_system
 import test_bridge
 import test_log
 import test_manager
+import test_async_manager
+import test_sharded_manager
+import test_bench
+import test_metrics
+import test_message_queue
 import test_data_structures
+import test_replay_buffer
 import test_proto
 import test_consumer
 import test_packit
+import test_codec
 
 from mivp_agent.util.file_system import safe_clean
 from mivp_agent.const import DATA_DIRECTORY
@@ -30,13 +37,25 @@ if __name__ == '__main__':
     suite.addTest(unittest.makeSuite(test_file_system.TestUnique))
     suite.addTest(unittest.makeSuite(test_packit.TestPackitEncode))
     suite.addTest(unittest.makeSuite(test_packit.TestPackitDecode))
+    suite.addTest(unittest.makeSuite(test_packit.TestFrameBuffer))
+    suite.addTest(unittest.makeSuite(test_codec.TestCodec))
     suite.addTest(unittest.makeSuite(test_bridge.TestBridge))
     suite.addTest(unittest.makeSuite(test_log.TestMetadata))
+    suite.addTest(unittest.makeSuite(test_log.TestTransitionLogger))
     suite.addTest(unittest.makeSuite(test_proto.TestProto))
     suite.addTest(unittest.makeSuite(test_consumer.TestConsumer))
     suite.addTest(unittest.makeSuite(test_manager.TestManagerCore))
     suite.addTest(unittest.makeSuite(test_manager.TestManagerLogger))
+    suite.addTest(unittest.makeSuite(test_async_manager.TestAsyncManager))
+    suite.addTest(unittest.makeSuite(test_sharded_manager.TestShardedManager))
+    suite.addTest(unittest.makeSuite(test_bench.TestBench))
+    suite.addTest(unittest.makeSuite(test_message_queue.TestMessageQueue))
+    suite.addTest(unittest.makeSuite(test_message_queue.TestScheduler))
     suite.addTest(unittest.makeSuite(test_data_structures.TestLimitedHistory))
+    suite.addTest(unittest.makeSuite(test_data_structures.TestColumnarBatch))
+    suite.addTest(unittest.makeSuite(test_data_structures.TestSumTree))
+    suite.addTest(unittest.makeSuite(test_replay_buffer.TestReplayBuffer))
+    suite.addTest(unittest.makeSuite(test_metrics.TestMetrics))
     suite.addTest(unittest.makeSuite(test_proto.TestLogger))
 
     runner = unittest.TextTestRunner()
@@ -0,0 +1,169 @@
+import unittest
+import asyncio
+
+from mivp_agent.async_manager import AsyncMissionManager
+from mivp_agent.messages import AsyncMissionMessage, INSTR_SEND_STATE
+from mivp_agent.bridge import ModelBridgeClient
+from mivp_agent.const import KEY_ID, KEY_EPISODE_MGR_REPORT, KEY_EPISODE_MGR_STATE
+
+from mivp_agent.util.parse import parse_report
+
+DUMMY_INSTR = {
+    'speed': 2.0,
+    'course': 120.0,
+    'posts': {
+        'FAKE_VAR': 'fake_val'
+    },
+    'ctrl_msg': 'SEND_STATE'
+}
+
+DUMMY_ACTION = {
+    'speed': DUMMY_INSTR['speed'],
+    'course': DUMMY_INSTR['course'],
+    'posts': DUMMY_INSTR['posts']
+}
+
+DUMMY_STATE = {
+    KEY_ID: 'felix',
+    'MOOS_TIME': 16923.012,
+    'NAV_X': 98.0,
+    'NAV_Y': 40.0,
+    'NAV_HEADING': 180,
+    KEY_EPISODE_MGR_REPORT: 'NUM=0,DURATION=60.57,SUCCESS=false,WILL_PAUSE=false',
+    KEY_EPISODE_MGR_STATE: 'PAUSED'
+}
+
+DUMMY_STATE_PARSED = DUMMY_STATE.copy()
+DUMMY_STATE_PARSED[KEY_EPISODE_MGR_REPORT] = parse_report(DUMMY_STATE_PARSED[KEY_EPISODE_MGR_REPORT])
+
+
+async def connect(client):
+    # Connect in an executor so the event loop is free to serve the connection
+    loop = asyncio.get_event_loop()
+    while not await loop.run_in_executor(None, client.connect):
+        await asyncio.sleep(0.1)
+
+
+async def listen(client):
+    instr = client.listen()
+    while instr is False:
+        await asyncio.sleep(0.01)
+        instr = client.listen()
+    return instr
+
+
+class TestAsyncManager(unittest.IsolatedAsyncioTestCase):
+    async def test_basic(self):
+        with ModelBridgeClient() as client:
+            async with AsyncMissionManager('test', log=False) as mgr:
+                await connect(client)
+                self.assertEqual(await asyncio.wait_for(listen(client), 5), INSTR_SEND_STATE)
+
+                self.assertIsNone(await mgr.get_message(block=False))
+                self.assertTrue(client.send_state(DUMMY_STATE))
+
+                msg = await asyncio.wait_for(mgr.get_message(), 5)
+                self.assertTrue(isinstance(msg, AsyncMissionMessage))
+                self.assertEqual(msg.observation, DUMMY_STATE_PARSED)
+                self.assertEqual(msg.episode_state, 'PAUSED')
+                self.assertFalse(client.listen())
+
+                await asyncio.wait_for(msg.act(DUMMY_ACTION), 5)
+                self.assertEqual(await asyncio.wait_for(listen(client), 5), DUMMY_INSTR)
+
+    async def test_batch(self):
+        with ModelBridgeClient() as client:
+            async with AsyncMissionManager('test', log=False) as mgr:
+                self.assertEqual(await mgr.get_messages(timeout=0.1), [])
+
+                await connect(client)
+                self.assertEqual(await asyncio.wait_for(listen(client), 5), INSTR_SEND_STATE)
+                self.assertTrue(client.send_state(DUMMY_STATE))
+
+                msgs = await asyncio.wait_for(mgr.get_messages(), 5)
+                self.assertEqual(len(msgs), 1)
+                self.assertEqual(msgs[0].observation, DUMMY_STATE_PARSED)
+
+                await asyncio.wait_for(mgr.act_many(msgs, [DUMMY_ACTION]), 5)
+                self.assertEqual(await asyncio.wait_for(listen(client), 5), DUMMY_INSTR)
+
+    async def test_step(self):
+        vnames = ['felix', 'evan']
+        with ModelBridgeClient() as felix, ModelBridgeClient() as evan:
+            clients = [felix, evan]
+            async with AsyncMissionManager('test', log=False) as mgr:
+                for client in clients:
+                    await connect(client)
+                    self.assertEqual(await asyncio.wait_for(listen(client), 5), INSTR_SEND_STATE)
+
+                for vname, client in zip(vnames, clients):
+                    state = DUMMY_STATE.copy()
+                    state[KEY_ID] = vname
+                    self.assertTrue(client.send_state(state))
+
+                batch = await asyncio.wait_for(mgr.step(vnames=vnames), 5)
+                self.assertEqual([m.vid for m in batch.messages], vnames)
+                self.assertFalse(batch.timed_out)
+
+                await asyncio.wait_for(mgr.act_many(batch.received(), [DUMMY_ACTION] * 2), 5)
+                for client in clients:
+                    self.assertEqual(await asyncio.wait_for(listen(client), 5), DUMMY_INSTR)
+
+                # Stragglers are reported once the deadline passes
+                self.assertTrue(felix.send_state(DUMMY_STATE))
+                batch = await asyncio.wait_for(mgr.step(timeout=0.2), 5)
+                self.assertTrue(batch.timed_out)
+                self.assertEqual(batch.missing, ['evan'])
+                self.assertEqual([m.vid for m in batch.received()], ['felix'])
+
+    async def test_step_disconnect(self):
+        vnames = ['felix', 'evan']
+        with ModelBridgeClient() as felix, ModelBridgeClient() as evan:
+            clients = [felix, evan]
+            async with AsyncMissionManager('test', log=False) as mgr:
+                for vname, client in zip(vnames, clients):
+                    await connect(client)
+                    self.assertEqual(await asyncio.wait_for(listen(client), 5), INSTR_SEND_STATE)
+                    state = DUMMY_STATE.copy()
+                    state[KEY_ID] = vname
+                    self.assertTrue(client.send_state(state))
+
+                batch = await asyncio.wait_for(mgr.step(vnames=vnames), 5)
+                await asyncio.wait_for(mgr.act_many(batch.received(), [DUMMY_ACTION] * 2), 5)
+                for client in clients:
+                    self.assertEqual(await asyncio.wait_for(listen(client), 5), DUMMY_INSTR)
+
+                # The step waiting on evan finishes when evan is lost instead of waiting forever
+                self.assertTrue(felix.send_state(DUMMY_STATE))
+                waiter = asyncio.ensure_future(mgr.step())
+                await asyncio.sleep(0.2)
+                self.assertFalse(waiter.done())
+
+                evan.close()
+                batch = await asyncio.wait_for(waiter, 5)
+                self.assertEqual(batch.vnames, ['felix'])
+                self.assertEqual(batch.missing, [])
+                await asyncio.wait_for(batch.messages[0].act(DUMMY_ACTION), 5)
+
+    async def test_wait_for(self):
+        async with AsyncMissionManager('test', log=False) as mgr:
+            self.assertFalse(mgr.are_present(['evan']))
+
+            with ModelBridgeClient() as client:
+                await connect(client)
+
+                waiter = asyncio.ensure_future(mgr.wait_for(['evan']))
+                await asyncio.sleep(0.1)
+                self.assertFalse(waiter.done())
+
+                state = DUMMY_STATE.copy()
+                state[KEY_ID] = 'evan'
+                self.assertTrue(client.send_state(state))
+
+                await asyncio.wait_for(waiter, 5)
+                await asyncio.wait_for(mgr.wait_for_count(1), 5)
+                self.assertTrue(mgr.are_present(['evan']))
+
+
+if __name__ == '__main__':
+    unittest.main()
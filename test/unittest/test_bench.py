@@ -0,0 +1,58 @@
+import unittest
+import math
+
+from mivp_agent.bench import FakeVehicle, bench_manager
+from mivp_agent.messages import INSTR_SEND_STATE, INSTR_START, INSTR_PAUSE, INSTR_STOP
+from mivp_agent.const import KEY_ID, KEY_EPISODE_MGR_REPORT, KEY_EPISODE_MGR_STATE
+
+from mivp_agent.util.parse import parse_report
+from mivp_agent.util.validate import validateState
+
+
+class TestBench(unittest.TestCase):
+    def test_vehicle_episodes(self):
+        v = FakeVehicle('felix', node_reports=3, episode_steps=2)
+
+        state = v.state()
+        validateState(state)
+        self.assertEqual(state[KEY_ID], 'felix')
+        self.assertEqual(len(state['NODE_REPORTS']), 3)
+        self.assertEqual(state[KEY_EPISODE_MGR_STATE], 'PAUSED')
+        self.assertEqual(parse_report(state[KEY_EPISODE_MGR_REPORT])['NUM'], 0)
+
+        # Nothing happens until the vehicle is started
+        v.step(INSTR_SEND_STATE)
+        v.step(INSTR_SEND_STATE)
+        self.assertEqual(v.state()[KEY_EPISODE_MGR_STATE], 'PAUSED')
+
+        v.step(INSTR_START)
+        self.assertEqual(v.state()[KEY_EPISODE_MGR_STATE], 'RUNNING')
+        v.step(INSTR_SEND_STATE)
+        self.assertEqual(parse_report(v.state()[KEY_EPISODE_MGR_REPORT])['NUM'], 1)
+
+        # Pauses take effect at the end of the episode
+        v.step(INSTR_PAUSE)
+        self.assertEqual(v.state()[KEY_EPISODE_MGR_STATE], 'RUNNING')
+        v.step(INSTR_SEND_STATE)
+        state = v.state()
+        self.assertEqual(state[KEY_EPISODE_MGR_STATE], 'PAUSED')
+        self.assertTrue(parse_report(state[KEY_EPISODE_MGR_REPORT])['WILL_PAUSE'])
+
+        # Stops do not wait
+        v.step(INSTR_START)
+        v.step(INSTR_STOP)
+        self.assertEqual(v.state()[KEY_EPISODE_MGR_STATE], 'PAUSED')
+        v.close()
+
+    def test_bench_manager(self):
+        result = bench_manager(vehicles=2, duration=0.5, node_reports=2, episode_steps=10)
+
+        self.assertEqual(result.vehicles, 2)
+        self.assertGreater(result.messages, 0)
+        self.assertGreater(result.msgs_per_sec, 0)
+        self.assertFalse(math.isnan(result.p50_ms))
+        self.assertLessEqual(result.p50_ms, result.p99_ms)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,15 @@
 import unittest
+from unittest.mock import patch
 from threading import Thread
+import tempfile
+import pickle
+import socket
 import time
+import os
 
 
-from mivp_agent.bridge import ModelBridgeServer, ModelBridgeClient
+from mivp_agent.bridge import ModelBridgeServer, ModelBridgeClient, pack_frame
+from mivp_agent.util import packit
 from mivp_agent.const import KEY_EPISODE_MGR_REPORT, KEY_EPISODE_MGR_STATE, KEY_ID
 
 DUMMY_INSTR = {
@@ -133,6 +139,304 @@ class TestBridge(unittest.TestCase):
                 time.sleep(0.1)
                 self.assertEqual(server.listen(addr), DUMMY_STATE)
 
+    def test_large_state(self):
+        state = DUMMY_STATE.copy()
+        state['NODE_REPORTS'] = {}
+        for i in range(500):
+            state['NODE_REPORTS'][f'vehicle_{i}'] = {
+                'NAV_X': float(i),
+                'NAV_Y': float(-i),
+                'NAV_HEADING': 90.0,
+                'MOOS_TIME': 16923.012
+            }
+
+        with ModelBridgeServer() as server:
+            with ModelBridgeClient() as client:
+                t = Thread(target=dummy_connect_client, args=(client,))
+                t.start()
+
+                addr = None
+                while addr is None:
+                    time.sleep(0.2)
+                    addr = server.accept()
+                t.join()
+
+                for _ in range(3):
+                    self.assertTrue(client.send_state(state))
+                    server.poll(timeout=1)
+                    self.assertEqual(server.listen(addr), state)
+
+    def test_stream(self):
+        with ModelBridgeServer() as server:
+            with ModelBridgeClient() as client:
+                t = Thread(target=dummy_connect_client, args=(client,))
+                t.start()
+
+                addr = None
+                while addr is None:
+                    time.sleep(0.2)
+                    addr = server.accept()
+                t.join()
+
+                # A burst of states should be returned in one call
+                for i in range(5):
+                    state = DUMMY_STATE.copy()
+                    state['MOOS_TIME'] += i
+                    self.assertTrue(client.send_state(state))
+                time.sleep(0.1)
+
+                states = server.listen_all(addr)
+                self.assertEqual(len(states), 5)
+                for i, state in enumerate(states):
+                    self.assertEqual(state['MOOS_TIME'], DUMMY_STATE['MOOS_TIME'] + i)
+                self.assertEqual(server.listen_all(addr), [])
+
+                # Partial frames should be kept until they are complete
+                frame = packit.pack(client.codec().encode_state(DUMMY_STATE))
+                client._socket.sendall(frame[:7])
+                time.sleep(0.1)
+                self.assertEqual(server.listen_all(addr), [])
+                client._socket.sendall(frame[7:] + frame)
+                time.sleep(0.1)
+                self.assertEqual(server.listen(addr), DUMMY_STATE)
+                self.assertEqual(server.listen(addr), DUMMY_STATE)
+                self.assertIsNone(server.listen(addr))
+
+    def test_codec_negotiation(self):
+        # The client's most preferred codec which the server allows is used
+        with ModelBridgeServer(codecs=('binary', 'proto')) as server:
+            with ModelBridgeClient(codecs=('pickle', 'proto', 'binary')) as client:
+                t = Thread(target=dummy_connect_client, args=(client,))
+                t.start()
+
+                addr = None
+                while addr is None:
+                    time.sleep(0.2)
+                    addr = server.accept()
+                t.join()
+
+                self.assertEqual(client.codec().name, 'proto')
+                self.assertTrue(server.send_instr(addr, DUMMY_INSTR))
+                time.sleep(0.1)
+                self.assertEqual(client.listen(), DUMMY_INSTR)
+
+            # Servers can refuse clients which only speak pickle
+            with ModelBridgeClient(codecs=('pickle',)) as client:
+                def connect():
+                    with self.assertRaises(RuntimeError):
+                        dummy_connect_client(client)
+                t = Thread(target=connect)
+                t.start()
+
+                while t.is_alive():
+                    self.assertIsNone(server.accept())
+                    time.sleep(0.2)
+                t.join()
+                self.assertFalse(client.is_connected())
+
+    def test_unix_socket(self):
+        path = os.path.join(tempfile.mkdtemp(), 'bridge.sock')
+        hostname = f'unix://{path}'
+
+        with ModelBridgeServer(hostname=hostname) as server:
+            self.assertTrue(os.path.exists(path))
+            with ModelBridgeClient(hostname=hostname) as client:
+                t = Thread(target=dummy_connect_client, args=(client,))
+                t.start()
+
+                accepted = []
+                while len(accepted) == 0:
+                    accepted, _ = server.poll(timeout=1)
+                t.join()
+                addr = accepted[0]
+
+                self.assertTrue(client.send_state(DUMMY_STATE))
+                server.poll(timeout=1)
+                self.assertEqual(server.listen(addr), DUMMY_STATE)
+
+                self.assertTrue(server.send_instr(addr, DUMMY_INSTR))
+                time.sleep(0.1)
+                self.assertEqual(client.listen(), DUMMY_INSTR)
+
+        # Socket file is cleaned up and does not block new servers
+        self.assertFalse(os.path.exists(path))
+        with ModelBridgeServer(hostname=hostname):
+            pass
+
+        # A stale socket file is replaced, but one a server is listening on is not
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        with ModelBridgeServer(hostname=hostname) as server:
+            with self.assertRaises(OSError):
+                ModelBridgeServer(hostname=hostname)
+
+            # A server closing does not remove the socket file of the one which replaced it
+            os.unlink(path)
+            with ModelBridgeServer(hostname=hostname):
+                server.close()
+                self.assertTrue(os.path.exists(path))
+            self.assertFalse(os.path.exists(path))
+        os.rmdir(os.path.dirname(path))
+
+    def test_poll(self):
+        with ModelBridgeServer() as server:
+            with ModelBridgeClient() as client:
+                # Nothing to report on an idle server
+                self.assertEqual(server.poll(timeout=0), ([], []))
+
+                t = Thread(target=dummy_connect_client, args=(client,))
+                t.start()
+
+                accepted = []
+                while len(accepted) == 0:
+                    accepted, readable = server.poll(timeout=1)
+                    self.assertEqual(readable, [])
+                t.join()
+                addr = accepted[0]
+
+                # A state should wake the server and mark the client as readable
+                self.assertTrue(client.send_state(DUMMY_STATE))
+                accepted, readable = server.poll(timeout=1)
+                self.assertEqual(accepted, [])
+                self.assertEqual(readable, [addr])
+                self.assertEqual(server.listen(addr), DUMMY_STATE)
+
+                # Wakeups from another thread should interrupt a blocking poll
+                t = Thread(target=server.wakeup)
+                t.start()
+                start = time.time()
+                self.assertEqual(server.poll(timeout=5), ([], []))
+                self.assertLess(time.time() - start, 1)
+                t.join()
+
+    def test_send_many(self):
+        with ModelBridgeServer(codecs=('binary', 'pickle')) as server:
+            clients = [ModelBridgeClient(codecs=(codec,)) for codec in ('binary', 'pickle')]
+            addrs = []
+            for client in clients:
+                t = Thread(target=dummy_connect_client, args=(client,))
+                t.start()
+
+                addr = None
+                while addr is None:
+                    time.sleep(0.2)
+                    addr = server.accept()
+                t.join()
+                addrs.append(addr)
+
+            # Constant frames are cached per codec, so each client can still decode them
+            constant = {
+                'speed': 0.0,
+                'course': 0.0,
+                'posts': {},
+                'ctrl_msg': 'PAUSE'
+            }
+            server.register_constant(constant)
+            self.assertEqual(server.send_many([(addrs[0], constant), (addrs[1], DUMMY_INSTR)]), [])
+            self.assertEqual(server.send_many([(addrs[0], DUMMY_INSTR), (addrs[1], constant)]), [])
+            time.sleep(0.1)
+            self.assertEqual(clients[0].listen(), constant)
+            self.assertEqual(clients[0].listen(), DUMMY_INSTR)
+            self.assertEqual(clients[1].listen(), DUMMY_INSTR)
+            self.assertEqual(clients[1].listen(), constant)
+
+            # Instructions too large for the socket's buffer are finished by `poll()`
+            large = dict(DUMMY_INSTR, posts={'DATA': 'x' * 2**22})
+            self.assertEqual(server.send_many([(addrs[0], large)]), [])
+
+            received = []
+            t = Thread(target=lambda: received.append(clients[0].listen()))
+            t.start()
+            while t.is_alive():
+                server.poll(timeout=0.1)
+            t.join()
+            self.assertEqual(received, [large])
+
+            # Closed clients are reported instead of raising
+            clients[1].close()
+            while addrs[1] not in server.poll(timeout=1)[1]:
+                pass
+            self.assertEqual(server.listen_all(addrs[1]), [])
+            self.assertEqual(server.send_many([(addrs[0], constant), (addrs[1], constant)]), [addrs[1]])
+            self.assertFalse(server.send_instr(addrs[1], DUMMY_INSTR))
+
+            # Until they are removed
+            self.assertEqual(server.pop_closed(), [addrs[1]])
+            self.assertEqual(server.pop_closed(), [])
+            server.remove_client(addrs[1])
+            self.assertEqual(server.send_many([(addrs[1], constant)]), [addrs[1]])
+            with self.assertRaises(RuntimeError):
+                server.listen_all(addrs[1])
+
+            clients[0].close()
+
+    @patch('mivp_agent.bridge.HANDSHAKE_TIMEOUT', 0.5)
+    def test_silent_handshake(self):
+        with ModelBridgeServer() as server:
+            # A connection which never sends its handshake
+            silent = socket.create_connection(('localhost', 57721))
+
+            start = time.time()
+            self.assertEqual(server.poll(timeout=0.1), ([], []))
+            self.assertLess(time.time() - start, 0.3)
+
+            # Other clients are served while it is pending
+            with ModelBridgeClient() as client:
+                t = Thread(target=dummy_connect_client, args=(client,))
+                t.start()
+
+                accepted = []
+                while len(accepted) == 0:
+                    accepted, _ = server.poll(timeout=1)
+                t.join()
+                self.assertTrue(client.is_connected())
+
+            # And it is dropped once the handshake times out
+            while len(server._handshakes) != 0:
+                self.assertEqual(server.poll(timeout=1)[0], [])
+            silent.settimeout(1)
+            self.assertEqual(silent.recv(1), b'')
+            silent.close()
+
+    def test_pickle_opt_in(self):
+        path = os.path.join(tempfile.mkdtemp(), 'unpickled')
+
+        class Payload:
+            def __reduce__(self):
+                return (open, (path, 'w'))
+
+        # Frames sent without a handshake are not unpickled by default
+        with ModelBridgeServer() as server:
+            sock = socket.create_connection(('localhost', 57721))
+            sock.sendall(pack_frame(pickle.dumps(Payload())))
+
+            # The server hangs up without reading the frame as a state
+            sock.settimeout(0.1)
+            closed = False
+            while not closed:
+                self.assertEqual(server.poll(timeout=0.1), ([], []))
+                try:
+                    closed = sock.recv(1) == b''
+                except socket.timeout:
+                    pass
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(server._clients, {})
+            sock.close()
+        os.rmdir(os.path.dirname(path))
+
+        # Servers which allow pickle still accept clients which predate the handshake
+        with ModelBridgeServer(codecs=('binary', 'pickle')) as server:
+            sock = socket.create_connection(('localhost', 57721))
+            sock.sendall(pack_frame(pickle.dumps(DUMMY_STATE)))
+
+            accepted = []
+            while len(accepted) == 0:
+                accepted, readable = server.poll(timeout=1)
+            self.assertEqual(readable, accepted)
+            self.assertEqual(server.listen(accepted[0]), DUMMY_STATE)
+            sock.close()
+
 
 if __name__ == '__main__':
     unittest.main()
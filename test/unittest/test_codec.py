@@ -0,0 +1,88 @@
+import unittest
+
+from mivp_agent.codec import get_codec, CODECS, BinaryCodec, PickleCodec, ProtoCodec
+from mivp_agent.const import KEY_ID, KEY_EPISODE_MGR_REPORT, KEY_EPISODE_MGR_STATE
+from mivp_agent.util.parse import parse_report
+
+STATE = {
+    KEY_ID: 'felix',
+    'MOOS_TIME': 16923.012,
+    'NAV_X': 98.0,
+    'NAV_Y': 40.0,
+    'NAV_HEADING': 180.0,
+    'NODE_REPORTS': {
+        'evan': {
+            'NAV_X': 12.0,
+            'NAV_Y': -4.5,
+            'NAV_HEADING': 90.0,
+            'MOOS_TIME': 16922.9
+        }
+    },
+    'TAGGED': True,
+    'FLAG_ZONE': 'red',
+    'DIST': 10.5,
+    KEY_EPISODE_MGR_REPORT: 'NUM=3,DURATION=60.57,SUCCESS=true,WILL_PAUSE=false',
+    KEY_EPISODE_MGR_STATE: 'RUNNING'
+}
+
+STATE_PARSED = STATE.copy()
+STATE_PARSED[KEY_EPISODE_MGR_REPORT] = parse_report(STATE[KEY_EPISODE_MGR_REPORT])
+
+INSTR = {
+    'speed': 2.0,
+    'course': 120.0,
+    'posts': {
+        'ACTION': 'ATTACK',
+        'COUNT': 2.0,
+        'ENABLED': False
+    },
+    'ctrl_msg': 'SEND_STATE'
+}
+
+
+class TestCodec(unittest.TestCase):
+    def test_lookup(self):
+        for name in CODECS:
+            self.assertEqual(get_codec(name).name, name)
+        self.assertRaises(ValueError, get_codec, 'json')
+
+    def test_pickle(self):
+        codec = PickleCodec()
+        self.assertEqual(codec.decode_state(codec.encode_state(STATE)), STATE)
+        self.assertEqual(codec.decode_instr(codec.encode_instr(INSTR)), INSTR)
+
+    def test_binary(self):
+        codec = BinaryCodec()
+        self.assertEqual(codec.decode_state(codec.encode_state(STATE)), STATE_PARSED)
+        self.assertEqual(codec.decode_state(codec.encode_state(STATE_PARSED)), STATE_PARSED)
+        self.assertEqual(codec.decode_instr(codec.encode_instr(INSTR)), INSTR)
+
+        # Optional keys and values should survive
+        state = STATE.copy()
+        state.pop('NODE_REPORTS')
+        state[KEY_EPISODE_MGR_REPORT] = None
+        state[KEY_EPISODE_MGR_STATE] = None
+        state['STEPS'] = 12
+        self.assertEqual(codec.decode_state(codec.encode_state(state)), state)
+
+        # Decoding works on views of a receive buffer
+        data = bytearray(codec.encode_state(STATE))
+        self.assertEqual(codec.decode_state(memoryview(data)), STATE_PARSED)
+
+        state['BAD'] = [1, 2]
+        self.assertRaises(TypeError, codec.encode_state, state)
+
+    def test_proto(self):
+        codec = ProtoCodec()
+
+        state = codec.decode_state(codec.encode_state(STATE))
+        # Proto node reports carry their vname
+        for vname, report in state['NODE_REPORTS'].items():
+            self.assertEqual(report.pop('vname'), vname)
+        self.assertEqual(state, STATE_PARSED)
+
+        self.assertEqual(codec.decode_instr(codec.encode_instr(INSTR)), INSTR)
+
+
+if __name__ == '__main__':
+    unittest.main()
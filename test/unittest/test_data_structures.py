@@ -1,7 +1,7 @@
 import unittest
 import numpy as np
 
-from mivp_agent.util.data_structures import LimitedHistory
+from mivp_agent.util.data_structures import LimitedHistory, ColumnarBatch, SumTree
 
 
 class TestLimitedHistory(unittest.TestCase):
@@ -153,5 +153,77 @@ class TestLimitedHistory(unittest.TestCase):
         self.assertTrue(np.array_equal(h.select_history([0,1,2], scale=1.0), compare))
 
 
+class TestColumnarBatch(unittest.TestCase):
+
+    def test_empty(self):
+        b = ColumnarBatch()
+        self.assertEqual(len(b), 0)
+        self.assertIsNone(b.s1)
+
+    def test_append(self):
+        b = ColumnarBatch(capacity=2)
+        b.append((1.0, 2.0), (0.5, 90.0), (3.0, 4.0), 'felix', 0, False, 1)
+        b.append(np.array([3.0, 4.0]), (0.5, 180.0), (5.0, 6.0), 'felix', 0, True)
+
+        self.assertEqual(len(b), 2)
+        self.assertTrue(np.array_equal(b.s1, np.array([[1, 2], [3, 4]])))
+        self.assertTrue(np.array_equal(b.a, np.array([[0.5, 90], [0.5, 180]])))
+        self.assertTrue(np.array_equal(b.s2, np.array([[3, 4], [5, 6]])))
+        self.assertEqual(list(b.vid), ['felix', 'felix'])
+        self.assertEqual(list(b.episode), [0, 0])
+        self.assertEqual(list(b.done), [False, True])
+        self.assertEqual(list(b.version), [1, -1])
+
+        # Columns are views of the preallocated arrays
+        self.assertEqual(b.capacity, 2)
+        self.assertIs(b.s1.base, b._columns['s1'])
+
+    def test_grow(self):
+        b = ColumnarBatch(capacity=1)
+        for i in range(5):
+            b.append((i,), (i, i), (i + 1,), 'evan', i, True)
+
+        self.assertEqual(b.capacity, 8)
+        self.assertEqual(b.s1.shape, (5, 1))
+        self.assertEqual(list(b.s2[:, 0]), [1, 2, 3, 4, 5])
+        self.assertEqual(list(b.episode), [0, 1, 2, 3, 4])
+
+    def test_shape_check(self):
+        b = ColumnarBatch()
+        b.append((1.0, 2.0), (0.5, 90.0), (3.0, 4.0), 'felix', 0, False)
+
+        self.assertRaises(AssertionError, b.append, (1.0,), (0.5, 90.0), (3.0, 4.0), 'felix', 0, False)
+        self.assertRaises(AssertionError, b.append, (1.0, 2.0), (0.5,), (3.0, 4.0), 'felix', 0, False)
+        self.assertRaises(AssertionError, b.column, 'reward')
+
+
+class TestSumTree(unittest.TestCase):
+
+    def test_update(self):
+        t = SumTree(5)
+        self.assertEqual(t.total(), 0)
+
+        t.update([0, 1, 2, 3, 4], [1, 2, 3, 4, 0])
+        self.assertEqual(t.total(), 10)
+        self.assertTrue(np.array_equal(t[[1, 3]], [2, 4]))
+
+        t.update([3], [1])
+        self.assertEqual(t.total(), 7)
+        self.assertRaises(AssertionError, t.update, [5], [1])
+
+    def test_find(self):
+        t = SumTree(5)
+        t.update([0, 1, 2, 3, 4], [1, 2, 3, 4, 0])
+
+        found = t.find([0, 0.99, 1, 2.99, 3, 5.99, 6, 9.99])
+        self.assertTrue(np.array_equal(found, [0, 0, 1, 1, 2, 2, 3, 3]))
+        # Past the total never lands on an empty leaf
+        self.assertTrue(np.array_equal(t.find([10, 11]), [3, 3]))
+
+        t = SumTree(1)
+        t.update([0], [2])
+        self.assertTrue(np.array_equal(t.find([1.5]), [0]))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,8 +1,15 @@
 import os
+import time
 import unittest
 
+from threading import Event
+
 from mivp_agent.log.metadata import LogMetadata
+from mivp_agent.log.transitions import AsyncTransitionLogger
 from mivp_agent.util.file_system import safe_clean
+from mivp_agent.proto.proto_logger import ProtoLogger
+from mivp_agent.proto.mivp_agent_pb2 import Transition
+from mivp_agent.const import KEY_ID, KEY_EPISODE_MGR_REPORT
 
 current_dir = os.path.dirname(os.path.realpath(__file__))
 generated_dir = os.path.join(current_dir, '.generated')
@@ -23,5 +30,105 @@ class TestMetadata(unittest.TestCase):
         safe_clean(generated_dir, patterns=['*.session'])
 
 
+def dummy_state(i):
+    return {
+        KEY_ID: 'felix',
+        'MOOS_TIME': float(i),
+        'NAV_X': 0.0,
+        'NAV_Y': 0.0,
+        'NAV_HEADING': 0.0,
+        KEY_EPISODE_MGR_REPORT: None
+    }
+
+
+DUMMY_ACTION = {
+    'speed': 1.0,
+    'course': 0.0,
+    'posts': {},
+    'ctrl_msg': 'SEND_STATE'
+}
+
+
+def read_transitions(path, name='log_felix'):
+    log = ProtoLogger(os.path.join(path, name), Transition, mode='r')
+    transitions = []
+    while log.has_more():
+        transitions.append(log.read(1)[0])
+    return transitions
+
+
+class TestTransitionLogger(unittest.TestCase):
+
+    def test_flush_on_close(self):
+        path = os.path.join(generated_dir, 'transitions_block')
+        logger = AsyncTransitionLogger(path, max_queue=2)
+        for i in range(10):
+            logger.log(dummy_state(i), DUMMY_ACTION, True)
+        logger.close()
+
+        self.assertEqual(logger.dropped, 0)
+        self.assertEqual(len(read_transitions(path)), 9)
+
+        safe_clean(path, patterns=['*.gz'])
+        os.rmdir(path)
+
+    def test_drop(self):
+        path = os.path.join(generated_dir, 'transitions_drop')
+        logger = AsyncTransitionLogger(path, max_queue=2, policy='drop')
+
+        # Hold up the writer thread so the queue fills
+        release = Event()
+        write = logger._logger.log
+        logger._logger.log = lambda *args: (release.wait(), write(*args))
+
+        for i in range(10):
+            logger.log(dummy_state(i), DUMMY_ACTION, True)
+        release.set()
+
+        # Once there is room again the vehicle's states are logged from where they resume
+        while logger.pending() != 0:
+            time.sleep(0.01)
+        logger.log(dummy_state(10), DUMMY_ACTION, True)
+        logger.log(dummy_state(11), DUMMY_ACTION, True)
+        logger.close()
+
+        # At most one call was taken by the writer and two were queued
+        self.assertGreaterEqual(logger.dropped, 7)
+
+        # No transition spans a dropped state
+        transitions = read_transitions(path)
+        self.assertIn((10.0, 11.0), [(t.s1.vinfo.MOOS_TIME, t.s2.vinfo.MOOS_TIME) for t in transitions])
+        for t in transitions:
+            self.assertEqual(t.s2.vinfo.MOOS_TIME - t.s1.vinfo.MOOS_TIME, 1.0)
+
+        safe_clean(path, patterns=['*.gz'])
+        os.rmdir(path)
+
+    def test_forget(self):
+        path = os.path.join(generated_dir, 'transitions_forget')
+        logger = AsyncTransitionLogger(path)
+        for i in range(10):
+            if i == 5:
+                # Reconnected, no transition spans the gap
+                logger.forget('felix')
+            logger.log(dummy_state(i), DUMMY_ACTION, True)
+        logger.close()
+
+        transitions = read_transitions(path)
+        self.assertEqual(len(transitions), 8)
+        self.assertNotIn((4.0, 5.0), [(t.s1.vinfo.MOOS_TIME, t.s2.vinfo.MOOS_TIME) for t in transitions])
+
+        # A second logger of the same vehicle does not clobber the first
+        logger = AsyncTransitionLogger(path)
+        for i in range(3):
+            logger.log(dummy_state(i), DUMMY_ACTION, True)
+        logger.close()
+        self.assertEqual(len(read_transitions(path)), 8)
+        self.assertEqual(len(read_transitions(path, 'log_felix_1')), 2)
+
+        safe_clean(path, patterns=['*.gz'])
+        os.rmdir(path)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,7 +1,10 @@
 import unittest
 import os
 import time
+import json
 import timeout_decorator
+from queue import Queue
+from threading import Thread
 
 from mivp_agent.manager import MissionManager
 from mivp_agent.messages import MissionMessage, INSTR_SEND_STATE
@@ -83,6 +86,194 @@ class TestManagerCore(unittest.TestCase):
                 time.sleep(0.1) # Allow propogate time
                 self.assertEqual(client.listen(), DUMMY_INSTR)
 
+    @timeout_decorator.timeout(5)
+    def test_batch(self):
+        vnames = ['felix', 'evan', 'alder']
+        clients = [ModelBridgeClient() for _ in vnames]
+        with MissionManager('test', log=False) as mgr:
+            self.assertEqual(mgr.get_messages(timeout=0), [])
+            start = time.time()
+            self.assertEqual(mgr.get_messages(timeout=0.2), [])
+            self.assertGreaterEqual(time.time() - start, 0.2)
+
+            for vname, client in zip(vnames, clients):
+                while not client.connect():
+                    time.sleep(0.1)
+                self.assertEqual(client.listen(timeout=1), INSTR_SEND_STATE)
+
+                state = DUMMY_STATE.copy()
+                state[KEY_ID] = vname
+                self.assertTrue(client.send_state(state))
+
+            msgs = []
+            while len(msgs) < len(vnames):
+                msgs.extend(mgr.get_messages(max_n=2))
+                self.assertLessEqual(len(msgs), len(vnames))
+            self.assertEqual(sorted(m.vid for m in msgs), sorted(vnames))
+
+            actions = []
+            for i in range(len(msgs)):
+                action = DUMMY_ACTION.copy()
+                action['speed'] = float(i)
+                actions.append(action)
+            mgr.act_many(msgs, actions)
+
+            for m, action in zip(msgs, actions):
+                client = clients[vnames.index(m.vid)]
+                instr = client.listen(timeout=1)
+                self.assertEqual(instr['speed'], action['speed'])
+                self.assertEqual(instr['posts'], action['posts'])
+
+            with self.assertRaises(AssertionError):
+                mgr.act_many(msgs[:1], actions[:1])
+
+            # An answered message fails the whole call before any other response is set
+            for vname, client in zip(vnames[:2], clients[:2]):
+                state = DUMMY_STATE.copy()
+                state[KEY_ID] = vname
+                self.assertTrue(client.send_state(state))
+            msgs = []
+            while len(msgs) < 2:
+                msgs.extend(mgr.get_messages())
+            msgs[1].act(DUMMY_ACTION)
+            with self.assertRaises(AssertionError):
+                mgr.act_many(msgs, [DUMMY_ACTION] * 2)
+            msgs[0].act(DUMMY_ACTION)
+            for client in clients[:2]:
+                self.assertEqual(client.listen(timeout=1)['speed'], DUMMY_ACTION['speed'])
+
+        for client in clients:
+            client.close()
+
+    @timeout_decorator.timeout(5)
+    def test_step(self):
+        vnames = ['felix', 'evan']
+        clients = [ModelBridgeClient() for _ in vnames]
+
+        def send(i):
+            state = DUMMY_STATE.copy()
+            state[KEY_ID] = vnames[i]
+            self.assertTrue(clients[i].send_state(state))
+
+        with MissionManager('test', log=False) as mgr:
+            for client in clients:
+                while not client.connect():
+                    time.sleep(0.1)
+                self.assertEqual(client.listen(timeout=1), INSTR_SEND_STATE)
+
+            send(0)
+            send(1)
+            mgr.wait_for(vnames)
+            batch = mgr.step()
+            self.assertEqual(batch.vnames, vnames)
+            self.assertEqual([m.vid for m in batch.messages], vnames)
+            self.assertEqual(batch.missing, [])
+            self.assertFalse(batch.timed_out)
+            mgr.act_many(batch.received(), [DUMMY_ACTION] * 2)
+            for client in clients:
+                self.assertEqual(client.listen(timeout=1), DUMMY_INSTR)
+
+            # Stragglers are reported once the deadline passes
+            send(0)
+            batch = mgr.step(timeout=0.2)
+            self.assertTrue(batch.timed_out)
+            self.assertEqual(batch.missing, ['evan'])
+            self.assertEqual(batch.messages[1], None)
+            self.assertEqual([m.vid for m in batch.received()], ['felix'])
+            batch.messages[0].act(DUMMY_ACTION)
+            self.assertEqual(clients[0].listen(timeout=1), DUMMY_INSTR)
+
+            # States from vehicles which are not being waited on are held for the next step
+            send(0)
+            send(1)
+            batch = mgr.step(vnames=['felix'])
+            self.assertEqual([m.vid for m in batch.messages], ['felix'])
+            batch = mgr.step(vnames=['evan'], timeout=1)
+            self.assertFalse(batch.timed_out)
+            self.assertEqual([m.vid for m in batch.messages], ['evan'])
+
+        for client in clients:
+            client.close()
+
+    @timeout_decorator.timeout(5)
+    def test_step_disconnect(self):
+        vnames = ['felix', 'evan']
+        clients = [ModelBridgeClient() for _ in vnames]
+
+        def send(i):
+            state = DUMMY_STATE.copy()
+            state[KEY_ID] = vnames[i]
+            self.assertTrue(clients[i].send_state(state))
+
+        with MissionManager('test', log=False) as mgr:
+            for client in clients:
+                while not client.connect():
+                    time.sleep(0.1)
+                self.assertEqual(client.listen(timeout=1), INSTR_SEND_STATE)
+
+            send(0)
+            send(1)
+            mgr.wait_for(vnames)
+            mgr.act_many(mgr.step().received(), [DUMMY_ACTION] * 2)
+            for client in clients:
+                self.assertEqual(client.listen(timeout=1), DUMMY_INSTR)
+
+            # The step waiting on evan finishes when evan is lost instead of waiting forever
+            send(0)
+            batches = Queue()
+            waiter = Thread(target=lambda: batches.put(mgr.step()), daemon=True)
+            waiter.start()
+            time.sleep(0.2)
+            self.assertTrue(batches.empty())
+
+            clients[1].close()
+            batch = batches.get(timeout=3)
+            self.assertEqual(batch.vnames, ['felix'])
+            self.assertEqual(batch.missing, [])
+            self.assertFalse(batch.timed_out)
+            batch.messages[0].act(DUMMY_ACTION)
+
+        clients[0].close()
+
+    @timeout_decorator.timeout(5)
+    def test_stats(self):
+        metrics_file = os.path.abspath('metrics.jsonl')
+        if os.path.exists(metrics_file):
+            os.remove(metrics_file)
+        with ModelBridgeClient() as client:
+            with MissionManager('test', log=False, metrics_file=metrics_file, metrics_interval=60) as mgr:
+                stats = mgr.stats()
+                self.assertEqual(stats['msgs_per_sec'], 0)
+                self.assertEqual(stats['vehicles'], {})
+                self.assertEqual(stats['queue']['size'], 0)
+
+                while not client.connect():
+                    time.sleep(0.1)
+                self.assertEqual(client.listen(timeout=1), INSTR_SEND_STATE)
+
+                for _ in range(3):
+                    self.assertTrue(client.send_state(DUMMY_STATE))
+                    msg = mgr.get_message()
+                    msg.act(DUMMY_ACTION)
+                    self.assertEqual(client.listen(timeout=1), DUMMY_INSTR)
+
+        # Stats are recorded after sending, the manager has finished once closed
+        stats = mgr.stats()
+        self.assertGreater(stats['msgs_per_sec'], 0)
+        felix = stats['vehicles']['felix']
+        self.assertEqual(felix['messages'], 3)
+        for stage in ('handle', 'queue_wait', 'think', 'send', 'total'):
+            self.assertGreaterEqual(felix[stage]['p50'], 0)
+        self.assertLessEqual(felix['think']['max'], felix['total']['max'])
+
+        # A final dump is written on close
+        with open(metrics_file) as f:
+            dumps = [json.loads(line) for line in f]
+        os.remove(metrics_file)
+        self.assertEqual(len(dumps), 1)
+        self.assertEqual(dumps[0]['vehicles']['felix']['messages'], 3)
+        self.assertEqual(dumps[0]['queue']['high_water'], 1)
+
     @timeout_decorator.timeout(5)
     def test_wait_for(self):
         with MissionManager('test', log=False) as mgr:
@@ -124,6 +315,161 @@ class TestManagerCore(unittest.TestCase):
                 time.sleep(0.1)
                 self.assertTrue(mgr.are_present(['evan', 'felix']))
 
+    @timeout_decorator.timeout(5)
+    def test_wait_timeouts(self):
+        with MissionManager('test', log=False) as mgr:
+            self.assertFalse(mgr.wait_for(['evan'], timeout=0.1))
+            self.assertFalse(mgr.wait_for_count(1, timeout=0.1))
+
+            # The second positional argument is still the deprecated `sleep`, `timeout` is keyword only
+            with self.assertWarns(DeprecationWarning):
+                self.assertFalse(mgr.wait_for(['evan'], 0.5, timeout=0.1))
+            with self.assertWarns(DeprecationWarning):
+                self.assertFalse(mgr.wait_for_count(1, 0.5, timeout=0.1))
+            with self.assertWarns(DeprecationWarning):
+                self.assertFalse(mgr.wait_for_count(1, sleep=0.5, timeout=0.1))
+
+            with ModelBridgeClient() as client:
+                while not client.connect():
+                    time.sleep(0.1)
+
+                state = DUMMY_STATE.copy()
+                state[KEY_ID] = 'evan'
+                state[KEY_EPISODE_MGR_STATE] = 'RUNNING'
+                self.assertTrue(client.send_state(state))
+
+                self.assertTrue(mgr.wait_for(['evan'], timeout=1))
+                self.assertTrue(mgr.wait_for_count(1, timeout=1))
+                with self.assertWarns(DeprecationWarning):
+                    self.assertTrue(mgr.wait_for(['evan'], 0.5))
+                self.assertFalse(mgr.wait_for_count(2, timeout=0.1))
+
+                self.assertTrue(mgr.wait_for_episode_state(['evan'], 'RUNNING', timeout=1))
+                self.assertFalse(mgr.wait_for_episode_state(['evan'], 'PAUSED', timeout=0.1))
+                self.assertFalse(mgr.in_episode_state(['evan', 'felix'], 'RUNNING'))
+
+                mgr.get_message().act(DUMMY_ACTION)
+                state[KEY_EPISODE_MGR_STATE] = 'PAUSED'
+                self.assertTrue(client.send_state(state))
+                self.assertTrue(mgr.wait_for_episode_state(['evan'], 'PAUSED', timeout=1))
+
+    @timeout_decorator.timeout(5)
+    def test_bounded_queue(self):
+        vnames = ['felix', 'evan']
+        clients = [ModelBridgeClient() for _ in vnames]
+
+        with MissionManager('test', log=False, max_queue=1, queue_policy='drop_oldest') as mgr:
+            for i, client in enumerate(clients):
+                while not client.connect():
+                    time.sleep(0.1)
+                self.assertEqual(client.listen(timeout=1), INSTR_SEND_STATE)
+
+                state = DUMMY_STATE.copy()
+                state[KEY_ID] = vnames[i]
+                self.assertTrue(client.send_state(state))
+                mgr.wait_for(vnames[:i + 1])
+
+            # Felix's state made room for evan's and felix is asked for a fresh one
+            self.assertEqual(clients[0].listen(timeout=1), INSTR_SEND_STATE)
+            msg = mgr.get_message(timeout=1)
+            self.assertEqual(msg.vid, 'evan')
+            msg.act(DUMMY_ACTION)
+            self.assertEqual(clients[1].listen(timeout=1), DUMMY_INSTR)
+
+            queue = mgr.stats()['queue']
+            self.assertEqual(queue['dropped'], 1)
+            self.assertEqual(queue['max_size'], 1)
+            self.assertEqual(queue['size'], 0)
+
+        for client in clients:
+            client.close()
+
+    @timeout_decorator.timeout(5)
+    def test_response_deadline(self):
+        other_action = dict(DUMMY_ACTION, speed=1.0)
+        with ModelBridgeClient() as client:
+            with MissionManager('test', log=False, response_deadline=0.2) as mgr:
+                while not client.connect():
+                    time.sleep(0.1)
+                self.assertEqual(client.listen(timeout=1), INSTR_SEND_STATE)
+
+                # Nothing to repeat yet
+                self.assertTrue(client.send_state(DUMMY_STATE))
+                self.assertEqual(client.listen(timeout=1), INSTR_SEND_STATE)
+
+                self.assertTrue(client.send_state(DUMMY_STATE))
+                mgr.get_message().act(DUMMY_ACTION)
+                self.assertEqual(client.listen(timeout=1), DUMMY_INSTR)
+
+                # An unanswered message is taken out of the queue and the last action repeated
+                self.assertTrue(client.send_state(DUMMY_STATE))
+                self.assertEqual(client.listen(timeout=1), DUMMY_INSTR)
+                self.assertIsNone(mgr.get_message(block=False))
+
+                # A late response is ignored
+                self.assertTrue(client.send_state(DUMMY_STATE))
+                msg = mgr.get_message()
+                self.assertEqual(client.listen(timeout=1), DUMMY_INSTR)
+                self.assertTrue(msg.timed_out)
+                msg.act(other_action)
+                self.assertFalse(client.listen(timeout=0.3))
+
+                self.assertTrue(client.send_state(DUMMY_STATE))
+                msg = mgr.get_message()
+                msg.act(other_action)
+                self.assertFalse(msg.timed_out)
+                self.assertEqual(client.listen(timeout=1)['speed'], 1.0)
+
+        self.assertEqual(mgr.stats()['fallbacks'], {'total': 3, 'vehicles': {'felix': 3}})
+
+    @timeout_decorator.timeout(10)
+    def test_reconnect(self):
+        disconnected = Queue()
+        reconnected = Queue()
+
+        def connect():
+            client = ModelBridgeClient()
+            while not client.connect():
+                time.sleep(0.1)
+            self.assertEqual(client.listen(timeout=1), INSTR_SEND_STATE)
+            self.assertTrue(client.send_state(DUMMY_STATE))
+            return client
+
+        with MissionManager('test', log=False) as mgr:
+            mgr.on_disconnect(disconnected.put)
+            mgr.on_reconnect(reconnected.put)
+
+            client = connect()
+            self.assertTrue(mgr.wait_for([DUMMY_STATE[KEY_ID]], timeout=1))
+            self.assertTrue(mgr.is_connected(DUMMY_STATE[KEY_ID]))
+            msg = mgr.get_message()
+
+            # The simulation crashes before the response is sent
+            client.close()
+            self.assertEqual(disconnected.get(timeout=1), DUMMY_STATE[KEY_ID])
+            self.assertFalse(mgr.is_connected(DUMMY_STATE[KEY_ID]))
+            self.assertEqual(mgr.get_connected_ids(), [])
+            self.assertEqual(mgr.get_ids(), [DUMMY_STATE[KEY_ID]])
+            msg.act(DUMMY_ACTION)
+
+            # And is restarted
+            client = connect()
+            self.assertEqual(reconnected.get(timeout=1), DUMMY_STATE[KEY_ID])
+            self.assertTrue(mgr.is_connected(DUMMY_STATE[KEY_ID]))
+            mgr.get_message().act(DUMMY_ACTION)
+            self.assertEqual(client.listen(timeout=1), DUMMY_INSTR)
+
+            # A restart which happens before the old connection is noticed as closed evicts the old connection
+            replacement = connect()
+            self.assertEqual(reconnected.get(timeout=1), DUMMY_STATE[KEY_ID])
+            mgr.get_message().act(DUMMY_ACTION)
+            self.assertEqual(replacement.listen(timeout=1), DUMMY_INSTR)
+            self.assertTrue(disconnected.empty())
+
+            client.close()
+            replacement.close()
+            self.assertEqual(disconnected.get(timeout=1), DUMMY_STATE[KEY_ID])
+
 
 class TestManagerLogger(unittest.TestCase):
     @classmethod
@@ -0,0 +1,177 @@
+import unittest
+from queue import Empty, Full
+from threading import Thread
+
+from mivp_agent.util.message_queue import MessageQueue
+from mivp_agent.util.scheduler import Scheduler, RoundRobinScheduler, WeightedScheduler, PriorityScheduler
+
+
+class Msg:
+    def __init__(self, vid, n):
+        self.vid = vid
+        self.n = n
+
+    def __repr__(self):
+        return f'{self.vid}{self.n}'
+
+
+class TestMessageQueue(unittest.TestCase):
+    def test_unbounded(self):
+        q = MessageQueue()
+        for i in range(5):
+            self.assertEqual(q.put(Msg('a', i)), [])
+        self.assertEqual(q.qsize(), 5)
+        self.assertEqual(q.get().n, 0)
+        self.assertEqual([m.n for m in q.get_many(max_n=2)], [1, 2])
+        self.assertEqual([m.n for m in q.get_many()], [3, 4])
+        with self.assertRaises(Empty):
+            q.get(block=False)
+        self.assertEqual(q.get_many(timeout=0.01), [])
+
+        occupancy = q.occupancy()
+        self.assertEqual(occupancy['size'], 0)
+        self.assertEqual(occupancy['high_water'], 5)
+        self.assertEqual(occupancy['vehicles'], {})
+
+    def test_discard(self):
+        q = MessageQueue()
+        msgs = [Msg('a', i) for i in range(3)]
+        for m in msgs:
+            q.put(m)
+        self.assertTrue(q.discard(msgs[1]))
+        self.assertFalse(q.discard(msgs[1]))
+        self.assertFalse(q.discard(Msg('b', 0)))
+        self.assertEqual(q.get_many(), [msgs[0], msgs[2]])
+        self.assertFalse(q.discard(msgs[0]))
+
+    def test_wake(self):
+        q = MessageQueue()
+        woken = []
+        waiter = Thread(target=lambda: woken.append(q.get_many(wakeable=True)))
+        waiter.start()
+        q.wake()
+        waiter.join(timeout=1)
+        self.assertEqual(woken, [[]])
+
+        # Only wakeable calls see it, and only once
+        q.wake()
+        self.assertEqual(q.get_many(timeout=0.01), [])
+        self.assertEqual(q.get_many(wakeable=True), [])
+        self.assertEqual(q.get_many(timeout=0.01, wakeable=True), [])
+
+    def test_block(self):
+        q = MessageQueue(max_size=2, max_per_vehicle=1)
+        q.put(Msg('a', 0))
+        with self.assertRaises(Full):
+            q.put(Msg('a', 1), timeout=0.01)
+        q.put(Msg('b', 0))
+        with self.assertRaises(Full):
+            q.put(Msg('c', 0), timeout=0.01)
+
+        # A blocked producer continues once the consumer makes room
+        t = Thread(target=q.put, args=(Msg('c', 0),))
+        t.start()
+        self.assertEqual(q.get().vid, 'a')
+        t.join(timeout=1)
+        self.assertFalse(t.is_alive())
+        self.assertEqual(q.occupancy()['vehicles'], {'b': 1, 'c': 1})
+
+        # Closing releases blocked producers
+        t = Thread(target=q.put, args=(Msg('d', 0),))
+        t.start()
+        q.close()
+        t.join(timeout=1)
+        self.assertFalse(t.is_alive())
+
+    def test_drop_oldest(self):
+        q = MessageQueue(max_size=3, max_per_vehicle=2, policy='drop_oldest')
+        self.assertEqual(q.put(Msg('a', 0)), [])
+        self.assertEqual(q.put(Msg('a', 1)), [])
+        self.assertEqual(q.put(Msg('b', 0)), [])
+
+        # The vehicle's own oldest message goes first
+        self.assertEqual([m.n for m in q.put(Msg('a', 2))], [0])
+        # Then the oldest of the whole queue
+        self.assertEqual(repr(q.put(Msg('c', 0))), '[a1]')
+        self.assertEqual([repr(m) for m in q.get_many()], ['b0', 'a2', 'c0'])
+        self.assertEqual(q.occupancy()['dropped'], 2)
+
+    def test_coalesce(self):
+        q = MessageQueue(max_size=2, policy='coalesce')
+        q.put(Msg('a', 0))
+        q.put(Msg('b', 0))
+        self.assertEqual(repr(q.put(Msg('a', 1))), '[a0]')
+        self.assertEqual(repr(q.put(Msg('c', 0))), '[b0]')
+        self.assertEqual([repr(m) for m in q.get_many()], ['a1', 'c0'])
+
+
+def flood(q):
+    # A fast vehicle queues many messages before the others queue any
+    for i in range(6):
+        q.put(Msg('a', i))
+    for vid in ('b', 'c'):
+        for i in range(3):
+            q.put(Msg(vid, i))
+
+
+class TestScheduler(unittest.TestCase):
+    def test_fifo(self):
+        q = MessageQueue()
+        flood(q)
+        self.assertEqual([m.vid for m in q.get_many(max_n=6)], ['a'] * 6)
+
+    def test_round_robin(self):
+        q = MessageQueue(scheduler=RoundRobinScheduler())
+        flood(q)
+        self.assertEqual(''.join(m.vid for m in q.get_many()), 'abcabcabcaaa')
+
+        # Turns carry on between calls
+        flood(q)
+        self.assertEqual(q.get().vid, 'b')
+        self.assertEqual(q.get().vid, 'c')
+        self.assertEqual(q.get().vid, 'a')
+
+    def test_weighted(self):
+        q = MessageQueue(scheduler=WeightedScheduler({'b': 2}))
+        flood(q)
+        # B gets half the turns while everyone has messages queued
+        self.assertEqual(''.join(m.vid for m in q.get_many(max_n=4)), 'abcb')
+        self.assertEqual(''.join(m.vid for m in q.get_many()), 'abcacaaa')
+
+        # The shares hold over long runs and after a vehicle rejoins
+        scheduler = WeightedScheduler({'a': 3, 'b': 0.1}, default=1)
+        q = MessageQueue(scheduler=scheduler)
+        for i in range(100000):
+            q.put(Msg('a', i))
+            q.put(Msg('c', i))
+        taken = ''.join(m.vid for m in q.get_many(max_n=80000))
+        self.assertAlmostEqual(taken.count('a'), 60000, delta=1)
+        for i in range(10):
+            q.put(Msg('b', i))
+        taken = ''.join(m.vid for m in q.get_many(max_n=41))
+        self.assertEqual(taken.count('b'), 1)
+        self.assertAlmostEqual(taken.count('a'), 30, delta=1)
+
+    def test_priority(self):
+        q = MessageQueue(scheduler=PriorityScheduler({'c': 2, 'b': 1}))
+        flood(q)
+        self.assertEqual(''.join(m.vid for m in q.get_many()), 'cccbbbaaaaaa')
+
+    def test_changed_heads(self):
+        # Drops and discards change a vehicle's oldest message under the scheduler
+        q = MessageQueue(max_size=3, policy='drop_oldest', scheduler=RoundRobinScheduler())
+        msgs = [Msg('a', 0), Msg('a', 1), Msg('b', 0)]
+        for m in msgs:
+            q.put(m)
+        self.assertEqual(repr(q.put(Msg('c', 0))), '[a0]')
+        self.assertTrue(q.discard(msgs[1]))
+        q.put(Msg('a', 2))
+        self.assertEqual([repr(m) for m in q.get_many()], ['b0', 'c0', 'a2'])
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            Scheduler()
+
+
+if __name__ == '__main__':
+    unittest.main()
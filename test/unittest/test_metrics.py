@@ -0,0 +1,40 @@
+import unittest
+
+from mivp_agent.util.metrics import RollingHistogram, RateMeter
+
+
+class TestMetrics(unittest.TestCase):
+    def test_rolling_histogram(self):
+        h = RollingHistogram(size=10)
+        self.assertIsNone(h.summary())
+
+        for i in range(5):
+            h.add(i)
+        self.assertEqual(h.count, 5)
+        self.assertEqual(h.summary()['max'], 4)
+        self.assertEqual(h.summary()['p50'], 2)
+
+        # Older samples leave the window
+        for i in range(100, 110):
+            h.add(i)
+        self.assertEqual(h.count, 15)
+        self.assertEqual(sorted(h.samples()), list(range(100, 110)))
+        self.assertEqual(h.summary()['mean'], 104.5)
+
+        counts, edges = h.histogram(bins=2)
+        self.assertEqual(list(counts), [5, 5])
+
+    def test_rate_meter(self):
+        r = RateMeter(window=2.0)
+        self.assertEqual(r.rate(now=0.0), 0)
+
+        for t in (0.0, 0.5, 1.0, 1.5):
+            r.tick(now=t)
+        self.assertEqual(r.rate(now=1.5), 2.0)
+
+        # Only the ticks in the last two seconds count
+        self.assertEqual(r.rate(now=3.0), 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
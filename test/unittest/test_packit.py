@@ -105,5 +105,52 @@ class TestPackitDecode(unittest.TestCase):
             packit.unpack_buffer(buffer)
 
 
+class FakeConnection:
+    def __init__(self, data, amt):
+        self.data = data
+        self.amt = amt
+
+    def recv_into(self, view):
+        amt = min(self.amt, len(view), len(self.data))
+        view[:amt] = self.data[:amt]
+        self.data = self.data[amt:]
+        return amt
+
+
+class TestFrameBuffer(unittest.TestCase):
+    def test_partial(self):
+        messages = [f'Message {i} '.encode('utf-8') * i for i in range(50)]
+        stream = b''.join(packit.pack(m) for m in messages)
+
+        # Vary how much is read at a time, starting with a buffer smaller than some messages
+        for amt in (1, 7, 64, 1000, len(stream)):
+            conn = FakeConnection(stream, amt)
+            buffer = packit.FrameBuffer(16)
+
+            received = []
+            while buffer.recv_into(conn) != 0:
+                received.extend(bytes(f) for f in buffer.frames())
+                buffer.release()
+
+            self.assertEqual(received, messages)
+            self.assertEqual(len(buffer), 0)
+
+    def test_views_survive_reads(self):
+        first = packit.pack(b'a' * 10)
+        second = packit.pack(b'b' * 100)
+        buffer = packit.FrameBuffer(16)
+
+        # Complete one message and leave part of the next in the buffer
+        buffer.extend(first + second[:5])
+        frames = buffer.frames()
+        self.assertEqual(len(frames), 1)
+
+        # Reading the rest may move the data, but must not clobber unreleased views
+        buffer.extend(second[5:])
+        self.assertEqual(bytes(frames[0]), b'a' * 10)
+        self.assertEqual([bytes(f) for f in buffer.frames()], [b'b' * 100])
+        self.assertGreaterEqual(buffer.capacity(), 104)
+
+
 if __name__ == '__main__':
     unittest.main()
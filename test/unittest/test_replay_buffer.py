@@ -0,0 +1,166 @@
+import os
+import unittest
+
+import numpy as np
+
+from mivp_agent.const import KEY_ID, KEY_EPISODE_MGR_REPORT
+from mivp_agent.log.transitions import TransitionLogger
+from mivp_agent.proto.proto_logger import ProtoLogger
+from mivp_agent.proto.mivp_agent_pb2 import Transition
+from mivp_agent.util.data_structures import ColumnarBatch
+from mivp_agent.util.file_system import safe_clean
+from mivp_agent.util.replay_buffer import ReplayBuffer
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+generated_dir = os.path.join(current_dir, '.generated')
+
+
+def add_steps(buffer, vid, steps, done_at=None, offset=0):
+    # States count up by one and the reward of each step is its state
+    for i in range(offset, offset + steps):
+        buffer.add((i,), (0.0,), float(i), (i + 1,), done=i == done_at, vid=vid)
+
+
+class TestReplayBuffer(unittest.TestCase):
+
+    def test_ring(self):
+        b = ReplayBuffer(4)
+        add_steps(b, 'felix', 3)
+        self.assertEqual(len(b), 3)
+
+        add_steps(b, 'felix', 3, offset=3)
+        self.assertEqual(len(b), 4)
+        # The two oldest were overwritten in place
+        self.assertEqual(sorted(b._columns['s1'][:, 0]), [2, 3, 4, 5])
+
+        # A write larger than the buffer keeps the newest rows
+        b.add_many(np.arange(10).reshape(10, 1), np.zeros((10, 1)), np.zeros(10), np.arange(1, 11).reshape(10, 1), np.zeros(10, dtype=bool))
+        self.assertEqual(sorted(b._columns['s1'][:, 0]), [6, 7, 8, 9])
+
+        sample = b.sample(32)
+        self.assertEqual(sample['s1'].shape, (32, 1))
+        self.assertTrue(np.all(sample['s2'] == sample['s1'] + 1))
+        self.assertTrue(np.all(sample['weights'] == 1))
+        self.assertTrue(np.all(sample['discount'] == b.gamma))
+
+    def test_n_step(self):
+        b = ReplayBuffer(100, n_step=3, gamma=0.5)
+
+        # Two vehicles interleaved are chained separately
+        for i in range(4):
+            add_steps(b, 'felix', 1, offset=i)
+            add_steps(b, 'evan', 1, offset=10 + i)
+        self.assertEqual(len(b), 4)
+
+        rows = {(int(s1), int(s2)): (r, d) for s1, s2, r, d in zip(b._columns['s1'][:4, 0], b._columns['s2'][:4, 0], b._columns['r'][:4], b._columns['discount'][:4])}
+        self.assertEqual(rows[(0, 3)], (0 + 0.5 * 1 + 0.25 * 2, 0.125))
+        self.assertEqual(rows[(10, 13)], (10 + 0.5 * 11 + 0.25 * 12, 0.125))
+        self.assertIn((1, 4), rows)
+        self.assertIn((11, 14), rows)
+
+        # The end of an episode completes every pending return
+        add_steps(b, 'felix', 1, done_at=4, offset=4)
+        self.assertEqual(len(b), 7)
+        self.assertTrue(np.all(b._columns['done'][4:7]))
+        self.assertEqual(sorted(zip(b._columns['s1'][4:7, 0], b._columns['s2'][4:7, 0])), [(2, 5), (3, 5), (4, 5)])
+
+        # Flushing stores the rest
+        b.flush('evan')
+        self.assertEqual(len(b), 9)
+        self.assertFalse(np.any(b._columns['done'][7:9]))
+        self.assertEqual(b._pending, {})
+
+    def test_prioritized(self):
+        b = ReplayBuffer(8, prioritized=True, alpha=1.0, beta=1.0, seed=0)
+        add_steps(b, 'felix', 4)
+
+        # New rows share the highest priority so far
+        self.assertEqual(list(b._tree[np.arange(4)]), [1, 1, 1, 1])
+
+        b.update_priorities([0, 1, 2, 3], [1, 1, 1, 9])
+        sample = b.sample(1000)
+        counts = np.bincount(sample['indices'], minlength=4)
+        self.assertGreater(counts[3], 700)
+        self.assertTrue(np.all(counts[:3] > 50))
+        # Never the unfilled rows
+        self.assertEqual(counts.shape[0], 4)
+
+        low = sample['weights'][sample['indices'] != 3]
+        high = sample['weights'][sample['indices'] == 3]
+        self.assertTrue(np.all(high < 1))
+        self.assertTrue(np.all(low == 1))
+
+        # New rows get the highest priority seen
+        add_steps(b, 'felix', 1, offset=4)
+        self.assertAlmostEqual(b._tree[4], 9 + b.eps)
+
+    def test_add_batch(self):
+        batch = ColumnarBatch()
+        batch.append((1.0, 2.0), (0.5, 90.0), (3.0, 4.0), 'felix', 0, False)
+        batch.append((3.0, 4.0), (0.5, 90.0), (5.0, 6.0), 'felix', 0, True)
+
+        b = ReplayBuffer(10)
+        b.add_batch(batch, lambda s1, a, s2: s2[:, 0] - s1[:, 0])
+        self.assertEqual(len(b), 2)
+        self.assertEqual(list(b._columns['r'][:2]), [2.0, 2.0])
+        self.assertEqual(list(b._columns['done'][:2]), [False, True])
+
+    def test_add_batch_flush(self):
+        def make_batch(xs):
+            batch = ColumnarBatch()
+            for x in xs:
+                batch.append((x,), (0.5, 90.0), (x + 1.0,), 'felix', 0, False)
+            return batch
+
+        def reward(s1, a, s2):
+            return s2[:, 0] - s1[:, 0]
+
+        # The vehicles are paused between batches, no n-step return crosses from one to the next
+        b = ReplayBuffer(10, n_step=3, gamma=1.0)
+        b.add_batch(make_batch([0.0, 1.0]), reward)
+        b.add_batch(make_batch([10.0, 11.0]), reward)
+        self.assertEqual(len(b), 4)
+        self.assertEqual(list(b._columns['s1'][:4, 0]), [0.0, 1.0, 10.0, 11.0])
+        self.assertEqual(list(b._columns['s2'][:4, 0]), [2.0, 2.0, 12.0, 12.0])
+        self.assertEqual(list(b._columns['r'][:4]), [2.0, 1.0, 2.0, 1.0])
+
+        # Pipelined batches carry on where the last one stopped
+        b = ReplayBuffer(10, n_step=3, gamma=1.0)
+        b.add_batch(make_batch([0.0, 1.0]), reward, flush=False)
+        self.assertEqual(len(b), 0)
+        b.add_batch(make_batch([2.0]), reward, flush=False)
+        self.assertEqual(list(b._columns['s2'][:1, 0]), [3.0])
+
+    def test_load_logs(self):
+        path = os.path.join(generated_dir, 'replay_logs')
+        logger = TransitionLogger(path)
+        for i in range(6):
+            logger.log({
+                KEY_ID: 'felix',
+                'MOOS_TIME': float(i),
+                'NAV_X': float(i),
+                'NAV_Y': 0.0,
+                'NAV_HEADING': 0.0,
+                KEY_EPISODE_MGR_REPORT: {'NUM': i // 3, 'SUCCESS': False, 'DURATION': 0.0, 'WILL_PAUSE': False}
+            }, {'speed': 1.0, 'course': 90.0, 'posts': {}, 'ctrl_msg': 'SEND_STATE'}, True)
+        logger.close()
+
+        def convert(s1, a, s2):
+            return (s1['NAV_X'],), (a['speed'], a['course']), 1.0, (s2['NAV_X'],)
+
+        b = ReplayBuffer(10, n_step=2, gamma=1.0)
+        b.load_logs([ProtoLogger(os.path.join(path, 'log_felix'), Transition, mode='r')], convert)
+
+        # Five transitions, the third crosses into the second episode
+        self.assertEqual(len(b), 5)
+        self.assertEqual(b._pending, {})
+        rows = sorted(zip(b._columns['s1'][:5, 0], b._columns['s2'][:5, 0], b._columns['r'][:5], b._columns['done'][:5]))
+        self.assertEqual(rows, [(0, 2, 2, False), (1, 3, 2, True), (2, 3, 1, True), (3, 5, 2, False), (4, 5, 1, False)])
+        self.assertEqual(b._columns['a'].shape, (10, 2))
+
+        safe_clean(path, patterns=['*.gz'])
+        os.rmdir(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
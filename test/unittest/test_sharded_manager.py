@@ -0,0 +1,126 @@
+import unittest
+import os
+import time
+import timeout_decorator
+
+from mivp_agent.sharded_manager import ShardedMissionManager
+from mivp_agent.messages import MissionMessage, INSTR_SEND_STATE, INSTR_RESET_SUCCESS
+from mivp_agent.bridge import ModelBridgeClient
+from mivp_agent.const import KEY_ID, KEY_EPISODE_MGR_REPORT, KEY_EPISODE_MGR_STATE
+
+from mivp_agent.util.parse import parse_report
+from mivp_agent.util.file_system import safe_clean
+from mivp_agent.proto.proto_logger import ProtoLogger
+from mivp_agent.proto.mivp_agent_pb2 import Transition
+
+DUMMY_INSTR = {
+    'speed': 2.0,
+    'course': 120.0,
+    'posts': {
+        'FAKE_VAR': 'fake_val'
+    },
+    'ctrl_msg': 'SEND_STATE'
+}
+
+DUMMY_ACTION = {
+    'speed': DUMMY_INSTR['speed'],
+    'course': DUMMY_INSTR['course'],
+    'posts': DUMMY_INSTR['posts']
+}
+
+DUMMY_STATE = {
+    KEY_ID: 'felix',
+    'MOOS_TIME': 16923.012,
+    'NAV_X': 98.0,
+    'NAV_Y': 40.0,
+    'NAV_HEADING': 180,
+    KEY_EPISODE_MGR_REPORT: 'NUM=0,DURATION=60.57,SUCCESS=false,WILL_PAUSE=false',
+    KEY_EPISODE_MGR_STATE: 'PAUSED'
+}
+
+
+def listen(client):
+    instr = client.listen()
+    while instr is False:
+        time.sleep(0.01)
+        instr = client.listen()
+    return instr
+
+
+class TestShardedManager(unittest.TestCase):
+    @timeout_decorator.timeout(20)
+    def test_basic(self):
+        vnames = [f'vehicle_{i}' for i in range(6)]
+        clients = [ModelBridgeClient() for _ in vnames]
+
+        with ShardedMissionManager('test', workers=2) as mgr:
+            path = mgr.log_output_dir()
+            # Only the workers write logs
+            self.assertIsNone(mgr._logger)
+
+            for client in clients:
+                while not client.connect():
+                    time.sleep(0.1)
+                self.assertEqual(listen(client), INSTR_SEND_STATE)
+
+            for step in range(3):
+                for vname, client in zip(vnames, clients):
+                    state = DUMMY_STATE.copy()
+                    state[KEY_ID] = vname
+                    state['NAV_X'] += step
+                    self.assertTrue(client.send_state(state))
+
+                received = {}
+                for _ in vnames:
+                    msg = mgr.get_message()
+                    self.assertTrue(isinstance(msg, MissionMessage))
+                    self.assertEqual(msg.observation['NAV_X'], DUMMY_STATE['NAV_X'] + step)
+                    self.assertEqual(msg.episode_report, parse_report(DUMMY_STATE[KEY_EPISODE_MGR_REPORT]))
+                    received[msg.vid] = msg
+                self.assertEqual(sorted(received), vnames)
+
+                for vname in vnames:
+                    received[vname].act(DUMMY_ACTION)
+                for client in clients:
+                    self.assertEqual(listen(client), DUMMY_INSTR)
+
+            self.assertEqual(mgr.get_vehicle_count(), len(vnames))
+            mgr.reset_vehicle(vnames[0], success=True)
+            self.assertEqual(listen(clients[0]), INSTR_RESET_SUCCESS)
+
+        for client in clients:
+            client.close()
+
+        # Workers write each vehicle's log
+        self.assertEqual(sorted(os.listdir(path)), [f'log_{vname}' for vname in vnames])
+        for vname in vnames:
+            log = ProtoLogger(os.path.join(path, f'log_{vname}'), Transition, mode='r')
+            transitions = []
+            while log.has_more():
+                transitions.append(log.read(1)[0])
+            self.assertEqual(len(transitions), 2)
+
+        # Clean up
+        safe_clean(path, patterns=['*.gz'])
+        os.rmdir(path)
+
+    @timeout_decorator.timeout(20)
+    def test_response_deadline(self):
+        with ModelBridgeClient() as client:
+            with ShardedMissionManager('test', workers=1, log=False, response_deadline=0.2, deadline_fallback='zero_speed') as mgr:
+                while not client.connect():
+                    time.sleep(0.1)
+                self.assertEqual(listen(client), INSTR_SEND_STATE)
+
+                self.assertTrue(client.send_state(DUMMY_STATE))
+                mgr.get_message().act(DUMMY_ACTION)
+                self.assertEqual(listen(client), DUMMY_INSTR)
+
+                # Stopped on the last course
+                self.assertTrue(client.send_state(DUMMY_STATE))
+                self.assertEqual(listen(client), dict(DUMMY_INSTR, speed=0.0, posts={}))
+                self.assertEqual(mgr.stats()['fallbacks']['total'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()